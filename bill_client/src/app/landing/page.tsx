@@ -20,7 +20,7 @@ export default function Landing() {
       try {
         // Call your backend API to get the list of accounts
         const res = await fetch(
-            `${config.backend.baseUrl}/billing-accounts`
+            `${config.backend.baseUrl}${config.backend.endpoints.accounts}`
         );
         const data = await res.json();
         if (data.success && Array.isArray(data.accounts)) {
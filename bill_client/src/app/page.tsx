@@ -64,7 +64,7 @@ export default function Home() {
             try {
               if (hasAccountNumbers) {
                 // If you want to use the first account number, fetch it here
-                const res = await fetch(`${config.backend.baseUrl}/billing-accounts`);
+                const res = await fetch(`${config.backend.baseUrl}${config.backend.endpoints.accounts}`);
                 const data = await res.json();
                 if (data.success && Array.isArray(data.accounts) && data.accounts.length > 0) {
                   const firstAccount = data.accounts[0].account_number;
@@ -114,7 +114,7 @@ export default function Home() {
     async function fetchAccountNumbers() {
       try {
         const res = await fetch(
-          `${config.backend.baseUrl}/billing-accounts`
+          `${config.backend.baseUrl}${config.backend.endpoints.accounts}`
         );
         const data = await res.json();
         if (data.success && Array.isArray(data.accounts)) {
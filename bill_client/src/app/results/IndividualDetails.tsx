@@ -8,7 +8,8 @@ import {
   Entry, 
   LateFee,
   RomanNumeralEntry, 
-  IndividualDetailsProps 
+  IndividualDetailsProps,
+  amountValue
 } from "@/app/results/interfaces";
 
 
@@ -58,7 +59,7 @@ const IndividualDetails: React.FC<IndividualDetailsProps> = ({
     // Add Roman numerals to duplicate names, preserving money_amounts
     const entriesWithAmount = pdfData.entries.map((entry: Entry) => {
       const totalItem = entry.money_amounts?.find(money => money.ukey === 'total');
-      const total = totalItem ? parseFloat(totalItem.amount.replace(/[\$,]/g, '')) || 0 : 0;
+      const total = totalItem ? amountValue(totalItem) : 0;
       return {
         ...entry,
         amount: total,
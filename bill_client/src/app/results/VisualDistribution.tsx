@@ -5,7 +5,7 @@ import AnimatedCard from "../../components/AnimatedCard";
 import * as am5 from "@amcharts/amcharts5";
 import * as am5percent from "@amcharts/amcharts5/percent";
 import am5themes_Animated from "@amcharts/amcharts5/themes/Animated";
-import { PartitionDataItem, Entry, LateFee, colorPalette, VisualDistributionProps } from "@/app/results/interfaces";
+import { PartitionDataItem, Entry, LateFee, colorPalette, VisualDistributionProps, amountValue } from "@/app/results/interfaces";
 
 
 const VisualDistribution: React.FC<VisualDistributionProps> = ({ 
@@ -54,11 +54,25 @@ const VisualDistribution: React.FC<VisualDistributionProps> = ({
       return [];
     }
 
+    // Use the server's precomputed distribution when available (already filtered and sorted)
+    if (pdfData.totals?.distribution) {
+      return pdfData.totals.distribution.map((item, index) => ({
+        name: item.name,
+        displayName: item.display_name,
+        phone: item.phone,
+        amount: item.amount_cents / 100,
+        percentage: item.percentage,
+        color: item.display_name === 'Late Fees & Account Charges'
+          ? '#FF0033'
+          : colorPalette[index % colorPalette.length],
+      }));
+    }
+
     // Calculate total for each entry using only "total" ukey
     const entryTotals = pdfData.entries.map((entry: Entry) => {
       // Find the "total" ukey amount for this entry
       const totalItem = entry.money_amounts.find(money => money.ukey === 'total');
-      const total = totalItem ? parseFloat(totalItem.amount.replace(/[\$,]/g, '')) || 0 : 0;
+      const total = totalItem ? amountValue(totalItem) : 0;
 
       return {
         name: entry.name || 'Unknown',
@@ -72,10 +86,7 @@ const VisualDistribution: React.FC<VisualDistributionProps> = ({
 
     // Add late fees as a separate entry if they exist
     const lateFees = pdfData.summary.late_fees || [];
-    const totalLateFees = lateFees.reduce((sum: number, fee: LateFee) => {
-      const amount = parseFloat(fee.amount.replace(/[\$,]/g, '')) || 0;
-      return sum + amount;
-    }, 0);
+    const totalLateFees = lateFees.reduce((sum: number, fee: LateFee) => sum + amountValue(fee), 0);
 
     if (totalLateFees > 0) {
       entriesWithRomanNumerals.push({
@@ -1,6 +1,7 @@
 // PDF Data Interfaces based on schemas.py
 export interface SubKeyMoneyAmount {
   amount: string;
+  amount_cents?: number | null;
   keyword: string;
   name: string;
   ukey: string;
@@ -13,6 +14,7 @@ export interface SubKeyMoneyAmount {
 
 export interface MoneyAmount {
   amount: string;
+  amount_cents?: number | null;
   keyword: string;
   name: string;
   ukey: string;
@@ -29,6 +31,7 @@ export interface BillSummaryMoneyAmount {
   name: string;
   ukey: string;
   amount: string;
+  amount_cents?: number | null;
   inline_context: string;
   page: number;
   type: string;
@@ -36,6 +39,7 @@ export interface BillSummaryMoneyAmount {
 
 export interface LateFee {
   amount: string;
+  amount_cents?: number | null;
   sentence: string;
   name: string;
   ukey: string;
@@ -45,6 +49,7 @@ export interface LateFee {
 
 export interface PreviousBalance {
   amount: string;
+  amount_cents?: number | null;
   date: string;
   sentence: string;
   name: string;
@@ -66,6 +71,7 @@ export interface Summary {
   billing_period: string | null;
   due_date: string | null;
   total_charges: string | null;
+  total_charges_cents?: number | null;
   money_amounts: BillSummaryMoneyAmount[];
   late_fees: LateFee[];
   previous_balance: PreviousBalance[];
@@ -78,8 +84,45 @@ export interface PDFData {
   entries: ContactEntry[];
   keywords_used: string[];
   summary: Summary;
+  totals?: BillTotals;
 }
 
+// Totals precomputed by the server at extraction time (all amounts in integer cents)
+export interface LineTotal {
+  phone: string;
+  name: string;
+  total_cents: number;
+  categories: { [ukey: string]: number };
+}
+
+export interface CategoryTotal {
+  ukey: string;
+  name: string;
+  total_cents: number;
+}
+
+export interface DistributionItem {
+  name: string;
+  display_name: string;
+  phone: string;
+  amount_cents: number;
+  percentage: string;
+}
+
+export interface BillTotals {
+  lines: LineTotal[];
+  lines_total_cents: number;
+  categories: CategoryTotal[];
+  sub_key_categories: { [category: string]: number };
+  late_fees_cents: number;
+  charges_grand_total_cents: number;
+  distribution: DistributionItem[];
+}
+
+// Prefer the server's integer cents; older saved records only have the display string
+export const amountValue = (item: { amount: string; amount_cents?: number | null }): number =>
+  item.amount_cents != null ? item.amount_cents / 100 : parseFloat(item.amount.replace(/[\$,]/g, '')) || 0;
+
 // Define interfaces for type safety
 // Reuse the previously defined MoneyAmount interface above to avoid duplicate declarations and ensure 'sub_keys' modifiers are identical.
 // (duplicate interface removed)
@@ -96,6 +139,7 @@ export interface EntryWithDisplayName extends Entry {
 export interface SummaryItem {
   sentence: string;
   amount: string;
+  amount_cents?: number | null;
   type?: string;
   ukey: string;
 }
@@ -17,7 +17,8 @@ import config from "@/config/api";
 import {
   SummaryItem, 
   adjustmentChildren,
-  currentChargesChildren
+  currentChargesChildren,
+  amountValue
 } from './interfaces';
 
 export default function Results() {
@@ -423,10 +424,9 @@ export default function Results() {
                             const updatedChildren = children.map((child: any) => {
                               if (child.ukey === 'surcharges_credits') {
                                 const lateFees = displayData.summary.late_fees || [];
-                                const totalLateFees = lateFees.reduce((sum: number, fee: { amount: string }) => {
-                                  const amount = parseFloat(fee.amount.replace(/[\$,]/g, '')) || 0;
-                                  return sum + amount;
-                                }, 0);
+                                const totalLateFees = displayData.totals
+                                  ? displayData.totals.late_fees_cents / 100
+                                  : lateFees.reduce((sum: number, fee: { amount: string; amount_cents?: number | null }) => sum + amountValue(fee), 0);
                                 
                                 return {
                                   ...child,
@@ -589,17 +589,13 @@ export default function Results() {
                                     .filter((item: { ukey: string }) => 
                                       item.ukey === 'balance_forward' || item.ukey === 'total_charges_due'
                                     )
-                                    .reduce((sum: number, item: { amount: string }) => {
-                                      const amount = parseFloat(item.amount.replace(/[\$,]/g, '')) || 0;
-                                      return sum + amount;
-                                    }, 0);
+                                    .reduce((sum: number, item: { amount: string; amount_cents?: number | null }) => sum + amountValue(item), 0);
                                   
                                   // Add late fees to grand total
                                   const lateFees = displayData.summary.late_fees || [];
-                                  const totalLateFees = lateFees.reduce((sum: number, fee: { amount: string }) => {
-                                    const amount = parseFloat(fee.amount.replace(/[\$,]/g, '')) || 0;
-                                    return sum + amount;
-                                  }, 0);
+                                  const totalLateFees = displayData.totals
+                                    ? displayData.totals.late_fees_cents / 100
+                                    : lateFees.reduce((sum: number, fee: { amount: string; amount_cents?: number | null }) => sum + amountValue(fee), 0);
                                   
                                   const grandTotal = baseTotal + totalLateFees;
                                   
@@ -7,6 +7,7 @@ const config = {
     baseUrl: process.env.NEXT_PUBLIC_BACKEND_URL || 'https://simplebillingbackend.onrender.com/',
     endpoints: {
       extractText: '/extract-text',
+      accounts: '/accounts',
     }
   }
 } as const;
@@ -1,10 +1,28 @@
-from flask import Flask, jsonify
+import time
+# Reference point for the import-to-first-response measurement reported by /health
+APP_IMPORT_STARTED = time.perf_counter()
+
+import os
+import threading
+from flask import Flask, jsonify, request, g
 from flask_smorest import Api
 from flask_cors import CORS
-from resources.verizonbus_api import blp as pdf_text_extraction_blueprint
+from resources.structured_logging import (configure_logging, get_logger, get_logging_stats,
+                                          new_request_id, set_request_id, reset_request_id)
+
+# Queue-backed structured logging (see LOG_* environment variables)
+configure_logging()
+logger = get_logger("app")
+
+from resources.verizonbus_api import blp as pdf_text_extraction_blueprint, db as billing_db, admission, single_flight, document_sessions, warm_up, keyword_stats, pattern_quarantine, pipeline_stats, memory_governor
+from resources.admin import is_admin_request
+from resources.json_provider import FastJSONProvider
 
 app = Flask(__name__)
 
+# Use orjson for JSON responses when installed (falls back to the stdlib)
+app.json = FastJSONProvider(app)
+
 # Enable CORS for all routes
 CORS(app)
 
@@ -22,6 +40,73 @@ api = Api(app)
 # Register blueprints
 api.register_blueprint(pdf_text_extraction_blueprint)
 
+# Startup state reported by /health and /health/ready
+startup = {
+    "ready": False,
+    "import_ms": round((time.perf_counter() - APP_IMPORT_STARTED) * 1000, 1),
+    "first_response_ms": None,
+    "warmup_ms": None,
+    "warmup": None,
+    "warmup_error": None
+}
+
+def run_warm_up():
+    """Load PyMuPDF, keywords.json and the database in the background so the first request doesn't pay for them"""
+    started = time.perf_counter()
+    try:
+        startup["warmup"] = warm_up()
+        # Periodic online backups and incremental vacuum (see BACKUP_* / VACUUM_* environment variables)
+        billing_db.start_maintenance_scheduler()
+        startup["ready"] = True
+    except Exception as e:
+        startup["warmup_error"] = str(e)
+        logger.exception("Warm-up failed: %s", e)
+    startup["warmup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("Warm-up finished in %sms", startup['warmup_ms'], extra={"warmup": startup['warmup']})
+
+threading.Thread(target=run_warm_up, name="warm-up", daemon=True).start()
+
+@app.before_request
+def assign_request_id():
+    """Tag every log record of this request with the caller's X-Request-Id (or a new id)"""
+    request_id = (request.headers.get("X-Request-Id") or "")[:64] or new_request_id()
+    request.environ["bill_server.request_id"] = (request_id, set_request_id(request_id))
+
+@app.after_request
+def record_first_response(response):
+    if startup["first_response_ms"] is None:
+        startup["first_response_ms"] = round((time.perf_counter() - APP_IMPORT_STARTED) * 1000, 1)
+        logger.info("First response %sms after import", startup['first_response_ms'])
+    request_id = request.environ.get("bill_server.request_id")
+    if request_id:
+        response.headers["X-Request-Id"] = request_id[0]
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    request_id = request.environ.pop("bill_server.request_id", None)
+    if request_id:
+        reset_request_id(request_id[1])
+
+@app.before_request
+def track_request_memory():
+    """Track the memory of every request. While this worker is being recycled only health checks are served."""
+    if memory_governor.recycling and not request.path.startswith("/health"):
+        return jsonify({
+            "success": False,
+            "message": "Worker is restarting to release memory, retry shortly"
+        }), 503, {"Retry-After": "1"}
+    # Profiled requests always run under tracemalloc so their report includes allocations
+    traced = request.args.get('profile', request.form.get('profile')) == '1' and is_admin_request()
+    g.memory = memory_governor.start(request.url_rule.rule if request.url_rule else "<unmatched>", traced)
+
+@app.teardown_request
+def finish_request_memory(exc):
+    # Registered after clear_request_id, so it runs first and the record still has the request id
+    memory = g.pop("memory", None)
+    if memory is not None:
+        logger.debug("Request memory", extra={"memory": memory_governor.finish(memory)})
+
 @app.route("/")
 def hello_world():
     return """<h1>PDF Text Extraction API</h1>
@@ -43,12 +128,41 @@ def health_check():
         "endpoints": {
             "GET /extract-text": "Get usage information",
             "POST /extract-text": "Extract text from PDF file"
-        }
+        },
+        "serialization": app.json.get_stats(),
+        "admission": admission.get_stats(),
+        "single_flight": single_flight.get_stats(),
+        "document_sessions": document_sessions.get_stats(),
+        "startup": startup,
+        "logging": get_logging_stats(),
+        "keyword_patterns": pattern_quarantine.get_stats(),
+        "pipeline": pipeline_stats.get_stats(),
+        "memory": memory_governor.get_stats()
     })
 
+@app.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests"""
+    return jsonify({"status": "alive"})
+
+@app.route('/health/ready', methods=['GET'])
+def readiness_check():
+    """Readiness probe: PyMuPDF, keywords.json and the database are loaded and the worker isn't being recycled"""
+    if memory_governor.recycling:
+        return jsonify({"status": "recycling"}), 503
+    if not startup["ready"]:
+        return jsonify({"status": "starting", "error": startup["warmup_error"]}), 503
+    return jsonify({"status": "ready", "warmup_ms": startup["warmup_ms"]})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics: per-rule keyword scan counters, extraction stage timings and memory"""
+    body = "\n".join(keyword_stats.prometheus_lines() + pipeline_stats.prometheus_lines() +
+                     memory_governor.prometheus_lines()) + "\n"
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 
 if __name__ == '__main__':
-    import os
     # Use environment variables for configuration
     debug_mode = os.getenv('FLASK_ENV') == 'development' or os.getenv('FLASK_DEBUG') == '1'
     port = int(os.getenv('PORT', 5000))
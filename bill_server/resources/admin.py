@@ -0,0 +1,11 @@
+import hmac
+import os
+from flask import request
+
+
+def is_admin_request():
+    """True when the request carries the admin token from ADMIN_TOKEN in its X-Admin-Token header.
+       Admin-only features are disabled entirely while ADMIN_TOKEN is unset."""
+    expected = os.getenv('ADMIN_TOKEN', '')
+    supplied = request.headers.get('X-Admin-Token', '')
+    return bool(expected) and hmac.compare_digest(expected.encode("utf-8"), supplied.encode("utf-8"))
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted (queue full or wait timed out)"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Pages held by one admitted request; release() returns them to the budget (idempotent)"""
+
+    def __init__(self, controller, weight, wait_ms):
+        self._controller = controller
+        self.weight = weight
+        self.wait_ms = wait_ms
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self.weight)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Page-weighted admission control for extraction requests.
+       At most max_pages pages are extracted concurrently; requests that don't fit wait in a
+       FIFO queue of at most max_queue entries for up to max_wait_seconds. Anything beyond
+       that is rejected immediately so the caller can answer 503 with Retry-After."""
+
+    def __init__(self, max_pages=None, max_queue=None, max_wait_seconds=None, retry_after=None):
+        self.max_pages = max(1, int(max_pages if max_pages is not None else os.getenv('ADMISSION_MAX_PAGES', 600)))
+        self.max_queue = max(0, int(max_queue if max_queue is not None else os.getenv('ADMISSION_MAX_QUEUE', 16)))
+        self.max_wait_seconds = float(max_wait_seconds if max_wait_seconds is not None
+                                      else os.getenv('ADMISSION_MAX_WAIT_SECONDS', 30))
+        self.retry_after = int(retry_after if retry_after is not None else os.getenv('ADMISSION_RETRY_AFTER', 5))
+
+        self._condition = threading.Condition()
+        self._queue = deque()
+        self._in_flight_pages = 0
+        self._in_flight_requests = 0
+        self._recent_waits = deque(maxlen=500)
+        self._stats = {
+            "admitted": 0,
+            "rejected_queue_full": 0,
+            "rejected_timeout": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0
+        }
+
+    def acquire(self, pages):
+        """Block until the request's pages fit in the budget and return an AdmissionTicket.
+           A request larger than the whole budget is admitted alone once everything else has finished."""
+        weight = min(max(1, int(pages)), self.max_pages)
+        started = time.perf_counter()
+
+        with self._condition:
+            if not self._queue and self._in_flight_pages + weight <= self.max_pages:
+                return self._admit(weight, started)
+
+            if len(self._queue) >= self.max_queue:
+                self._stats["rejected_queue_full"] += 1
+                raise AdmissionRejected("Server busy: extraction queue is full", self.retry_after)
+
+            marker = object()
+            self._queue.append(marker)
+            deadline = started + self.max_wait_seconds
+            try:
+                while not (self._queue[0] is marker and self._in_flight_pages + weight <= self.max_pages):
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._stats["rejected_timeout"] += 1
+                        raise AdmissionRejected("Server busy: timed out waiting for extraction capacity",
+                                                self.retry_after)
+                    self._condition.wait(remaining)
+            finally:
+                self._queue.remove(marker)
+                # The new head of the queue may fit now
+                self._condition.notify_all()
+
+            return self._admit(weight, started)
+
+    def _admit(self, weight, started):
+        # Caller holds self._condition
+        wait_ms = (time.perf_counter() - started) * 1000
+        self._in_flight_pages += weight
+        self._in_flight_requests += 1
+        self._stats["admitted"] += 1
+        self._stats["total_wait_ms"] += wait_ms
+        self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        self._recent_waits.append(wait_ms)
+        return AdmissionTicket(self, weight, wait_ms)
+
+    def _release(self, weight):
+        with self._condition:
+            self._in_flight_pages -= weight
+            self._in_flight_requests -= 1
+            self._condition.notify_all()
+
+    def get_stats(self):
+        """Current budget usage, queue depth and wait time statistics"""
+        with self._condition:
+            stats = dict(self._stats)
+            recent = sorted(self._recent_waits)
+            stats.update({
+                "max_pages": self.max_pages,
+                "max_queue": self.max_queue,
+                "max_wait_seconds": self.max_wait_seconds,
+                "in_flight_pages": self._in_flight_pages,
+                "in_flight_requests": self._in_flight_requests,
+                "queue_depth": len(self._queue)
+            })
+        stats["avg_wait_ms"] = round(stats["total_wait_ms"] / stats["admitted"], 3) if stats["admitted"] else 0.0
+        stats["p95_wait_ms"] = round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 3) if recent else 0.0
+        stats["total_wait_ms"] = round(stats["total_wait_ms"], 3)
+        stats["max_wait_ms"] = round(stats["max_wait_ms"], 3)
+        return stats
@@ -1,9 +1,33 @@
 import sqlite3
 import json
 import os
-import shutil
+import glob
+import re
+import threading
+import time
 from datetime import datetime
 
+from .structured_logging import get_logger
+
+logger = get_logger("database")
+
+
+def normalize_phone(phone):
+    """Digits-only form of a phone number, used as the per-line lookup key"""
+    return re.sub(r'\D', '', phone or '')
+
+def parse_billing_period_start(billing_period):
+    """Return the start of a billing period such as "Jan 01, 2025 - Jan 31, 2025" as YYYY-MM-DD (or None)"""
+    if not billing_period:
+        return None
+    start = re.split(r'\s*[-–—]\s*', str(billing_period).strip())[0].replace(',', '')
+    for date_format in ("%b %d %Y", "%m/%d/%Y", "%B %d %Y"):
+        try:
+            return datetime.strptime(start, date_format).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
 class BillingDatabase:
     def __init__(self, db_path=None):
         if db_path is None:
@@ -11,8 +35,8 @@ class BillingDatabase:
             if self.is_cloud_environment():
                 # For cloud deployment - use temporary storage with warning
                 self.db_path = '/tmp/billing_data.db'
-                print("WARNING: Running on cloud platform. Database will be temporary and reset on restart.")
-                print("Consider using a cloud database service for persistent storage.")
+                logger.warning("Running on cloud platform. Database will be temporary and reset on restart.")
+                logger.warning("Consider using a cloud database service for persistent storage.")
             else:
                 # For local development - use C:/simplifybill/
                 local_dir = "C:/simplifybill"
@@ -20,19 +44,20 @@ class BillingDatabase:
                 # Create directory if it doesn't exist               
                 try:
                     os.makedirs(local_dir)
-                    print(f"Created directory: {local_dir}")
+                    logger.info("Created directory: %s", local_dir)
                 except OSError as e:
-                    print(f"Error creating directory {local_dir}: {str(e)}")
+                    logger.error("Error creating directory %s: %s", local_dir, e)
                     # Fallback to current directory
                     current_dir = os.path.dirname(os.path.abspath(__file__))
                     bill_server_dir = os.path.dirname(current_dir)
                     local_dir = bill_server_dir
-                    print(f"Falling back to: {local_dir}")
+                    logger.info("Falling back to: %s", local_dir)
                 
                 self.db_path = os.path.join(local_dir, 'billing_data.db')
         else:
             self.db_path = db_path
         
+        self.fts_enabled = False
         self.init_database()
     
     def is_cloud_environment(self):
@@ -76,6 +101,19 @@ class BillingDatabase:
             
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
+                
+                # Free pages are reclaimed in small incremental_vacuum steps instead of full VACUUMs.
+                # auto_vacuum only applies to an empty database or after one VACUUM, so older
+                # databases are converted once here.
+                cursor.execute("PRAGMA auto_vacuum")
+                if cursor.fetchone()[0] != 2:
+                    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                    cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+                    if cursor.fetchone()[0] > 0:
+                        conn.commit()
+                        conn.execute("VACUUM")
+                        logger.info("Migrated database: enabled incremental auto_vacuum")
+                
                 # Create table (invoice_number included)
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS billing_records (
@@ -83,6 +121,9 @@ class BillingDatabase:
                         account_number TEXT NOT NULL,
                         invoice_number TEXT,
                         json_data TEXT NOT NULL,
+                        total_charges_cents INTEGER,
+                        period_start TEXT,
+                        revision INTEGER NOT NULL DEFAULT 0,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
@@ -97,9 +138,161 @@ class BillingDatabase:
                     CREATE INDEX IF NOT EXISTS idx_invoice_number
                     ON billing_records(invoice_number)
                 ''')
+                # Covering index so the account index query never touches json_data pages
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_account_updated
+                    ON billing_records(account_number, updated_at)
+                ''')
+
+                # Single-row counter bumped by every insert, update and delete of billing_records, so
+                # collection responses can be validated without reading the records
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS data_generation (
+                        id INTEGER PRIMARY KEY CHECK (id = 1),
+                        generation INTEGER NOT NULL
+                    )
+                ''')
+                cursor.execute('INSERT OR IGNORE INTO data_generation (id, generation) VALUES (1, 0)')
+                for trigger, event in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+                    cursor.execute(f'''
+                        CREATE TRIGGER IF NOT EXISTS billing_records_generation_{trigger}
+                        AFTER {event} ON billing_records BEGIN
+                            UPDATE data_generation SET generation = generation + 1 WHERE id = 1;
+                        END
+                    ''')
+                
+                # Compressed per-page text of uploaded documents, used to reprocess
+                # stored bills without the original PDF
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS document_text (
+                        content_hash TEXT PRIMARY KEY,
+                        account_number TEXT,
+                        invoice_number TEXT,
+                        pdf_filename TEXT,
+                        provider TEXT,
+                        page_range TEXT,
+                        total_pages INTEGER,
+                        required_keywords TEXT,
+                        page_text BLOB NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_document_text_account
+                    ON document_text(account_number)
+                ''')
+                
+                # Single-flight leases: one row per extraction in progress across worker processes,
+                # holding the compressed result for a short time after it finishes
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS extraction_leases (
+                        flight_key TEXT PRIMARY KEY,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        result BLOB
+                    )
+                ''')
+                
+                # One row per line per invoice; source of the full-text search index
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS billing_lines (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        record_id INTEGER NOT NULL,
+                        account_number TEXT,
+                        invoice_number TEXT,
+                        phone TEXT,
+                        line_name TEXT,
+                        phone_terms TEXT,
+                        charge_names TEXT,
+                        inline_contexts TEXT
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_billing_lines_record
+                    ON billing_lines(record_id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_billing_lines_account
+                    ON billing_lines(account_number)
+                ''')
+                
+                # One row per charge per line per invoice, for per-line history lookups
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'line_charges'")
+                line_charges_created = cursor.fetchone() is None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS line_charges (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        record_id INTEGER NOT NULL,
+                        account_number TEXT,
+                        invoice_number TEXT,
+                        billing_period TEXT,
+                        period_start TEXT,
+                        phone_digits TEXT NOT NULL,
+                        phone TEXT,
+                        line_name TEXT,
+                        ukey TEXT,
+                        parent_ukey TEXT,
+                        name TEXT,
+                        amount TEXT,
+                        amount_cents INTEGER,
+                        category TEXT,
+                        date_range TEXT
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_line_charges_phone
+                    ON line_charges(phone_digits, period_start, record_id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_line_charges_record
+                    ON line_charges(record_id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_line_charges_account
+                    ON line_charges(account_number)
+                ''')
+                # Lets exports stream in (account, period) order without a sort step
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_line_charges_export
+                    ON line_charges(account_number, period_start, record_id)
+                ''')
+                
+                # Month-over-month changes of every invoice against the account's previous invoice
+                # (by billing period), kept up to date as records are saved
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'billing_deltas'")
+                billing_deltas_created = cursor.fetchone() is None
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS billing_deltas (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        record_id INTEGER NOT NULL,
+                        previous_record_id INTEGER NOT NULL,
+                        account_number TEXT,
+                        scope TEXT NOT NULL,
+                        line_key TEXT NOT NULL DEFAULT '',
+                        phone TEXT,
+                        line_name TEXT,
+                        category TEXT NOT NULL DEFAULT '',
+                        category_name TEXT,
+                        current_cents INTEGER NOT NULL,
+                        previous_cents INTEGER NOT NULL,
+                        delta_cents INTEGER NOT NULL,
+                        change TEXT NOT NULL
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_billing_deltas_record
+                    ON billing_deltas(record_id)
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_billing_deltas_previous
+                    ON billing_deltas(previous_record_id)
+                ''')
                 
                 conn.commit()
                 
+                search_index_created = self._init_search_index(cursor)
+                conn.commit()
+                
                 # Migration: ensure invoice_number column exists; if older schema used voucher_number, copy values
                 cursor.execute("PRAGMA table_info(billing_records)")
                 cols = [row[1] for row in cursor.fetchall()]
@@ -107,7 +300,16 @@ class BillingDatabase:
                     try:
                         cursor.execute("ALTER TABLE billing_records ADD COLUMN invoice_number TEXT")
                         conn.commit()
-                        print("Migrated database: added invoice_number column")
+                        logger.info("Migrated database: added invoice_number column")
+                    except Exception:
+                        pass
+                
+                # Migration: integer cents column so totals can be aggregated in SQL
+                if 'total_charges_cents' not in cols:
+                    try:
+                        cursor.execute("ALTER TABLE billing_records ADD COLUMN total_charges_cents INTEGER")
+                        conn.commit()
+                        logger.info("Migrated database: added total_charges_cents column")
                     except Exception:
                         pass
                 
@@ -116,20 +318,387 @@ class BillingDatabase:
                     try:
                         cursor.execute("UPDATE billing_records SET invoice_number = voucher_number WHERE (invoice_number IS NULL OR invoice_number = '') AND (voucher_number IS NOT NULL AND voucher_number != '')")
                         conn.commit()
-                        print("Copied existing voucher_number values into invoice_number")
+                        logger.info("Copied existing voucher_number values into invoice_number")
+                    except Exception:
+                        pass
+                
+                # Migration: count how often a record has been overwritten; lets the
+                # upsert in save_billing_data tell an insert from an update
+                if 'revision' not in cols:
+                    try:
+                        cursor.execute("ALTER TABLE billing_records ADD COLUMN revision INTEGER NOT NULL DEFAULT 0")
+                        conn.commit()
+                        logger.info("Migrated database: added revision column")
+                    except Exception:
+                        pass
+                
+                # Migration: billing period start, which orders an account's invoices for billing_deltas
+                if 'period_start' not in cols:
+                    try:
+                        cursor.execute("ALTER TABLE billing_records ADD COLUMN period_start TEXT")
+                        backfilled = self._backfill_period_start(cursor)
+                        conn.commit()
+                        billing_deltas_created = True
+                        logger.info("Migrated database: added period_start column (%s record(s))", backfilled)
                     except Exception:
                         pass
                 
+                # Migration: the keywords a document was extracted with ('null' = provider defaults),
+                # so reprocessing reuses them. Rows stored before this column are left NULL (unknown).
+                cursor.execute("PRAGMA table_info(document_text)")
+                if 'required_keywords' not in [row[1] for row in cursor.fetchall()]:
+                    try:
+                        cursor.execute("ALTER TABLE document_text ADD COLUMN required_keywords TEXT")
+                        conn.commit()
+                        logger.info("Migrated database: added document_text.required_keywords column")
+                    except Exception:
+                        pass
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_account_period
+                    ON billing_records(account_number, period_start, id)
+                ''')
+                conn.commit()
+                
+                # One record per (account, invoice). Older databases could hold duplicates
+                # from concurrent uploads; keep the newest copy before adding the constraint.
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_account_invoice_unique'")
+                if cursor.fetchone() is None:
+                    removed = self._remove_duplicate_invoices(cursor)
+                    cursor.execute('''
+                        CREATE UNIQUE INDEX IF NOT EXISTS idx_account_invoice_unique
+                        ON billing_records(account_number, invoice_number)
+                    ''')
+                    conn.commit()
+                    if removed:
+                        logger.info("Migrated database: removed %s duplicate invoice record(s)", removed)
+                
+                # Index bills saved before the search index / line tables existed
+                if search_index_created or line_charges_created:
+                    indexed = self._rebuild_line_index(cursor)
+                    conn.commit()
+                    if indexed:
+                        logger.info("Built line index for %s existing record(s)", indexed)
+                
+                # Compare bills saved before billing_deltas existed; runs after the line index it reads
+                if billing_deltas_created or line_charges_created:
+                    compared = self._rebuild_deltas(cursor)
+                    conn.commit()
+                    if compared:
+                        logger.info("Built billing deltas for %s existing record(s)", compared)
+                
                 env_info = self.get_environment_info()
-                print(f"Database initialized at: {self.db_path}")
-                print(f"Environment: {'Cloud' if env_info['is_cloud'] else 'Local'}")
+                logger.info("Database initialized at: %s", self.db_path)
+                logger.info("Environment: %s", 'Cloud' if env_info['is_cloud'] else 'Local')
                 if env_info['is_cloud']:
-                    print("⚠️  WARNING: Database is temporary and will be lost on restart!")
+                    logger.warning("Database is temporary and will be lost on restart!")
                     
         except Exception as e:
-            print(f"Error initializing database: {str(e)}")
+            logger.error("Error initializing database: %s", e)
             raise
     
+    def _remove_duplicate_invoices(self, cursor):
+        """Delete all but the newest record of every duplicated (account_number, invoice_number) pair.
+           Records without an invoice number are left alone. Returns the number of records removed."""
+        cursor.execute('''
+            SELECT id FROM billing_records
+            WHERE invoice_number IS NOT NULL
+              AND id NOT IN (
+                  SELECT MAX(id) FROM billing_records
+                  WHERE invoice_number IS NOT NULL
+                  GROUP BY account_number, invoice_number
+              )
+        ''')
+        duplicate_ids = [row[0] for row in cursor.fetchall()]
+        for record_id in duplicate_ids:
+            cursor.execute('DELETE FROM billing_lines WHERE record_id = ?', (record_id,))
+            cursor.execute('DELETE FROM line_charges WHERE record_id = ?', (record_id,))
+            cursor.execute('DELETE FROM billing_records WHERE id = ?', (record_id,))
+            self._update_deltas(cursor, record_id)
+        return len(duplicate_ids)
+
+    def _init_search_index(self, cursor):
+        """Create the FTS5 index over billing_lines and the triggers that keep it in sync.
+           Returns True when the index was created by this call."""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'billing_search'")
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS billing_search USING fts5(
+                    line_name, phone_terms, charge_names, inline_contexts,
+                    content='billing_lines', content_rowid='id',
+                    tokenize='unicode61'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS billing_lines_ai AFTER INSERT ON billing_lines BEGIN
+                    INSERT INTO billing_search(rowid, line_name, phone_terms, charge_names, inline_contexts)
+                    VALUES (new.id, new.line_name, new.phone_terms, new.charge_names, new.inline_contexts);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS billing_lines_ad AFTER DELETE ON billing_lines BEGIN
+                    INSERT INTO billing_search(billing_search, rowid, line_name, phone_terms, charge_names, inline_contexts)
+                    VALUES ('delete', old.id, old.line_name, old.phone_terms, old.charge_names, old.inline_contexts);
+                END
+            ''')
+            self.fts_enabled = True
+            return not exists
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5 - billing_lines is still maintained
+            logger.warning("Full-text search disabled: %s", e)
+            self.fts_enabled = False
+            return False
+    
+    def _index_record_lines(self, cursor, record_id, account_number, invoice_number, json_data):
+        """Replace the billing_lines and line_charges rows of one record
+           (the FTS index follows billing_lines through triggers)"""
+        cursor.execute('DELETE FROM billing_lines WHERE record_id = ?', (record_id,))
+        cursor.execute('DELETE FROM line_charges WHERE record_id = ?', (record_id,))
+        if not isinstance(json_data, dict):
+            return 0
+        
+        billing_period = (json_data.get("summary") or {}).get("billing_period")
+        period_start = parse_billing_period_start(billing_period)
+        
+        rows = []
+        charge_rows = []
+        indexed_lines = set()
+        for entry in json_data.get("entries", []):
+            phone = entry.get("phone") or ""
+            line_name = entry.get("name") or entry.get("text") or ""
+            # The same line can be detected on several pages; index it once per record
+            if (phone, line_name) in indexed_lines:
+                continue
+            indexed_lines.add((phone, line_name))
+            charge_names = []
+            inline_contexts = []
+            for money in entry.get("money_amounts", []):
+                for item in [money] + money.get("sub_keys", []):
+                    is_sub_key = item is not money
+                    charge_rows.append((
+                        record_id,
+                        account_number,
+                        invoice_number,
+                        billing_period,
+                        period_start,
+                        normalize_phone(phone),
+                        phone,
+                        line_name,
+                        item.get("ukey"),
+                        money.get("ukey") if is_sub_key else None,
+                        item.get("name") or item.get("keyword"),
+                        item.get("amount"),
+                        item.get("amount_cents"),
+                        item.get("category") or None,
+                        item.get("date_range") or None
+                    ))
+                    name = item.get("name") or item.get("keyword") or ""
+                    charge_names.append(name)
+                    if item.get("keyword") and item.get("keyword") != name:
+                        charge_names.append(item["keyword"])
+                    if item.get("inline_context"):
+                        inline_contexts.append(item["inline_context"])
+            rows.append((
+                record_id,
+                account_number,
+                invoice_number,
+                phone,
+                line_name,
+                # Index the digits-only form too so 5551234567 finds 555-123-4567
+                f"{phone} {''.join(ch for ch in phone if ch.isdigit())}",
+                "\n".join(charge_names),
+                "\n".join(inline_contexts)
+            ))
+        
+        cursor.executemany('''
+            INSERT INTO billing_lines (record_id, account_number, invoice_number, phone, line_name,
+                                       phone_terms, charge_names, inline_contexts)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        cursor.executemany('''
+            INSERT INTO line_charges (record_id, account_number, invoice_number, billing_period, period_start,
+                                      phone_digits, phone, line_name, ukey, parent_ukey, name, amount,
+                                      amount_cents, category, date_range)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', charge_rows)
+        return len(rows)
+    
+    def _rebuild_line_index(self, cursor):
+        """Re-index every stored record. Returns the number of records indexed."""
+        cursor.execute('SELECT id, account_number, invoice_number, json_data FROM billing_records')
+        records = cursor.fetchall()
+        for record_id, account_number, invoice_number, json_text in records:
+            try:
+                parsed_json = json.loads(json_text)
+            except (json.JSONDecodeError, TypeError):
+                parsed_json = None
+            self._index_record_lines(cursor, record_id, account_number, invoice_number, parsed_json)
+        return len(records)
+    
+    def _backfill_period_start(self, cursor):
+        """Fill billing_records.period_start from the stored JSON. Returns the number of records updated."""
+        cursor.execute('SELECT id, json_data FROM billing_records WHERE period_start IS NULL')
+        updates = []
+        for record_id, json_text in cursor.fetchall():
+            try:
+                parsed_json = json.loads(json_text)
+            except (json.JSONDecodeError, TypeError):
+                continue
+            if isinstance(parsed_json, dict):
+                period_start = parse_billing_period_start((parsed_json.get("summary") or {}).get("billing_period"))
+                if period_start:
+                    updates.append((period_start, record_id))
+        cursor.executemany('UPDATE billing_records SET period_start = ? WHERE id = ?', updates)
+        return len(updates)
+    
+    def _line_totals(self, cursor, record_id):
+        """Per-line totals and top-level charge categories of one record from its line_charges rows,
+           keyed by phone digits (line name for lines without a phone). Cents follow build_bill_totals:
+           the line total is the first "total" charge of each line entry and every other top-level
+           charge is a category."""
+        cursor.execute('''
+            SELECT phone_digits, phone, line_name, ukey, name, amount_cents
+            FROM line_charges
+            WHERE record_id = ? AND parent_ukey IS NULL
+            ORDER BY id
+        ''', (record_id,))
+        lines = {}
+        totalled = set()
+        for phone_digits, phone, line_name, ukey, name, amount_cents in cursor.fetchall():
+            line = lines.setdefault(phone_digits or line_name or "", {
+                "phone": phone,
+                "line_name": line_name,
+                "total": 0,
+                "categories": {}
+            })
+            if ukey == "total":
+                # Entries are indexed once per (phone, name); a phone shared by two entries adds both
+                if (phone_digits, line_name) not in totalled:
+                    totalled.add((phone_digits, line_name))
+                    line["total"] += amount_cents or 0
+                continue
+            category = line["categories"].setdefault(ukey or "", [name or ukey, 0])
+            category[1] += amount_cents or 0
+        return lines
+    
+    def _compute_deltas(self, cursor, record_id):
+        """Replace the billing_deltas rows of one record with its changes against the account's previous
+           invoice by (period_start, id). Records without a billing period, or without an earlier
+           invoice, get no rows. Returns the number of rows written."""
+        cursor.execute('DELETE FROM billing_deltas WHERE record_id = ?', (record_id,))
+        cursor.execute('SELECT account_number, period_start FROM billing_records WHERE id = ?', (record_id,))
+        row = cursor.fetchone()
+        if row is None or not row[1]:
+            return 0
+        account_number, period_start = row
+        cursor.execute('''
+            SELECT id FROM billing_records
+            WHERE account_number = ? AND (period_start, id) < (?, ?)
+            ORDER BY period_start DESC, id DESC
+            LIMIT 1
+        ''', (account_number, period_start, record_id))
+        previous = cursor.fetchone()
+        if previous is None:
+            return 0
+        previous_record_id = previous[0]
+        
+        current_lines = self._line_totals(cursor, record_id)
+        previous_lines = self._line_totals(cursor, previous_record_id)
+        
+        def change(current, previous, present, was_present):
+            if not was_present:
+                return "added"
+            if not present:
+                return "removed"
+            return "unchanged" if current == previous else "changed"
+        
+        rows = []
+        account_categories = {}
+        account_totals = [0, 0]
+        for line_key in list(current_lines) + [key for key in previous_lines if key not in current_lines]:
+            current_line = current_lines.get(line_key)
+            previous_line = previous_lines.get(line_key)
+            line = current_line or previous_line
+            current_total = current_line["total"] if current_line else 0
+            previous_total = previous_line["total"] if previous_line else 0
+            account_totals[0] += current_total
+            account_totals[1] += previous_total
+            rows.append((record_id, previous_record_id, account_number, "line", line_key, line["phone"],
+                         line["line_name"], "", None, current_total, previous_total,
+                         current_total - previous_total,
+                         change(current_total, previous_total, current_line is not None, previous_line is not None)))
+            
+            current_categories = current_line["categories"] if current_line else {}
+            previous_categories = previous_line["categories"] if previous_line else {}
+            for ukey in list(current_categories) + [key for key in previous_categories if key not in current_categories]:
+                name, current_cents = current_categories.get(ukey, [None, 0])
+                previous_name, previous_cents = previous_categories.get(ukey, [None, 0])
+                account_category = account_categories.setdefault(ukey, [name or previous_name, 0, 0, False, False])
+                account_category[1] += current_cents
+                account_category[2] += previous_cents
+                account_category[3] |= ukey in current_categories
+                account_category[4] |= ukey in previous_categories
+                rows.append((record_id, previous_record_id, account_number, "line", line_key, line["phone"],
+                             line["line_name"], ukey, name or previous_name, current_cents, previous_cents,
+                             current_cents - previous_cents,
+                             change(current_cents, previous_cents, ukey in current_categories,
+                                    ukey in previous_categories)))
+        
+        rows.append((record_id, previous_record_id, account_number, "account", "", None, None, "", None,
+                     account_totals[0], account_totals[1], account_totals[0] - account_totals[1],
+                     change(account_totals[0], account_totals[1], True, True)))
+        for ukey, (name, current_cents, previous_cents, present, was_present) in account_categories.items():
+            rows.append((record_id, previous_record_id, account_number, "account", "", None, None, ukey, name,
+                         current_cents, previous_cents, current_cents - previous_cents,
+                         change(current_cents, previous_cents, present, was_present)))
+        
+        cursor.executemany('''
+            INSERT INTO billing_deltas (record_id, previous_record_id, account_number, scope, line_key, phone,
+                                        line_name, category, category_name, current_cents, previous_cents,
+                                        delta_cents, change)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        return len(rows)
+    
+    def _update_deltas(self, cursor, record_id):
+        """Bring billing_deltas up to date after one record was saved or deleted. Only its neighbours
+           can change: the record itself, the invoice that now follows it, and the invoices that were
+           compared against it before (they follow it no more if it moved to another period or was
+           deleted), so bills saved out of order never trigger a rebuild of the whole account."""
+        cursor.execute('SELECT DISTINCT record_id FROM billing_deltas WHERE previous_record_id = ?', (record_id,))
+        affected = {row[0] for row in cursor.fetchall()}
+        
+        cursor.execute('SELECT account_number, period_start FROM billing_records WHERE id = ?', (record_id,))
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('DELETE FROM billing_deltas WHERE record_id = ?', (record_id,))
+        else:
+            affected.add(record_id)
+            account_number, period_start = row
+            if period_start:
+                cursor.execute('''
+                    SELECT id FROM billing_records
+                    WHERE account_number = ? AND (period_start, id) > (?, ?)
+                    ORDER BY period_start, id
+                    LIMIT 1
+                ''', (account_number, period_start, record_id))
+                following = cursor.fetchone()
+                if following is not None:
+                    affected.add(following[0])
+        
+        for affected_id in sorted(affected):
+            self._compute_deltas(cursor, affected_id)
+        return len(affected)
+    
+    def _rebuild_deltas(self, cursor):
+        """Recompute billing_deltas for every stored record. Returns the number of records compared."""
+        cursor.execute('DELETE FROM billing_deltas')
+        cursor.execute('SELECT id FROM billing_records WHERE period_start IS NOT NULL')
+        record_ids = [row[0] for row in cursor.fetchall()]
+        for record_id in record_ids:
+            self._compute_deltas(cursor, record_id)
+        return len(record_ids)
+    
     def get_database_info(self):
         """Get information about the database location and size"""
         try:
@@ -171,56 +740,73 @@ class BillingDatabase:
                 "environment": self.get_environment_info()
             }
     
-    def save_billing_data(self, account_number, json_data, invoice_number=None):
-        """Save or update billing data for an account. If invoice_number is provided,
-           use (account_number, invoice_number) pair to check for existing record and update.
+    def _upsert_billing_record(self, cursor, account_number, json_data, invoice_number=None, overwrite=True):
+        """Insert or update one billing record, its line index and billing deltas on an open cursor (no commit).
+           Returns (record_id, action) with action "created", "updated" or "exists"."""
+        # Convert dict to JSON string if needed
+        total_charges_cents = None
+        period_start = None
+        if isinstance(json_data, dict):
+            json_string = json.dumps(json_data, indent=2)
+            total_charges_cents = (json_data.get("summary") or {}).get("total_charges_cents")
+            period_start = parse_billing_period_start((json_data.get("summary") or {}).get("billing_period"))
+        else:
+            json_string = str(json_data)
+        
+        # Empty invoice numbers are stored as NULL, which never conflicts
+        invoice_number = invoice_number or None
+        
+        if overwrite:
+            conflict_clause = '''DO UPDATE SET
+                json_data = excluded.json_data,
+                total_charges_cents = excluded.total_charges_cents,
+                period_start = excluded.period_start,
+                revision = revision + 1,
+                updated_at = CURRENT_TIMESTAMP'''
+        else:
+            conflict_clause = 'DO NOTHING'
+        
+        cursor.execute(f'''
+            INSERT INTO billing_records (account_number, invoice_number, json_data, total_charges_cents, period_start)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(account_number, invoice_number) {conflict_clause}
+            RETURNING id, revision
+        ''', (account_number, invoice_number, json_string, total_charges_cents, period_start))
+        row = cursor.fetchone()
+        
+        if row is None:
+            # DO NOTHING hit an existing record; the unique index makes this lookup cheap
+            cursor.execute(
+                'SELECT id FROM billing_records WHERE account_number = ? AND invoice_number = ?',
+                (account_number, invoice_number)
+            )
+            return cursor.fetchone()[0], "exists"
+        
+        # revision starts at 0 and is bumped by every DO UPDATE
+        record_id = row[0]
+        action = "created" if row[1] == 0 else "updated"
+        
+        self._index_record_lines(cursor, record_id, account_number, invoice_number,
+                                 json_data if isinstance(json_data, dict) else None)
+        self._update_deltas(cursor, record_id)
+        return record_id, action
+    
+    def save_billing_data(self, account_number, json_data, invoice_number=None, overwrite=True):
+        """Save or update billing data for an account in a single upsert. If invoice_number is provided,
+           the unique (account_number, invoice_number) pair identifies the record: an existing record is
+           updated, or left untouched with action "exists" when overwrite is False.
            If invoice_number is not provided, always insert a new record (accounts can have multiple invoices)."""
         try:
-            # Convert dict to JSON string if needed
-            if isinstance(json_data, dict):
-                json_string = json.dumps(json_data, indent=2)
-            else:
-                json_string = str(json_data)
-            
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                
-                # If invoice provided, try to find existing record for (account, invoice)
-                if invoice_number:
-                    cursor.execute(
-                        'SELECT id FROM billing_records WHERE account_number = ? AND invoice_number = ?',
-                        (account_number, invoice_number)
-                    )
-                    existing_record = cursor.fetchone()
-                    if existing_record:
-                        cursor.execute('''
-                            UPDATE billing_records
-                            SET json_data = ?, updated_at = CURRENT_TIMESTAMP
-                            WHERE id = ?
-                        ''', (json_string, existing_record[0]))
-                        record_id = existing_record[0]
-                        action = "updated"
-                    else:
-                        cursor.execute('''
-                            INSERT INTO billing_records (account_number, invoice_number, json_data)
-                            VALUES (?, ?, ?)
-                        ''', (account_number, invoice_number, json_string))
-                        record_id = cursor.lastrowid
-                        action = "created"
-                else:
-                    # No invoice => always create a new record for this account
-                    cursor.execute('''
-                        INSERT INTO billing_records (account_number, invoice_number, json_data)
-                        VALUES (?, ?, ?)
-                    ''', (account_number, None, json_string))
-                    record_id = cursor.lastrowid
-                    action = "created"
-                
+                record_id, action = self._upsert_billing_record(cursor, account_number, json_data,
+                                                                invoice_number, overwrite)
                 conn.commit()
                 
                 env_info = self.get_environment_info()
-                warning = " (TEMPORARY - will be lost on restart)" if env_info['is_cloud'] else ""
-                print(f"Record {action} with ID: {record_id} for account: {account_number}{warning}")
+                if action != "exists":
+                    warning = " (TEMPORARY - will be lost on restart)" if env_info['is_cloud'] else ""
+                    logger.info("Record %s with ID: %s for account: %s%s", action, record_id, account_number, warning)
                 
                 return {
                     "success": True, 
@@ -230,9 +816,42 @@ class BillingDatabase:
                 }
                 
         except Exception as e:
-            print(f"Error saving billing data: {str(e)}")
+            logger.error("Error saving billing data: %s", e)
             return {"success": False, "error": str(e)}
 
+    def save_billing_batch(self, records):
+        """Save many billing records, and optionally their page text, in one transaction.
+           Each record is a dict with account_number, json_data, invoice_number (optional),
+           overwrite (optional, default True) and document_text (optional keyword arguments of
+           save_document_text). A record that fails is rolled back on its own and the rest are kept.
+           Returns one result per record, shaped like the result of save_billing_data."""
+        results = []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('BEGIN')
+                for record in records:
+                    cursor.execute('SAVEPOINT batch_record')
+                    try:
+                        document_text = record.get("document_text")
+                        if document_text:
+                            self._upsert_document_text(cursor, **document_text)
+                        record_id, action = self._upsert_billing_record(
+                            cursor, record["account_number"], record["json_data"],
+                            record.get("invoice_number"), record.get("overwrite", True))
+                        cursor.execute('RELEASE batch_record')
+                        results.append({"success": True, "id": record_id, "action": action})
+                    except Exception as e:
+                        cursor.execute('ROLLBACK TO batch_record')
+                        cursor.execute('RELEASE batch_record')
+                        results.append({"success": False, "error": str(e)})
+                conn.commit()
+            logger.info("Saved batch of %s record(s)", sum(1 for result in results if result["success"]))
+            return results
+        except Exception as e:
+            logger.error("Error saving billing batch: %s", e)
+            return [{"success": False, "error": str(e)} for _ in records]
+
     def get_billing_data(self, account_number):
         """Retrieve all billing data records for a specific account (returns list of records)."""
         try:
@@ -264,7 +883,7 @@ class BillingDatabase:
                     return result
                 return []
         except Exception as e:
-            print(f"Error retrieving billing data: {str(e)}")
+            logger.error("Error retrieving billing data: %s", e)
             return []
 
     def get_billing_data_by_invoice(self, invoice_number):
@@ -295,7 +914,47 @@ class BillingDatabase:
                     }
                 return None
         except Exception as e:
-            print(f"Error retrieving billing data by invoice: {str(e)}")
+            logger.error("Error retrieving billing data by invoice: %s", e)
+            return None
+
+    def get_record_versions(self, account_number=None, invoice_number=None):
+        """(id, revision, updated_at) of the records get_billing_data (account_number),
+           get_billing_data_by_invoice (invoice_number) or list_all_accounts (neither) would return
+           (collections of every record use the cheaper get_data_generation),
+           without loading their JSON. Used to answer conditional GETs. Returns None on error."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                if account_number is not None:
+                    cursor.execute('''
+                        SELECT id, revision, updated_at FROM billing_records
+                        WHERE account_number = ?
+                        ORDER BY id
+                    ''', (account_number,))
+                elif invoice_number is not None:
+                    cursor.execute('''
+                        SELECT id, revision, updated_at FROM billing_records
+                        WHERE invoice_number = ?
+                        LIMIT 1
+                    ''', (invoice_number,))
+                else:
+                    cursor.execute('SELECT id, revision, updated_at FROM billing_records ORDER BY id')
+                return [list(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error retrieving record versions: %s", e)
+            return None
+
+    def get_data_generation(self):
+        """{"generation": n}, where n changes with every insert, update or delete of billing_records.
+           A single-row read, used to answer conditional GETs over all records. Returns None on error."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT generation FROM data_generation WHERE id = 1')
+                row = cursor.fetchone()
+                return {"generation": row[0]} if row else None
+        except Exception as e:
+            logger.error("Error retrieving data generation: %s", e)
             return None
 
     def list_all_accounts(self, include_json=False):
@@ -359,14 +1018,310 @@ class BillingDatabase:
 
                 return result
         except Exception as e:
-            print(f"Error listing accounts: {str(e)}")
+            logger.error("Error listing accounts: %s", e)
+            return []
+    
+    def list_account_index(self):
+        """List account numbers with their invoice count and last update time.
+           Answered from the account index alone - stored JSON is never read."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT account_number, COUNT(*), MAX(updated_at)
+                    FROM billing_records
+                    GROUP BY account_number
+                    ORDER BY account_number
+                ''')
+                return [
+                    {
+                        "account_number": acct,
+                        "total_invoices": invoice_count,
+                        "last_updated": last_updated
+                    }
+                    for acct, invoice_count, last_updated in cursor.fetchall()
+                ]
+        except Exception as e:
+            logger.error("Error listing account index: %s", e)
             return []
     
+    def get_line_history(self, phone):
+        """Charge timeline of one line across all accounts and invoices, oldest billing period first.
+           Served from the line_charges index; stored JSON is not read."""
+        phone_digits = normalize_phone(phone)
+        if not phone_digits:
+            return []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT record_id, account_number, invoice_number, billing_period, period_start,
+                           phone, line_name, ukey, parent_ukey, name, amount, amount_cents, category, date_range
+                    FROM line_charges
+                    WHERE phone_digits = ?
+                    ORDER BY period_start, record_id, id
+                ''', (phone_digits,))
+                
+                invoices = {}
+                for (record_id, acct, invoice_num, billing_period, period_start, line_phone, line_name,
+                     ukey, parent_ukey, name, amount, amount_cents, category, date_range) in cursor.fetchall():
+                    invoice = invoices.get(record_id)
+                    if invoice is None:
+                        invoice = invoices[record_id] = {
+                            "record_id": record_id,
+                            "account_number": acct,
+                            "invoice_number": invoice_num,
+                            "billing_period": billing_period,
+                            "period_start": period_start,
+                            "phone": line_phone,
+                            "name": line_name,
+                            "total_cents": None,
+                            "charges": []
+                        }
+                    # Same rule as build_bill_totals: the first top-level total of the line wins
+                    if ukey == "total" and parent_ukey is None and invoice["total_cents"] is None:
+                        invoice["total_cents"] = amount_cents
+                    invoice["charges"].append({
+                        "ukey": ukey,
+                        "parent_ukey": parent_ukey,
+                        "name": name,
+                        "amount": amount,
+                        "amount_cents": amount_cents,
+                        "category": category,
+                        "date_range": date_range
+                    })
+                return list(invoices.values())
+        except Exception as e:
+            logger.error("Error retrieving line history: %s", e)
+            return []
+    
+    def get_invoice_changes(self, account_number, invoice_number=None, include_unchanged=False):
+        """Changes of one invoice (the account's latest billing period by default) against the previous
+           invoice, per line and per charge category. Served from billing_deltas; stored JSON is not read.
+           Unchanged lines and categories are left out unless include_unchanged is set.
+           Returns None when the account or invoice is not found."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                if invoice_number:
+                    cursor.execute('''
+                        SELECT id, invoice_number, period_start FROM billing_records
+                        WHERE account_number = ? AND invoice_number = ?
+                    ''', (account_number, invoice_number))
+                else:
+                    cursor.execute('''
+                        SELECT id, invoice_number, period_start FROM billing_records
+                        WHERE account_number = ? AND period_start IS NOT NULL
+                        ORDER BY period_start DESC, id DESC
+                        LIMIT 1
+                    ''', (account_number,))
+                record = cursor.fetchone()
+                if record is None:
+                    return None
+                record_id, record_invoice, period_start = record
+                
+                previous = None
+                if period_start:
+                    cursor.execute('''
+                        SELECT invoice_number, period_start FROM billing_records
+                        WHERE account_number = ? AND (period_start, id) < (?, ?)
+                        ORDER BY period_start DESC, id DESC
+                        LIMIT 1
+                    ''', (account_number, period_start, record_id))
+                    previous = cursor.fetchone()
+                
+                cursor.execute('''
+                    SELECT scope, line_key, phone, line_name, category, category_name,
+                           current_cents, previous_cents, delta_cents, change
+                    FROM billing_deltas
+                    WHERE record_id = ?
+                    ORDER BY id
+                ''', (record_id,))
+                
+                total = None
+                categories = []
+                lines = {}
+                for (scope, line_key, phone, line_name, category, category_name,
+                     current_cents, previous_cents, delta_cents, change) in cursor.fetchall():
+                    delta = {
+                        "current_cents": current_cents,
+                        "previous_cents": previous_cents,
+                        "delta_cents": delta_cents,
+                        "change": change
+                    }
+                    if scope == "account":
+                        if not category:
+                            total = delta
+                        elif include_unchanged or change != "unchanged":
+                            categories.append({"ukey": category, "name": category_name, **delta})
+                        continue
+                    line = lines.setdefault(line_key, {
+                        "phone": phone,
+                        "name": line_name,
+                        "current_cents": 0,
+                        "previous_cents": 0,
+                        "delta_cents": 0,
+                        "change": None,
+                        "categories": []
+                    })
+                    if not category:
+                        line.update(delta)
+                    elif include_unchanged or change != "unchanged":
+                        line["categories"].append({"ukey": category, "name": category_name, **delta})
+                
+                # A line whose total held steady still changed if money moved between its categories
+                changed_lines = [line for line in lines.values()
+                                 if include_unchanged or line["change"] != "unchanged" or line["categories"]]
+                for line in changed_lines:
+                    line["categories"].sort(key=lambda item: abs(item["delta_cents"]), reverse=True)
+                changed_lines.sort(key=lambda item: abs(item["delta_cents"]), reverse=True)
+                categories.sort(key=lambda item: abs(item["delta_cents"]), reverse=True)
+                
+                return {
+                    "account_number": account_number,
+                    "invoice_number": record_invoice,
+                    "period_start": period_start,
+                    "previous_invoice_number": previous[0] if previous else None,
+                    "previous_period_start": previous[1] if previous else None,
+                    "total": total,
+                    "categories": categories,
+                    "lines": changed_lines
+                }
+        except Exception as e:
+            logger.error("Error retrieving invoice changes: %s", e)
+            return None
+    
+    # Column order of exported charge rows
+    EXPORT_COLUMNS = [
+        "account_number", "invoice_number", "billing_period", "period_start", "phone", "line_name",
+        "parent_ukey", "ukey", "name", "amount", "amount_cents", "category", "date_range"
+    ]
+    
+    def iter_line_charges(self, account_number=None, period_from=None, period_to=None, batch_size=500):
+        """Yield one tuple per charge (columns in EXPORT_COLUMNS order), so memory use does not
+           depend on how many rows match. Rows are read in batches paged by sort key, each on its
+           own short-lived connection, so a slow download never holds a read open against writers.
+           period_from / period_to are inclusive YYYY-MM-DD bounds on the billing period start."""
+        conditions = []
+        params = []
+        if account_number:
+            conditions.append("account_number = ?")
+            params.append(account_number)
+        if period_from:
+            conditions.append("period_start >= ?")
+            params.append(period_from)
+        if period_to:
+            conditions.append("period_start <= ?")
+            params.append(period_to)
+        key_width = len(self.EXPORT_COLUMNS)
+        
+        last_key = None
+        while True:
+            page_conditions = list(conditions)
+            page_params = list(params)
+            if last_key is not None:
+                last_account, last_period, last_record, last_id = last_key
+                if last_period is None:
+                    # NULL periods sort first: the account's remaining NULL-period rows, then everything after
+                    page_conditions.append(
+                        "(account_number > ? OR (account_number = ? AND "
+                        "(period_start IS NOT NULL OR (record_id, id) > (?, ?))))"
+                    )
+                    page_params.extend([last_account, last_account, last_record, last_id])
+                else:
+                    page_conditions.append("(account_number, period_start, record_id, id) > (?, ?, ?, ?)")
+                    page_params.extend(last_key)
+            where_clause = f"WHERE {' AND '.join(page_conditions)}" if page_conditions else ""
+            
+            conn = sqlite3.connect(self.db_path)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f'''
+                    SELECT {", ".join(self.EXPORT_COLUMNS)}, record_id, id
+                    FROM line_charges
+                    {where_clause}
+                    ORDER BY account_number, period_start, record_id, id
+                    LIMIT ?
+                ''', page_params + [batch_size])
+                rows = cursor.fetchall()
+            finally:
+                conn.close()
+            
+            for row in rows:
+                yield row[:key_width]
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]
+            last_key = (last[0], last[3], last[key_width], last[key_width + 1])
+    
+    def search_billing_lines(self, query, limit=20, offset=0):
+        """Full-text search over line names, phones, charge names and inline contexts.
+           Every whitespace-separated term must match; hits are ranked by bm25."""
+        if not self.fts_enabled:
+            return {"success": False, "error": "Full-text search is not available (SQLite built without FTS5)"}
+        
+        # Quote each term so characters like '-' in phone numbers are not read as FTS operators
+        terms = [term.replace('"', '""') for term in query.split() if term.strip()]
+        if not terms:
+            return {"success": True, "total": 0, "hits": []}
+        match_expression = " ".join(f'"{term}"' for term in terms)
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'SELECT COUNT(*) FROM billing_search WHERE billing_search MATCH ?',
+                    (match_expression,)
+                )
+                total = cursor.fetchone()[0]
+                
+                cursor.execute('''
+                    SELECT l.record_id, l.account_number, l.invoice_number, l.phone, l.line_name,
+                           snippet(billing_search, -1, '[', ']', '...', 12),
+                           bm25(billing_search) AS score, r.updated_at
+                    FROM billing_search
+                    JOIN billing_lines l ON l.id = billing_search.rowid
+                    JOIN billing_records r ON r.id = l.record_id
+                    WHERE billing_search MATCH ?
+                    ORDER BY score
+                    LIMIT ? OFFSET ?
+                ''', (match_expression, limit, offset))
+                
+                hits = [
+                    {
+                        "record_id": record_id,
+                        "account_number": acct,
+                        "invoice_number": invoice_num,
+                        "phone": phone,
+                        "name": line_name,
+                        "snippet": snippet,
+                        "score": round(score, 4),
+                        "updated_at": updated_at
+                    }
+                    for record_id, acct, invoice_num, phone, line_name, snippet, score, updated_at in cursor.fetchall()
+                ]
+                return {"success": True, "total": total, "hits": hits}
+        except Exception as e:
+            logger.error("Error searching billing data: %s", e)
+            return {"success": False, "error": str(e)}
+    
     def delete_billing_data(self, account_number):
         """Delete billing data for a specific account (removes all invoices for that account)"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
+                cursor.execute(
+                    'DELETE FROM billing_deltas WHERE record_id IN (SELECT id FROM billing_records WHERE account_number = ?)',
+                    (account_number,)
+                )
+                cursor.execute(
+                    'DELETE FROM billing_lines WHERE account_number = ?',
+                    (account_number,)
+                )
+                cursor.execute(
+                    'DELETE FROM line_charges WHERE account_number = ?',
+                    (account_number,)
+                )
                 cursor.execute(
                     'DELETE FROM billing_records WHERE account_number = ?',
                     (account_number,)
@@ -374,31 +1329,184 @@ class BillingDatabase:
                 
                 if cursor.rowcount > 0:
                     conn.commit()
-                    print(f"Deleted record(s) for account: {account_number}")
+                    logger.info("Deleted record(s) for account: %s", account_number)
                     return {"success": True, "deleted": True}
                 else:
                     return {"success": True, "deleted": False, "message": "Account not found"}
                     
         except Exception as e:
-            print(f"Error deleting billing data: {str(e)}")
+            logger.error("Error deleting billing data: %s", e)
             return {"success": False, "error": str(e)}
     
-    def backup_database(self, backup_path=None):
-        """Create a backup of the database"""
+    def _upsert_document_text(self, cursor, content_hash, page_text_blob, account_number=None, invoice_number=None,
+                              pdf_filename=None, provider="verizon", page_range="", total_pages=0,
+                              required_keywords=None):
+        cursor.execute('''
+            INSERT INTO document_text (content_hash, account_number, invoice_number, pdf_filename,
+                                       provider, page_range, total_pages, required_keywords, page_text)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash) DO UPDATE SET
+                account_number = excluded.account_number,
+                invoice_number = excluded.invoice_number,
+                pdf_filename = excluded.pdf_filename,
+                provider = excluded.provider,
+                page_range = excluded.page_range,
+                required_keywords = excluded.required_keywords
+        ''', (content_hash, account_number, invoice_number, pdf_filename, provider, page_range or "",
+              total_pages, json.dumps(required_keywords), sqlite3.Binary(page_text_blob)))
+    
+    def save_document_text(self, content_hash, page_text_blob, account_number=None, invoice_number=None,
+                           pdf_filename=None, provider="verizon", page_range="", total_pages=0,
+                           required_keywords=None):
+        """Store the compressed page text of a document keyed by its content hash.
+           required_keywords are the custom keywords it was extracted with (None = provider defaults).
+           Re-uploading the same file only refreshes its metadata."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                self._upsert_document_text(cursor, content_hash, page_text_blob, account_number, invoice_number,
+                                           pdf_filename, provider, page_range, total_pages, required_keywords)
+                conn.commit()
+                return {"success": True, "content_hash": content_hash}
+        except Exception as e:
+            logger.error("Error saving document text: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def get_document_text(self, content_hash):
+        """Retrieve a stored document (metadata and compressed page text) by content hash."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM document_text WHERE content_hash = ?', (content_hash,))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except Exception as e:
+            logger.error("Error retrieving document text: %s", e)
+            return None
+
+    def list_document_text(self, account_numbers=None, include_text=False):
+        """List stored documents, optionally restricted to some accounts.
+           The compressed page text is only loaded when include_text is True."""
+        columns = ("content_hash, account_number, invoice_number, pdf_filename, provider, page_range, total_pages, "
+                   "required_keywords, created_at")
+        if include_text:
+            columns += ", page_text"
         try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                if account_numbers:
+                    placeholders = ",".join("?" for _ in account_numbers)
+                    cursor.execute(f'''
+                        SELECT {columns} FROM document_text
+                        WHERE account_number IN ({placeholders})
+                        ORDER BY account_number, created_at
+                    ''', tuple(account_numbers))
+                else:
+                    cursor.execute(f'''
+                        SELECT {columns} FROM document_text
+                        ORDER BY account_number, created_at
+                    ''')
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error("Error listing document text: %s", e)
+            return []
+    
+    def has_document_text(self, content_hash):
+        """Whether page text is already stored for a content hash (without loading it)."""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT 1 FROM document_text WHERE content_hash = ?', (content_hash,))
+                return cursor.fetchone() is not None
+        except Exception as e:
+            logger.error("Error checking document text: %s", e)
+            return False
+
+    def acquire_extraction_lease(self, flight_key, owner, lease_seconds):
+        """Try to become the process that extracts flight_key. Returns acquired=True for the new owner,
+           otherwise the stored result of a finished extraction (or None while it is still running).
+           Expired leases and results are removed first, so a crashed owner is taken over."""
+        now = time.time()
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM extraction_leases WHERE expires_at < ?', (now,))
+                cursor.execute('''
+                    INSERT INTO extraction_leases (flight_key, owner, expires_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(flight_key) DO NOTHING
+                    RETURNING owner
+                ''', (flight_key, owner, now + lease_seconds))
+                acquired = cursor.fetchone() is not None
+                result = None
+                if not acquired:
+                    cursor.execute('SELECT result FROM extraction_leases WHERE flight_key = ?', (flight_key,))
+                    row = cursor.fetchone()
+                    result = row[0] if row else None
+                conn.commit()
+                return {"success": True, "acquired": acquired, "result": result}
+        except Exception as e:
+            logger.error("Error acquiring extraction lease: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def complete_extraction_lease(self, flight_key, owner, result_blob, result_ttl):
+        """Publish the result of an extraction for waiting processes; it is kept for result_ttl seconds."""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE extraction_leases
+                    SET result = ?, expires_at = ?
+                    WHERE flight_key = ? AND owner = ?
+                ''', (sqlite3.Binary(result_blob), time.time() + result_ttl, flight_key, owner))
+                conn.commit()
+                return {"success": True, "published": cursor.rowcount > 0}
+        except Exception as e:
+            logger.error("Error completing extraction lease: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def release_extraction_lease(self, flight_key, owner):
+        """Drop a lease without a result (the extraction failed) so another process can retry."""
+        try:
+            with sqlite3.connect(self.db_path, timeout=30) as conn:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM extraction_leases WHERE flight_key = ? AND owner = ?', (flight_key, owner))
+                conn.commit()
+                return {"success": True}
+        except Exception as e:
+            logger.error("Error releasing extraction lease: %s", e)
+            return {"success": False, "error": str(e)}
+
+    def backup_database(self, backup_path=None, pages_per_step=256, step_sleep=0.05, retention=None):
+        """Create a consistent backup of the live database using the SQLite online backup API.
+           Pages are copied in steps of pages_per_step with step_sleep seconds between steps so
+           writers are not blocked for the whole copy. When retention is set, only the newest
+           `retention` automatic backups are kept."""
+        try:
+            backup_dir = os.getenv('BACKUP_DIR') or os.path.dirname(self.db_path)
             if backup_path is None:
-                # Create backup in the same directory as the database
-                db_dir = os.path.dirname(self.db_path)
+                # Create backup in the backup directory (defaults to the database directory)
+                os.makedirs(backup_dir, exist_ok=True)
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                backup_path = os.path.join(db_dir, f'billing_data_backup_{timestamp}.db')
+                backup_path = os.path.join(backup_dir, f'billing_data_backup_{timestamp}.db')
+            
+            source = sqlite3.connect(self.db_path)
+            destination = sqlite3.connect(backup_path)
+            try:
+                source.backup(destination, pages=pages_per_step, sleep=step_sleep)
+            finally:
+                destination.close()
+                source.close()
             
-            # Copy the database file
-            shutil.copy2(self.db_path, backup_path)
+            removed = self.prune_backups(retention, backup_dir) if retention else []
             
             return {
                 "success": True,
                 "backup_path": backup_path,
-                "original_path": self.db_path
+                "original_path": self.db_path,
+                "removed_backups": removed
             }
             
         except Exception as e:
@@ -407,20 +1515,138 @@ class BillingDatabase:
                 "error": str(e)
             }
     
-    def vacuum_database(self):
-        """Optimize the database by running VACUUM"""
+    def prune_backups(self, retention, backup_dir=None):
+        """Delete all but the newest `retention` automatic backups. Returns the removed paths."""
+        backup_dir = backup_dir or os.getenv('BACKUP_DIR') or os.path.dirname(self.db_path)
+        # Timestamped names sort chronologically
+        backups = sorted(glob.glob(os.path.join(backup_dir, 'billing_data_backup_*.db')))
+        removed = []
+        for old_backup in backups[:max(0, len(backups) - retention)]:
+            try:
+                os.remove(old_backup)
+                removed.append(old_backup)
+            except OSError as e:
+                logger.error("Error removing old backup %s: %s", old_backup, e)
+        return removed
+    
+    def vacuum_database(self, max_pages=None, full=False):
+        """Reclaim free pages with a bounded PRAGMA incremental_vacuum step.
+           max_pages limits the step (all free pages only when None; 0 or less skips the step);
+           full=True runs a complete VACUUM."""
+        if not full and max_pages is not None and int(max_pages) <= 0:
+            return {
+                "success": True,
+                "message": "Vacuum step skipped (max_pages <= 0)",
+                "pages_freed": 0
+            }
         try:
             with sqlite3.connect(self.db_path) as conn:
-                conn.execute('VACUUM')
+                cursor = conn.cursor()
+                cursor.execute("PRAGMA freelist_count")
+                free_before = cursor.fetchone()[0]
+                
+                if full:
+                    conn.execute('VACUUM')
+                else:
+                    # executescript steps the pragma to completion (execute() would free a single page)
+                    pages = f"({int(max_pages)})" if max_pages is not None else ""
+                    conn.executescript(f"PRAGMA incremental_vacuum{pages};")
                 conn.commit()
+                
+                cursor.execute("PRAGMA freelist_count")
+                free_after = cursor.fetchone()[0]
             
             return {
                 "success": True,
-                "message": "Database optimized successfully"
+                "message": "Database optimized successfully",
+                "pages_freed": free_before - free_after,
+                "free_pages_remaining": free_after
             }
             
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
-            }
\ No newline at end of file
+            }
+    
+    def start_maintenance_scheduler(self, backup_interval_hours=None, backup_retention=None,
+                                    vacuum_interval_minutes=None, vacuum_max_pages=None):
+        """Start a daemon thread that periodically backs up and incrementally vacuums the database.
+           Unset arguments come from BACKUP_INTERVAL_HOURS (24, 0 disables), BACKUP_RETENTION (7),
+           VACUUM_INTERVAL_MINUTES (60, 0 disables) and VACUUM_MAX_PAGES (500)."""
+        if getattr(self, '_maintenance_thread', None) and self._maintenance_thread.is_alive():
+            return self._maintenance_thread
+        
+        if backup_interval_hours is None:
+            backup_interval_hours = float(os.getenv('BACKUP_INTERVAL_HOURS', 24))
+        if backup_retention is None:
+            backup_retention = int(os.getenv('BACKUP_RETENTION', 7))
+        if vacuum_interval_minutes is None:
+            vacuum_interval_minutes = float(os.getenv('VACUUM_INTERVAL_MINUTES', 60))
+        if vacuum_max_pages is None:
+            vacuum_max_pages = int(os.getenv('VACUUM_MAX_PAGES', 500))
+        
+        backup_interval = backup_interval_hours * 3600
+        # A step of 0 pages or less is never run, so don't schedule it
+        vacuum_interval = vacuum_interval_minutes * 60 if vacuum_max_pages > 0 else 0
+        if backup_interval <= 0 and vacuum_interval <= 0:
+            return None
+        
+        self._maintenance_stop = threading.Event()
+        
+        def run():
+            now = time.monotonic()
+            next_backup = now + backup_interval if backup_interval > 0 else None
+            next_vacuum = now + vacuum_interval if vacuum_interval > 0 else None
+            while True:
+                due_times = [t for t in (next_backup, next_vacuum) if t is not None]
+                if self._maintenance_stop.wait(max(0, min(due_times) - time.monotonic())):
+                    break
+                now = time.monotonic()
+                if next_vacuum is not None and now >= next_vacuum:
+                    result = self.vacuum_database(max_pages=vacuum_max_pages)
+                    if not result["success"]:
+                        logger.error("Scheduled vacuum failed: %s", result['error'])
+                    next_vacuum = now + vacuum_interval
+                if next_backup is not None and now >= next_backup:
+                    result = self.backup_database(retention=backup_retention)
+                    if result["success"]:
+                        logger.info("Scheduled backup written to %s", result['backup_path'])
+                    else:
+                        logger.error("Scheduled backup failed: %s", result['error'])
+                    next_backup = now + backup_interval
+        
+        self._maintenance_thread = threading.Thread(target=run, name="billing-db-maintenance", daemon=True)
+        self._maintenance_thread.start()
+        return self._maintenance_thread
+    
+    def stop_maintenance_scheduler(self):
+        """Stop the maintenance thread started by start_maintenance_scheduler"""
+        if getattr(self, '_maintenance_stop', None):
+            self._maintenance_stop.set()
+
+
+class LazyBillingDatabase:
+    """Stand-in for a BillingDatabase that is created on first use.
+       Creating the database runs migrations and directory probing, so it is deferred out of
+       module import; initialization happens exactly once even with concurrent first requests."""
+
+    def __init__(self, db_path=None):
+        self._db_path = db_path
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def initialized(self):
+        return self._instance is not None
+
+    def get(self):
+        """Return the BillingDatabase, creating it on the first call"""
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = BillingDatabase(self._db_path)
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,91 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+def default_deadline_seconds():
+    """Global extraction time budget from EXTRACTION_DEADLINE_SECONDS (0 or unset: no limit)"""
+    try:
+        return float(os.getenv('EXTRACTION_DEADLINE_SECONDS', 120))
+    except ValueError:
+        return 0.0
+
+
+class ExtractionDeadline:
+    """Time budget for one extraction run. Extractors call expired() between pages and contacts
+       and stop early once it returns True; pages_processed and contacts_processed record how far
+       they got so the run can be resumed."""
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.expires_at = time.monotonic() + self.seconds if self.seconds else None
+        self.hit = False
+        self.pages_processed = 0
+        self.contacts_processed = 0
+
+    @classmethod
+    def for_request(cls, requested_seconds=None):
+        """Deadline for a request: the requested budget, capped by the global one when that is set"""
+        global_seconds = default_deadline_seconds()
+        seconds = global_seconds
+        if requested_seconds:
+            seconds = min(requested_seconds, global_seconds) if global_seconds > 0 else requested_seconds
+        return cls(seconds)
+
+    def expired(self):
+        if not self.hit and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.hit = True
+        return self.hit
+
+
+class ResumeCache:
+    """In-memory store for the state of partial extractions, keyed by an opaque resume token.
+       Bounded in size (oldest entries are dropped first) and in age."""
+
+    def __init__(self, max_entries=None, ttl_seconds=None):
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv('RESUME_CACHE_SIZE', 32))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv('RESUME_TTL_SECONDS', 600))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self, now):
+        # Caller holds self._lock
+        while self._entries:
+            token, (stored_at, _) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_entries or now - stored_at > self.ttl_seconds:
+                del self._entries[token]
+            else:
+                break
+
+    def put(self, state):
+        """Store state and return its resume token"""
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            now = time.monotonic()
+            self._entries[token] = (now, state)
+            self._prune(now)
+        return token
+
+    def get(self, token):
+        """Return the state stored for token, or None when it is unknown or expired"""
+        with self._lock:
+            self._prune(time.monotonic())
+            entry = self._entries.get(token)
+        return entry[1] if entry else None
+
+    def take(self, token):
+        """Remove and return the state stored for token (None when unknown or expired), so
+           concurrent requests with the same token cannot both continue it"""
+        with self._lock:
+            self._prune(time.monotonic())
+            entry = self._entries.pop(token, None)
+        return entry[1] if entry else None
+
+    def restore(self, token, state):
+        """Put back state taken for a continuation that did not run, so the token can be retried"""
+        with self._lock:
+            now = time.monotonic()
+            self._entries[token] = (now, state)
+            self._prune(now)
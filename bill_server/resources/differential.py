@@ -0,0 +1,249 @@
+import argparse
+import contextlib
+import copy
+import importlib
+import json
+import os
+import time
+
+from .memory import DocumentScope
+from .page_text import PageTextDocument, decompress_page_texts, extract_page_texts
+
+# The extractors an engine must provide; each is called with the same inputs as in run_bill_extraction
+ENGINE_FUNCTIONS = (
+    "extract_money_from_bill_summary",
+    "find_previous_balance_page",
+    "extract_money_amounts_for_contacts"
+)
+REFERENCE_ENGINE = "resources.reference_engine"
+CANDIDATE_ENGINE = "resources.verizonbus_api"
+
+
+def load_engine(spec):
+    """Import an engine given as "package.module" or "package.module:attribute" and check it
+       provides every function in ENGINE_FUNCTIONS"""
+    module_name, _, attribute = spec.partition(":")
+    engine = importlib.import_module(module_name)
+    if attribute:
+        engine = getattr(engine, attribute)
+    missing = [name for name in ENGINE_FUNCTIONS if not callable(getattr(engine, name, None))]
+    if missing:
+        raise ValueError(f"Engine {spec} is missing: {', '.join(missing)}")
+    return engine
+
+def load_corpus(paths, db=None):
+    """Yield (name, document) for every PDF under paths and, with db, every stored document text.
+       Stored page text lets the corpus consist of anonymized bills without the original PDFs."""
+    pdf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdf_files.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        else:
+            pdf_files.append(path)
+
+    for pdf_file in sorted(pdf_files):
+        # Engines see page text extracted once, as in /extract-text
+        with DocumentScope() as documents:
+            page_texts = extract_page_texts(documents.open(pdf_file))
+        yield pdf_file, PageTextDocument(page_texts)
+
+    if db is not None:
+        for doc in db.list_document_text():
+            stored = db.get_document_text(doc["content_hash"])
+            if stored:
+                yield f"db:{doc['content_hash'][:12]}", PageTextDocument(decompress_page_texts(stored["page_text"]))
+
+def normalize(value):
+    """JSON view of an extractor result with whitespace collapsed in strings, so that only
+       differences a client could see are reported"""
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+def flatten(value, path=""):
+    """Map every leaf of a normalized result to its path, e.g. "[0].money_amounts[2].amount" """
+    if isinstance(value, dict):
+        if not value:
+            return {path: {}}
+        leaves = {}
+        for key, item in value.items():
+            leaves.update(flatten(item, f"{path}.{key}" if path else key))
+        return leaves
+    if isinstance(value, list):
+        if not value:
+            return {path: []}
+        leaves = {}
+        for index, item in enumerate(value):
+            leaves.update(flatten(item, f"{path}[{index}]"))
+        return leaves
+    return {path: value}
+
+def diff_outputs(reference, candidate):
+    """Field-by-field differences between two normalized results: [(path, reference, candidate)]"""
+    missing = object()
+    reference_leaves = flatten(reference)
+    candidate_leaves = flatten(candidate)
+    differences = []
+    for path in sorted(set(reference_leaves) | set(candidate_leaves)):
+        expected = reference_leaves.get(path, missing)
+        actual = candidate_leaves.get(path, missing)
+        if expected != actual:
+            differences.append((path,
+                                None if expected is missing else expected,
+                                None if actual is missing else actual))
+    return differences
+
+def stage_inputs(document, provider="verizon"):
+    """Inputs shared by both engines, computed once with the live pipeline"""
+    from .verizonbus_api import find_bill_summary_page, detect_contacts, parse_page_range
+
+    pages_to_extract = parse_page_range("", len(document))
+    bill_summary_data = find_bill_summary_page(document, pages_to_extract, provider)
+    if bill_summary_data is not None:
+        bill_summary_data = {key: bill_summary_data[key] for key in ("page_number", "page_text", "text_length")}
+    return {
+        "pages_to_extract": pages_to_extract,
+        "bill_summary_data": bill_summary_data,
+        "contacts": detect_contacts(document, pages_to_extract, provider)
+    }
+
+def run_stage(engine, stage, document, inputs, provider="verizon"):
+    """Run one extractor of an engine on a copy of the shared inputs"""
+    if stage == "extract_money_from_bill_summary":
+        return engine.extract_money_from_bill_summary(copy.deepcopy(inputs["bill_summary_data"]), provider)
+    if stage == "find_previous_balance_page":
+        return engine.find_previous_balance_page(document, inputs["pages_to_extract"], provider)
+    return engine.extract_money_amounts_for_contacts(document, copy.deepcopy(inputs["contacts"]), None,
+                                                     provider, inputs["pages_to_extract"])
+
+def timed_stage(engine, stage, document, inputs, provider, repeat):
+    """Best-of-repeat wall time in milliseconds and the result of the last run"""
+    best = None
+    result = None
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        result = run_stage(engine, stage, document, inputs, provider)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def compare_document(report, name, document, reference, candidate, provider, repeat, max_mismatches):
+    """Time both engines on every stage of one document and add the differences to report"""
+    inputs = stage_inputs(document, provider)
+    for stage in ENGINE_FUNCTIONS:
+        # Warm-up run so config loading and regex compilation don't count against either engine
+        run_stage(reference, stage, document, inputs, provider)
+        run_stage(candidate, stage, document, inputs, provider)
+        reference_ms, expected = timed_stage(reference, stage, document, inputs, provider, repeat)
+        candidate_ms, actual = timed_stage(candidate, stage, document, inputs, provider, repeat)
+
+        stage_report = report["stages"][stage]
+        stage_report["reference_ms"] += reference_ms
+        stage_report["candidate_ms"] += candidate_ms
+
+        differences = diff_outputs(normalize(expected), normalize(actual))
+        stage_report["mismatched_fields"] += len(differences)
+        report["mismatched_fields"] += len(differences)
+        for path, expected_value, actual_value in differences[:max_mismatches]:
+            report["mismatches"].append({
+                "document": name,
+                "stage": stage,
+                "path": path,
+                "reference": expected_value,
+                "candidate": actual_value
+            })
+
+def compare_engines(corpus, reference, candidate, provider="verizon", repeat=3, max_mismatches=20, quiet=True):
+    """Run both engines over every document of the corpus, diff their normalized outputs and time them.
+       Returns a report with per-stage timings, the speed ratio (reference time / candidate time)
+       and the first max_mismatches differences of each document and stage.
+       With quiet, the extractors' own output is discarded; writing it would dominate the timings."""
+    report = {
+        "success": True,
+        "documents": 0,
+        "pages": 0,
+        "mismatched_fields": 0,
+        "stages": {stage: {"reference_ms": 0.0, "candidate_ms": 0.0, "mismatched_fields": 0}
+                   for stage in ENGINE_FUNCTIONS},
+        "mismatches": [],
+        "errors": []
+    }
+
+    devnull = open(os.devnull, "w") if quiet else None
+    for name, document in corpus:
+        try:
+            with contextlib.redirect_stdout(devnull) if quiet else contextlib.nullcontext():
+                compare_document(report, name, document, reference, candidate, provider, repeat, max_mismatches)
+            report["documents"] += 1
+            report["pages"] += len(document)
+        except Exception as e:
+            report["errors"].append({"document": name, "error": str(e)})
+        finally:
+            document.close()
+    if devnull is not None:
+        devnull.close()
+
+    reference_total = sum(stage["reference_ms"] for stage in report["stages"].values())
+    candidate_total = sum(stage["candidate_ms"] for stage in report["stages"].values())
+    for stage in report["stages"].values():
+        stage["speed_ratio"] = round(stage["reference_ms"] / stage["candidate_ms"], 3) if stage["candidate_ms"] > 0 else None
+        stage["reference_ms"] = round(stage["reference_ms"], 3)
+        stage["candidate_ms"] = round(stage["candidate_ms"], 3)
+    report["reference_ms"] = round(reference_total, 3)
+    report["candidate_ms"] = round(candidate_total, 3)
+    report["speed_ratio"] = round(reference_total / candidate_total, 3) if candidate_total > 0 else None
+    report["success"] = report["mismatched_fields"] == 0 and not report["errors"]
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare an extraction engine against the frozen reference engine")
+    parser.add_argument("paths", nargs="*", help="PDF files or directories of PDFs")
+    parser.add_argument("--db", dest="db_path", nargs="?", const="", default=None,
+                        help="Also use the page text stored in billing_data.db (optionally its path)")
+    parser.add_argument("--reference", default=REFERENCE_ENGINE, help=f"Reference engine (default: {REFERENCE_ENGINE})")
+    parser.add_argument("--candidate", default=CANDIDATE_ENGINE, help=f"Candidate engine (default: {CANDIDATE_ENGINE})")
+    parser.add_argument("--provider", default="verizon", help="Provider whose keywords are used")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage; the fastest counts")
+    parser.add_argument("--verbose", action="store_true", help="Show the extractors' own output")
+    parser.add_argument("--json", dest="json_path", default=None, help="Write the full report to this file")
+    args = parser.parse_args(argv)
+
+    if not args.paths and args.db_path is None:
+        parser.error("give at least one PDF path or --db")
+
+    db = None
+    if args.db_path is not None:
+        from .database_utils import BillingDatabase
+        db = BillingDatabase(args.db_path or None)
+
+    reference = load_engine(args.reference)
+    candidate = load_engine(args.candidate)
+    report = compare_engines(load_corpus(args.paths, db), reference, candidate, args.provider, args.repeat,
+                             quiet=not args.verbose)
+
+    print(f"Compared {report['documents']} document(s), {report['pages']} page(s): "
+          f"{report['mismatched_fields']} mismatched field(s), {len(report['errors'])} error(s)")
+    for stage, values in report["stages"].items():
+        print(f"  {stage}: reference {values['reference_ms']}ms, candidate {values['candidate_ms']}ms, "
+              f"speed ratio {values['speed_ratio']}x, {values['mismatched_fields']} mismatched field(s)")
+    print(f"  total: reference {report['reference_ms']}ms, candidate {report['candidate_ms']}ms, "
+          f"speed ratio {report['speed_ratio']}x")
+    for mismatch in report["mismatches"]:
+        print(f"  - {mismatch['document']} {mismatch['stage']} {mismatch['path']}: "
+              f"{mismatch['reference']!r} != {mismatch['candidate']!r}")
+    for error in report["errors"]:
+        print(f"  - {error['document']}: {error['error']}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0 if report["success"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
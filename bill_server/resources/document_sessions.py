@@ -0,0 +1,139 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from .memory import close_document, trim_mupdf_store
+from .page_text import content_hash, extract_page_texts
+
+
+class DocumentSession:
+    """An uploaded PDF kept server-side: the open fitz document and the text of every page"""
+
+    def __init__(self, document_id, pdf_document, page_texts, file_hash, pdf_filename, size_bytes):
+        self.document_id = document_id
+        self.pdf_document = pdf_document
+        self.page_texts = page_texts
+        self.file_hash = file_hash
+        self.pdf_filename = pdf_filename
+        self.total_pages = len(page_texts)
+        self.size_bytes = size_bytes
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+
+    def close(self):
+        close_document(self.pdf_document)
+        trim_mupdf_store()
+
+    def to_dict(self, ttl_seconds):
+        return {
+            "document_id": self.document_id,
+            "pdf_filename": self.pdf_filename,
+            "total_pages": self.total_pages,
+            "content_hash": self.file_hash,
+            "size_bytes": self.size_bytes,
+            "expires_in": max(0, round(ttl_seconds - (time.monotonic() - self.last_used)))
+        }
+
+
+class DocumentSessionCache:
+    """LRU of DocumentSessions bounded by total size and entry count; idle sessions expire after
+       ttl_seconds. Follow-up extractions reference a session by id instead of re-uploading the PDF."""
+
+    def __init__(self, max_bytes=None, max_entries=None, ttl_seconds=None):
+        self.max_bytes = int(max_bytes if max_bytes is not None
+                             else float(os.getenv('DOCUMENT_SESSION_MAX_MB', 256)) * 1024 * 1024)
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv('DOCUMENT_SESSION_MAX_ENTRIES', 64))
+        self.ttl_seconds = float(ttl_seconds if ttl_seconds is not None else os.getenv('DOCUMENT_SESSION_TTL_SECONDS', 1800))
+
+        self._sessions = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "created": 0,
+            "hits": 0,
+            "misses": 0,
+            "evicted": 0,
+            "expired": 0,
+            "rejected_too_large": 0
+        }
+
+    def create(self, file_content, pdf_document, pdf_filename=""):
+        """Extract the text of every page and keep the document as a new session.
+           Returns the DocumentSession, or None if the document alone exceeds the size budget
+           (the caller keeps ownership of pdf_document in that case)."""
+        page_texts = extract_page_texts(pdf_document)
+        size_bytes = len(file_content) + sum(len(text) for text in page_texts)
+        if size_bytes > self.max_bytes:
+            with self._lock:
+                self._stats["rejected_too_large"] += 1
+            return None
+
+        session = DocumentSession(secrets.token_urlsafe(16), pdf_document, page_texts,
+                                  content_hash(file_content), pdf_filename, size_bytes)
+        with self._lock:
+            self._sessions[session.document_id] = session
+            self._size_bytes += size_bytes
+            self._stats["created"] += 1
+            evicted = self._evict(time.monotonic())
+        self._close_all(evicted)
+        return session
+
+    def get(self, document_id):
+        """Return the session and mark it recently used, or None when unknown or expired"""
+        with self._lock:
+            evicted = self._evict(time.monotonic())
+            session = self._sessions.get(document_id)
+            if session is None:
+                self._stats["misses"] += 1
+            else:
+                self._sessions.move_to_end(document_id)
+                session.last_used = time.monotonic()
+                self._stats["hits"] += 1
+        self._close_all(evicted)
+        return session
+
+    def remove(self, document_id):
+        """Close and drop a session. Returns False if it did not exist."""
+        with self._lock:
+            session = self._pop(document_id)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def _pop(self, document_id):
+        # Caller holds self._lock
+        session = self._sessions.pop(document_id, None)
+        if session is not None:
+            self._size_bytes -= session.size_bytes
+        return session
+
+    def _evict(self, now):
+        # Caller holds self._lock. Drops expired sessions, then the least recently used ones over budget.
+        evicted = []
+        for document_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.ttl_seconds:
+                evicted.append(self._pop(document_id))
+                self._stats["expired"] += 1
+        while self._sessions and (self._size_bytes > self.max_bytes or len(self._sessions) > self.max_entries):
+            evicted.append(self._pop(next(iter(self._sessions))))
+            self._stats["evicted"] += 1
+        return evicted
+
+    def _close_all(self, sessions):
+        for session in sessions:
+            session.close()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "sessions": len(self._sessions),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds
+            })
+        return stats
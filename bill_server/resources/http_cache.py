@@ -0,0 +1,59 @@
+import gzip
+import hashlib
+import json
+import os
+
+from flask import current_app, request
+from werkzeug.http import is_resource_modified
+
+# Part of every ETag; bump it when the body built from the same records changes shape
+RESPONSE_VERSION = "1"
+
+
+def record_etag(versions):
+    """ETag for a response built from billing records, given their (id, revision, updated_at) rows
+       (BillingDatabase.get_record_versions), or for all records, the data generation
+       (BillingDatabase.get_data_generation). Either changes with every save or delete."""
+    return hashlib.sha1(
+        json.dumps([RESPONSE_VERSION, versions], separators=(",", ":")).encode("utf-8")
+    ).hexdigest()
+
+def _set_validators(response, etag):
+    # Weak: the gzip and identity encodings of a body share the ETag. No Last-Modified: updated_at has
+    # one-second resolution and doesn't move when a record is deleted, so it can't validate a body.
+    response.set_etag(etag, weak=True)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+def not_modified_response(versions):
+    """A 304 response when the client's If-None-Match matches the current records; None when the
+       body must be built. If-Modified-Since alone never gets a 304. Call before loading any JSON."""
+    if not versions or not request.if_none_match:
+        return None
+    etag = record_etag(versions)
+    if is_resource_modified(request.environ, etag=etag):
+        return None
+    return _set_validators(current_app.response_class(status=304), etag)
+
+def cacheable_response(response, versions):
+    """Add the ETag of versions (when known) to a 200 JSON response and gzip it if the client accepts it"""
+    if versions:
+        _set_validators(response, record_etag(versions))
+    return gzip_response(response)
+
+def gzip_response(response, min_bytes=None, level=None):
+    """Gzip a buffered response of at least GZIP_MIN_BYTES when the request's Accept-Encoding allows it"""
+    min_bytes = int(min_bytes if min_bytes is not None else os.getenv('GZIP_MIN_BYTES', 1024))
+    level = int(level if level is not None else os.getenv('GZIP_LEVEL', 6))
+    response.vary.add("Accept-Encoding")
+    if (min_bytes < 0 or response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or request.accept_encodings["gzip"] <= 0):
+        return response
+    body = response.get_data()
+    if len(body) < min_bytes:
+        return response
+    response.set_data(gzip.compress(body, compresslevel=level))
+    response.headers["Content-Encoding"] = "gzip"
+    return response
@@ -0,0 +1,307 @@
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from .database_utils import BillingDatabase
+from .memory import DocumentScope
+from .page_text import PageTextDocument, content_hash, extract_page_texts, compress_page_texts
+
+# Manifest statuses that mean a file needs no further work; anything else is retried
+DONE_STATUSES = ("saved", "unsupported")
+
+
+def find_pdf_files(paths):
+    """Every PDF under paths (files or directories), sorted"""
+    pdf_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                pdf_files.extend(os.path.join(root, name) for name in files if name.lower().endswith(".pdf"))
+        else:
+            pdf_files.append(path)
+    return sorted(set(pdf_files))
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def hash_file(path):
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+class IngestManifest:
+    """Append-only JSON lines file recording the outcome of every ingested file, keyed by content hash.
+       Entries are written only after their batch is committed, so an interrupted run resumes with
+       the first uncommitted file. Files whose path, size and mtime match a finished entry are skipped
+       without being read again; renamed or copied files are skipped by their content hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self.by_hash = {}
+        self.by_path = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by an interrupted write
+                        continue
+                    self._remember(entry)
+
+    def _remember(self, entry):
+        self.by_hash[entry["content_hash"]] = entry
+        if entry.get("path"):
+            self.by_path[entry["path"]] = entry
+
+    def is_done(self, file_hash):
+        entry = self.by_hash.get(file_hash)
+        return entry is not None and entry.get("status") in DONE_STATUSES
+
+    def is_unchanged(self, path):
+        """Whether path was finished before and has the same size and mtime now"""
+        entry = self.by_path.get(path)
+        return (entry is not None and entry.get("status") in DONE_STATUSES and
+                entry.get("signature") == file_signature(path))
+
+    def append(self, entries):
+        if not entries:
+            return
+        with open(self.path, "a", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self._remember(entry)
+
+
+def _ingest_file(job):
+    """Worker: run the /extract-text pipeline on one PDF file"""
+    path, file_hash, provider, page_range, store_page_text = job
+    outcome = {"path": path, "content_hash": file_hash}
+    try:
+        from .verizonbus_api import is_supported_document, parse_page_range, run_bill_extraction
+
+        with open(path, "rb") as f:
+            file_content = f.read()
+        with DocumentScope() as documents:
+            pdf_document = documents.open(stream=file_content, filetype="pdf")
+            total_pages = len(pdf_document)
+            outcome["total_pages"] = total_pages
+            if not is_supported_document(pdf_document):
+                outcome["status"] = "unsupported"
+                return outcome
+            pages_to_extract = parse_page_range(page_range, total_pages)
+            if not pages_to_extract:
+                outcome.update({"status": "failed", "error": "No valid pages found in the specified range"})
+                return outcome
+            page_texts = extract_page_texts(pdf_document, pages_to_extract)
+
+        # One process per document already keeps the CPUs busy; stages run in the worker's own thread
+        outcome["extraction"] = run_bill_extraction(PageTextDocument(page_texts), pages_to_extract, None,
+                                                    provider, concurrent=False)
+        outcome["pages"] = len(pages_to_extract)
+        if store_page_text:
+            outcome["page_text_blob"] = compress_page_texts(page_texts)
+        outcome["status"] = "extracted"
+    except Exception as e:
+        outcome.update({"status": "failed", "error": str(e)})
+    return outcome
+
+def _run_jobs(jobs, workers):
+    """Yield the outcome of every job as it finishes, keeping at most two jobs per worker in flight"""
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            yield _ingest_file(job)
+        return
+
+    from .verizonbus_api import keywords_config_snapshot, seed_keywords_config
+
+    # Workers start from this process's checked keywords.json instead of each re-running the pattern analysis
+    with ProcessPoolExecutor(max_workers=workers, initializer=seed_keywords_config,
+                             initargs=(keywords_config_snapshot(),)) as pool:
+        remaining = iter(jobs)
+        running = set()
+        while True:
+            for job in remaining:
+                running.add(pool.submit(_ingest_file, job))
+                if len(running) >= workers * 2:
+                    break
+            if not running:
+                return
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def ingest_files(db, paths, manifest_path, workers=None, batch_size=25, provider="verizon", page_range="",
+                 store_page_text=True, force=False, progress=None):
+    """Extract every PDF under paths and save the results through db, batch_size bills per transaction.
+       Files already recorded as finished in the manifest are skipped unless force is set.
+       progress, when given, is called with the running summary after each committed batch."""
+    from .verizonbus_api import build_record_data
+
+    workers = workers or os.cpu_count() or 1
+    batch_size = max(1, batch_size)
+    manifest = IngestManifest(manifest_path)
+
+    summary = {
+        "success": True,
+        "files": 0,
+        "skipped": 0,
+        "processed": 0,
+        "saved": 0,
+        "unsupported": 0,
+        "failed": 0,
+        "pages": 0,
+        "errors": []
+    }
+    started = time.perf_counter()
+
+    jobs = []
+    queued_hashes = set()
+    for path in find_pdf_files(paths):
+        summary["files"] += 1
+        try:
+            if not force and manifest.is_unchanged(path):
+                summary["skipped"] += 1
+                continue
+            file_hash = hash_file(path)
+        except OSError as e:
+            summary["failed"] += 1
+            summary["errors"].append({"path": path, "error": str(e)})
+            continue
+        # The same bill saved under another name is only ingested once
+        if file_hash in queued_hashes or (not force and manifest.is_done(file_hash)):
+            summary["skipped"] += 1
+            continue
+        queued_hashes.add(file_hash)
+        jobs.append((path, file_hash, provider, page_range, store_page_text))
+
+    def write_batch(outcomes):
+        records = []
+        saving = []
+        entries = []
+        for outcome in outcomes:
+            entry = {
+                "content_hash": outcome["content_hash"],
+                "path": outcome["path"],
+                "status": outcome["status"],
+                "total_pages": outcome.get("total_pages", 0),
+                "ingested_at": datetime.datetime.now().isoformat()
+            }
+            try:
+                entry["signature"] = file_signature(outcome["path"])
+            except OSError:
+                pass
+            entries.append(entry)
+            summary["processed"] += 1
+            summary["pages"] += outcome.get("pages", 0)
+
+            if outcome["status"] == "extracted":
+                extraction = outcome["extraction"]
+                account_number = extraction["summary"].get("account")
+                if not account_number:
+                    outcome.update({"status": "failed", "error": "No account number found"})
+                else:
+                    pdf_filename = os.path.basename(outcome["path"])
+                    invoice_number = extraction["summary"].get("invoice")
+                    record = {
+                        "account_number": account_number,
+                        "invoice_number": invoice_number,
+                        "json_data": build_record_data(extraction, pdf_filename, outcome["total_pages"], provider)
+                    }
+                    if outcome.get("page_text_blob") is not None:
+                        record["document_text"] = {
+                            "content_hash": outcome["content_hash"],
+                            "page_text_blob": outcome["page_text_blob"],
+                            "account_number": account_number,
+                            "invoice_number": invoice_number,
+                            "pdf_filename": pdf_filename,
+                            "provider": provider,
+                            "page_range": page_range,
+                            "total_pages": outcome["total_pages"]
+                        }
+                    records.append(record)
+                    saving.append(entry)
+                    entry.update({"account_number": account_number, "invoice_number": invoice_number})
+
+            if outcome["status"] == "unsupported":
+                summary["unsupported"] += 1
+            elif outcome["status"] == "failed":
+                entry.update({"status": "failed", "error": outcome["error"]})
+                summary["failed"] += 1
+                summary["errors"].append({"path": outcome["path"], "error": outcome["error"]})
+
+        for entry, result in zip(saving, db.save_billing_batch(records)):
+            if result.get("success"):
+                entry.update({"status": "saved", "record_id": result["id"]})
+                summary["saved"] += 1
+            else:
+                entry.update({"status": "failed", "error": result.get("error")})
+                summary["failed"] += 1
+                summary["errors"].append({"path": entry["path"], "error": result.get("error")})
+
+        # Only now, with the batch committed, do its files count as ingested
+        manifest.append(entries)
+        if progress:
+            progress(summary, len(jobs), time.perf_counter() - started)
+
+    batch = []
+    for outcome in _run_jobs(jobs, workers):
+        batch.append(outcome)
+        if len(batch) >= batch_size:
+            write_batch(batch)
+            batch = []
+    if batch:
+        write_batch(batch)
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["bills_per_second"] = round(summary["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+    summary["pages_per_second"] = round(summary["pages"] / elapsed, 2) if elapsed > 0 else 0.0
+    summary["success"] = summary["failed"] == 0
+    return summary
+
+def print_progress(summary, total, elapsed):
+    print(f"  {summary['processed']}/{total} bill(s), {summary['pages']} page(s) in {round(elapsed, 1)}s "
+          f"({round(summary['processed'] / elapsed, 2) if elapsed > 0 else 0.0} bills/sec, "
+          f"{round(summary['pages'] / elapsed, 2) if elapsed > 0 else 0.0} pages/sec)", flush=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extract and save every PDF bill under the given paths")
+    parser.add_argument("paths", nargs="+", help="PDF files or directories of PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=25, help="Bills saved per transaction")
+    parser.add_argument("--provider", default="verizon", help="Provider whose keywords are used")
+    parser.add_argument("--page-range", default="", help="Pages to extract from every file (default: all)")
+    parser.add_argument("--manifest", default="ingest_manifest.jsonl",
+                        help="Manifest of ingested files, used to skip them on the next run")
+    parser.add_argument("--force", action="store_true", help="Ingest files the manifest lists as done")
+    parser.add_argument("--no-page-text", dest="store_page_text", action="store_false",
+                        help="Don't store page text for reprocessing")
+    parser.add_argument("--quiet", action="store_true", help="Only print the final summary")
+    parser.add_argument("--db", dest="db_path", default=None, help="Path to billing_data.db")
+    args = parser.parse_args(argv)
+
+    db = BillingDatabase(args.db_path)
+    result = ingest_files(db, args.paths, args.manifest, workers=args.workers, batch_size=args.batch_size,
+                          provider=args.provider, page_range=args.page_range,
+                          store_page_text=args.store_page_text, force=args.force,
+                          progress=None if args.quiet else print_progress)
+
+    print(f"Ingested {result['processed']} of {result['files']} file(s): {result['saved']} saved, "
+          f"{result['skipped']} skipped, {result['unsupported']} unsupported, {result['failed']} failed "
+          f"in {result['elapsed_seconds']}s ({result['bills_per_second']} bills/sec, "
+          f"{result['pages_per_second']} pages/sec)")
+    for error in result["errors"]:
+        print(f"  - {error['path']}: {error['error']}")
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
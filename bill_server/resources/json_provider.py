@@ -0,0 +1,102 @@
+import json
+import threading
+import time
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional - fall back to the stdlib encoder when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson when available and records
+    how much time is spent building JSON responses."""
+
+    # Key order is not part of the API contract and sorting is pure overhead
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "responses": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "total_bytes": 0
+        }
+
+    @property
+    def serializer_name(self):
+        return "orjson" if orjson is not None else "json"
+
+    def _orjson_options(self, kwargs):
+        """Translate json.dumps keyword arguments into orjson options.
+           Returns None when an argument has no orjson equivalent."""
+        option = orjson.OPT_NON_STR_KEYS
+        for key, value in kwargs.items():
+            if key == "indent":
+                if value:
+                    option |= orjson.OPT_INDENT_2
+            elif key == "sort_keys":
+                if value:
+                    option |= orjson.OPT_SORT_KEYS
+            elif key in ("separators", "ensure_ascii"):
+                # orjson always emits compact UTF-8 output
+                continue
+            elif key == "default":
+                continue
+            else:
+                return None
+        return option
+
+    def dumps(self, obj, **kwargs):
+        """Serialize with orjson when possible, otherwise use json.dumps"""
+        if orjson is not None:
+            option = self._orjson_options(kwargs)
+            if option is not None:
+                try:
+                    return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode("utf-8")
+                except TypeError:
+                    # e.g. integers wider than 64 bits - the stdlib handles those
+                    pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """Build a JSON response and report serialization time via Server-Timing"""
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args.setdefault("indent", 2)
+        else:
+            dump_args.setdefault("separators", (",", ":"))
+
+        started = time.perf_counter()
+        body = f"{self.dumps(obj, **dump_args)}\n"
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            self._stats["responses"] += 1
+            self._stats["total_ms"] += elapsed_ms
+            self._stats["max_ms"] = max(self._stats["max_ms"], elapsed_ms)
+            self._stats["total_bytes"] += len(body)
+
+        response = self._app.response_class(body, mimetype=self.mimetype)
+        response.headers["Server-Timing"] = f'jsonify;dur={elapsed_ms:.2f};desc="{self.serializer_name}"'
+        return response
+
+    def get_stats(self):
+        """Return cumulative serialization statistics for this process"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["serializer"] = self.serializer_name
+        stats["avg_ms"] = round(stats["total_ms"] / stats["responses"], 3) if stats["responses"] else 0.0
+        stats["total_ms"] = round(stats["total_ms"], 3)
+        stats["max_ms"] = round(stats["max_ms"], 3)
+        return stats
@@ -0,0 +1,114 @@
+import threading
+
+
+def rule_id(keyword_obj):
+    """Identifier of a search keyword rule: its ukey, prefixed with the parent's ukey for sub_keys"""
+    if keyword_obj.get("is_sub_key") and keyword_obj.get("parent_ukey"):
+        return f"{keyword_obj['parent_ukey']}.{keyword_obj['ukey']}"
+    return keyword_obj.get("ukey", "")
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class KeywordRuleStats:
+    """Per-provider counters for each keywords.json rule, aggregated across extractions.
+       Counters per rule: evaluations (pages the rule was scanned on), hits (evaluations with at
+       least one match), money_found (amounts extracted) and match_seconds (time spent scanning)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._extractions = {}
+
+    def record(self, provider, counters):
+        """Merge the counters of one extraction, {rule_id: [evaluations, hits, money_found, match_seconds]}.
+           Extractions count into their own dict and merge it once, so the scan loop never takes the lock."""
+        with self._lock:
+            rules = self._providers.setdefault(provider, {})
+            for rule, values in counters.items():
+                totals = rules.get(rule)
+                if totals is None:
+                    rules[rule] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        totals[index] += value
+            self._extractions[provider] = self._extractions.get(provider, 0) + 1
+
+    def reset(self, provider=None):
+        with self._lock:
+            if provider is None:
+                self._providers.clear()
+                self._extractions.clear()
+            else:
+                self._providers.pop(provider, None)
+                self._extractions.pop(provider, None)
+
+    def snapshot(self, provider, rules=None):
+        """Rows for one provider sorted by match time. rules (build_search_keywords output) adds the
+           configured rules that were never evaluated and the keyword/pattern of each row."""
+        with self._lock:
+            counters = {rule: list(values) for rule, values in self._providers.get(provider, {}).items()}
+            extractions = self._extractions.get(provider, 0)
+
+        described = {}
+        for keyword_obj in rules or []:
+            described[rule_id(keyword_obj)] = {
+                "keyword": keyword_obj.get("search_term", ""),
+                "is_sub_key": keyword_obj.get("is_sub_key", False),
+                "keyword_pattern": keyword_obj.get("keyword_pattern")
+            }
+
+        rows = []
+        for rule in set(counters) | set(described):
+            evaluations, hits, money_found, match_seconds = counters.get(rule, [0, 0, 0, 0.0])
+            row = {"rule": rule}
+            row.update(described.get(rule, {}))
+            row.update({
+                "evaluations": evaluations,
+                "hits": hits,
+                "money_found": money_found,
+                "match_ms": round(match_seconds * 1000, 3),
+                "avg_match_us": round(match_seconds * 1_000_000 / evaluations, 3) if evaluations else 0.0,
+                "hit_rate": round(hits / evaluations, 4) if evaluations else 0.0
+            })
+            rows.append(row)
+        rows.sort(key=lambda row: (-row["match_ms"], row["rule"]))
+
+        return {
+            "provider": provider,
+            "extractions": extractions,
+            "rules": rows,
+            "never_matched": sorted(row["rule"] for row in rows if row["hits"] == 0),
+            "total_match_ms": round(sum(row["match_ms"] for row in rows), 3)
+        }
+
+    def prometheus_lines(self):
+        """Counters in the Prometheus text exposition format"""
+        with self._lock:
+            providers = {provider: {rule: list(values) for rule, values in rules.items()}
+                         for provider, rules in self._providers.items()}
+            extractions = dict(self._extractions)
+
+        lines = [
+            "# HELP bill_server_keyword_extractions_total Extractions that recorded keyword rule statistics",
+            "# TYPE bill_server_keyword_extractions_total counter"
+        ]
+        for provider, count in sorted(extractions.items()):
+            lines.append(f'bill_server_keyword_extractions_total{{provider="{_escape_label(provider)}"}} {count}')
+
+        metrics = (
+            ("evaluations", "Pages a keyword rule was scanned on"),
+            ("hits", "Scans of a keyword rule that matched at least once"),
+            ("money_found", "Money amounts extracted by a keyword rule"),
+            ("match_seconds", "Time spent scanning pages for a keyword rule")
+        )
+        for index, (name, help_text) in enumerate(metrics):
+            metric = f"bill_server_keyword_rule_{name}_total"
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for provider, rules in sorted(providers.items()):
+                for rule, values in sorted(rules.items()):
+                    value = round(values[index], 6) if name == "match_seconds" else values[index]
+                    lines.append(f'{metric}{{provider="{_escape_label(provider)}",rule="{_escape_label(rule)}"}} {value}')
+        return lines
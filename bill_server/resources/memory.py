@@ -0,0 +1,330 @@
+import collections
+import gc
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+
+from .structured_logging import get_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = get_logger("memory")
+
+MB = 1024 * 1024
+
+
+def rss_bytes():
+    """Resident set size of this process, or None when it can't be read.
+       Without /proc (macOS) this is the peak RSS so far."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    return None
+
+def to_mb(value):
+    return round(value / MB, 2) if value is not None else None
+
+def mupdf_store_shrink_percent():
+    """Share of the MuPDF store freed once a request's documents are closed, from MUPDF_STORE_SHRINK_PERCENT"""
+    try:
+        return min(100, max(0, int(os.getenv('MUPDF_STORE_SHRINK_PERCENT', 100))))
+    except ValueError:
+        return 100
+
+def trim_mupdf_store(percent=None):
+    """Free part of MuPDF's global resource store (decoded fonts, images and objects).
+       The extractors read every page's text once and keep it in Python, so cached resources of
+       closed documents are never reused; left alone the store grows up to its 256 MB default limit."""
+    percent = mupdf_store_shrink_percent() if percent is None else percent
+    fitz = sys.modules.get("fitz")
+    if percent <= 0 or fitz is None:
+        return
+    try:
+        fitz.TOOLS.store_shrink(percent)
+    except Exception as e:
+        logger.warning("Error shrinking the MuPDF store: %s", e)
+
+def close_document(document):
+    """Close a fitz document (or PageTextDocument) unless it is None or already closed"""
+    if document is None or getattr(document, "is_closed", False):
+        return
+    try:
+        document.close()
+    except Exception as e:
+        logger.warning("Error closing document: %s", e)
+
+
+class DocumentScope:
+    """Owns the fitz documents opened in a with block: they are closed on every way out of the
+       block, including exceptions, and the MuPDF store is trimmed afterwards. A document handed
+       to a longer-lived owner (e.g. a document session) must be released from the scope."""
+
+    def __init__(self):
+        self._documents = []
+        self.opened = 0
+
+    def open(self, *args, **kwargs):
+        """fitz.open(*args, **kwargs), closed when the scope ends"""
+        import fitz
+        document = fitz.open(*args, **kwargs)
+        self._documents.append(document)
+        self.opened += 1
+        return document
+
+    def release(self, document):
+        """Stop owning document; the caller is now responsible for closing it"""
+        self._documents = [owned for owned in self._documents if owned is not document]
+        return document
+
+    def close(self):
+        """Close every document of the scope now, e.g. as soon as its page text has been read"""
+        while self._documents:
+            close_document(self._documents.pop())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if self.opened:
+            trim_mupdf_store()
+        return False
+
+
+class RequestMemory:
+    """Memory use of one request: process RSS at start and end, the highest RSS the sampler saw
+       while it ran and, for traced requests, the Python heap peak and the allocations still alive.
+       RSS is per process, so concurrent requests see each other's allocations."""
+
+    def __init__(self, endpoint, traced=False):
+        self.endpoint = endpoint
+        self.traced = traced
+        self.started_tracing = False
+        self.started_at = time.perf_counter()
+        self.rss_start = rss_bytes()
+        self.rss_end = None
+        self.peak_rss = self.rss_start
+        self.tracemalloc = None
+
+    def sample(self, rss):
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def trace_report(self, top_n):
+        """Python heap peak since the request started and the source lines holding the most memory"""
+        if not self.traced or not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+        ))
+        return {
+            "traced_current_mb": to_mb(current),
+            "traced_peak_mb": to_mb(peak),
+            "retained_top": [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 1),
+                    "count": stat.count
+                }
+                for stat in snapshot.statistics("lineno")[:top_n]
+            ]
+        }
+
+    def report(self, top_n=10):
+        """Memory of the request so far (or in total once finished)"""
+        rss_now = self.rss_end if self.rss_end is not None else rss_bytes()
+        self.sample(rss_now)
+        report = {
+            "rss_start_mb": to_mb(self.rss_start),
+            "rss_end_mb": to_mb(rss_now),
+            "rss_delta_mb": to_mb(rss_now - self.rss_start) if rss_now is not None and self.rss_start is not None else None,
+            "peak_rss_mb": to_mb(self.peak_rss)
+        }
+        if self.tracemalloc is None:
+            trace = self.trace_report(top_n)
+            if trace is not None:
+                report["tracemalloc"] = trace
+        else:
+            report["tracemalloc"] = self.tracemalloc
+        return report
+
+
+class MemoryGovernor:
+    """Per-request memory tracking and a process memory ceiling.
+       A background thread samples RSS every MEMORY_SAMPLE_INTERVAL_MS while requests are running,
+       giving each request its peak. Every MEMORY_TRACEMALLOC_EVERY-th request (and every profiled
+       one) also runs under tracemalloc, one request at a time.
+       When RSS stays above MEMORY_CEILING_MB after a request, even after garbage collection and
+       emptying the MuPDF store, the worker is recycled: new requests get a 503, and once the running
+       ones have finished (or MEMORY_RECYCLE_DRAIN_SECONDS passed) the process sends itself SIGTERM.
+       A gunicorn arbiter or the container's restart policy then starts a fresh worker."""
+
+    def __init__(self, ceiling_mb=None, sample_interval_ms=None, trace_every=None, drain_seconds=None, top_n=None):
+        self.ceiling_bytes = int(float(ceiling_mb if ceiling_mb is not None else os.getenv('MEMORY_CEILING_MB', 0)) * MB)
+        self.sample_interval = float(sample_interval_ms if sample_interval_ms is not None
+                                     else os.getenv('MEMORY_SAMPLE_INTERVAL_MS', 25)) / 1000
+        self.trace_every = int(trace_every if trace_every is not None else os.getenv('MEMORY_TRACEMALLOC_EVERY', 0))
+        self.drain_seconds = float(drain_seconds if drain_seconds is not None
+                                   else os.getenv('MEMORY_RECYCLE_DRAIN_SECONDS', 30))
+        self.top_n = int(top_n if top_n is not None else os.getenv('MEMORY_TRACEMALLOC_TOP', 10))
+
+        self.recycling = False
+        self._lock = threading.Lock()
+        self._active = set()
+        self._wake = threading.Event()
+        self._sampler = None
+        self._requests = 0
+        self._tracing = None
+        self._endpoints = {}
+        self._traces = collections.deque(maxlen=10)
+        self._stats = {"ceiling_crossed": 0, "recycles": 0}
+
+    def start(self, endpoint, trace=False):
+        """Begin tracking a request; pass the returned RequestMemory to finish()"""
+        with self._lock:
+            self._requests += 1
+            sampled = trace or (self.trace_every > 0 and self._requests % self.trace_every == 0)
+            tracker = RequestMemory(endpoint, traced=sampled and self._tracing is None)
+            if tracker.traced:
+                self._tracing = tracker
+                tracker.started_tracing = not tracemalloc.is_tracing()
+                if tracker.started_tracing:
+                    tracemalloc.start()
+                else:
+                    tracemalloc.reset_peak()
+            self._active.add(tracker)
+            if self.sample_interval > 0:
+                if self._sampler is None:
+                    self._sampler = threading.Thread(target=self._sample_loop, name="memory-sampler", daemon=True)
+                    self._sampler.start()
+                self._wake.set()
+        return tracker
+
+    def finish(self, tracker):
+        """Stop tracking a request, add it to the per-endpoint statistics and enforce the ceiling.
+           Returns the request's memory report."""
+        tracker.rss_end = rss_bytes()
+        tracker.sample(tracker.rss_end)
+        if tracker.traced:
+            tracker.tracemalloc = tracker.trace_report(self.top_n)
+            if tracker.started_tracing:
+                tracemalloc.stop()
+        report = tracker.report(self.top_n)
+
+        with self._lock:
+            self._active.discard(tracker)
+            if tracker.traced:
+                self._tracing = None
+                self._traces.append({"endpoint": tracker.endpoint, **report})
+            stats = self._endpoints.setdefault(tracker.endpoint, {
+                "requests": 0, "rss_delta_total": 0, "max_rss_delta": 0, "max_peak_rss": 0
+            })
+            stats["requests"] += 1
+            if tracker.rss_end is not None and tracker.rss_start is not None:
+                delta = tracker.rss_end - tracker.rss_start
+                stats["rss_delta_total"] += delta
+                stats["max_rss_delta"] = max(stats["max_rss_delta"], delta)
+            stats["max_peak_rss"] = max(stats["max_peak_rss"], tracker.peak_rss or 0)
+
+        if self.ceiling_bytes and tracker.rss_end is not None and tracker.rss_end > self.ceiling_bytes:
+            self._over_ceiling()
+        return report
+
+    def _sample_loop(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = list(self._active)
+                if not active:
+                    # Cleared under the lock, so a request starting now sets it again
+                    self._wake.clear()
+                    continue
+            rss = rss_bytes()
+            for tracker in active:
+                tracker.sample(rss)
+            time.sleep(self.sample_interval)
+
+    def _over_ceiling(self):
+        with self._lock:
+            if self.recycling:
+                return
+            self._stats["ceiling_crossed"] += 1
+        # Try to get back under the ceiling before giving up on the process
+        gc.collect()
+        trim_mupdf_store(100)
+        rss = rss_bytes()
+        if rss is None or rss <= self.ceiling_bytes:
+            logger.info("Memory back under the ceiling after collection: %sMB", to_mb(rss))
+            return
+        with self._lock:
+            if self.recycling:
+                return
+            self.recycling = True
+            self._stats["recycles"] += 1
+        logger.warning("RSS %sMB is above MEMORY_CEILING_MB (%sMB): recycling this worker",
+                       to_mb(rss), to_mb(self.ceiling_bytes))
+        threading.Thread(target=self._recycle, name="memory-recycle", daemon=True).start()
+
+    def _recycle(self):
+        # Let the running requests finish and the last responses go out, then exit
+        waited = 0.0
+        while waited < 1.0 or (self._active and waited < self.drain_seconds):
+            time.sleep(0.1)
+            waited += 0.1
+        logger.warning("Recycling worker %s", os.getpid())
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    def get_stats(self):
+        with self._lock:
+            endpoints = {
+                endpoint: {
+                    "requests": stats["requests"],
+                    "avg_rss_delta_mb": to_mb(stats["rss_delta_total"] / stats["requests"]),
+                    "max_rss_delta_mb": to_mb(stats["max_rss_delta"]),
+                    "max_peak_rss_mb": to_mb(stats["max_peak_rss"])
+                }
+                for endpoint, stats in self._endpoints.items()
+            }
+            return {
+                "rss_mb": to_mb(rss_bytes()),
+                "ceiling_mb": to_mb(self.ceiling_bytes) if self.ceiling_bytes else None,
+                "recycling": self.recycling,
+                "active_requests": len(self._active),
+                "mupdf_store_shrink_percent": mupdf_store_shrink_percent(),
+                **self._stats,
+                "endpoints": endpoints,
+                "tracemalloc_samples": list(self._traces)
+            }
+
+    def prometheus_lines(self):
+        """Process RSS and per-endpoint request memory in the Prometheus text exposition format"""
+        stats = self.get_stats()
+        lines = [
+            "# HELP bill_server_process_rss_bytes Resident set size of this worker",
+            "# TYPE bill_server_process_rss_bytes gauge",
+            f"bill_server_process_rss_bytes {rss_bytes() or 0}",
+            "# HELP bill_server_memory_recycles_total Times this worker decided to recycle itself",
+            "# TYPE bill_server_memory_recycles_total counter",
+            f"bill_server_memory_recycles_total {stats['recycles']}",
+            "# HELP bill_server_request_peak_rss_bytes Highest RSS seen while a request to an endpoint ran",
+            "# TYPE bill_server_request_peak_rss_bytes gauge"
+        ]
+        with self._lock:
+            endpoints = {endpoint: dict(values) for endpoint, values in self._endpoints.items()}
+        for endpoint, values in sorted(endpoints.items()):
+            label = endpoint.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'bill_server_request_peak_rss_bytes{{endpoint="{label}"}} {values["max_peak_rss"]}')
+        return lines
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import zlib
+
+from .structured_logging import get_logger
+
+logger = get_logger("page_text")
+
+
+def content_hash(file_content):
+    """SHA-256 of the uploaded file bytes, used as the key for stored page text"""
+    return hashlib.sha256(file_content).hexdigest()
+
+def extract_page_texts(pdf_document, pages=None):
+    """Read the text of every page of a fitz document once, in page order.
+       When pages (1-based page numbers) is given, pages outside it are left empty."""
+    wanted = set(pages) if pages is not None else None
+    page_texts = []
+    for page_num in range(len(pdf_document)):
+        if wanted is not None and page_num + 1 not in wanted:
+            page_texts.append("")
+            continue
+        try:
+            page_texts.append(pdf_document.load_page(page_num).get_text())
+        except Exception as e:
+            logger.warning("Error reading text of page %s: %s", page_num + 1, e)
+            page_texts.append("")
+    return page_texts
+
+def compress_page_texts(page_texts):
+    """Serialize a list of page texts to a compressed blob for SQLite storage"""
+    return zlib.compress(json.dumps(page_texts).encode("utf-8"), 6)
+
+def decompress_page_texts(blob):
+    """Inverse of compress_page_texts"""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+class PageText:
+    """A single page of a PageTextDocument (mirrors fitz.Page.get_text)"""
+
+    def __init__(self, text):
+        self._text = text
+
+    def get_text(self, *args, **kwargs):
+        return self._text
+
+
+class PageTextDocument:
+    """Stand-in for fitz.Document backed by already extracted page text.
+       Supports the subset of the fitz API the extractors use: len(), load_page() and close()."""
+
+    # The page text never changes, so extractors may read it from several threads at once
+    thread_safe = True
+
+    def __init__(self, page_texts):
+        self.page_texts = list(page_texts)
+
+    def __len__(self):
+        return len(self.page_texts)
+
+    def load_page(self, page_num):
+        if page_num < 0 or page_num >= len(self.page_texts):
+            raise IndexError(f"page {page_num} not in document")
+        return PageText(self.page_texts[page_num])
+
+    def close(self):
+        pass
+
+
+class LazyPageTextDocument(PageTextDocument):
+    """PageTextDocument that reads each page from an open fitz document on first access.
+       Used when only a few pages are needed (e.g. the summary-only extraction)."""
+
+    # Pages are read through the fitz document, which must only be used by one thread at a time
+    thread_safe = False
+
+    def __init__(self, pdf_document):
+        self._pdf_document = pdf_document
+        self._loaded = {}
+
+    @property
+    def page_texts(self):
+        return [self.load_page(page_num).get_text() for page_num in range(len(self))]
+
+    def __len__(self):
+        return len(self._pdf_document)
+
+    def load_page(self, page_num):
+        if page_num not in self._loaded:
+            self._loaded[page_num] = self._pdf_document.load_page(page_num).get_text()
+        return PageText(self._loaded[page_num])
+
+    @property
+    def is_closed(self):
+        return getattr(self._pdf_document, "is_closed", False)
+
+    def close(self):
+        self._pdf_document.close()
@@ -0,0 +1,441 @@
+import argparse
+import functools
+import json
+import os
+import queue
+import re
+import string
+import subprocess
+import sys
+import threading
+import time
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# bill_server directory, the working directory of the benchmark child process
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Characters used to evaluate character classes and build worst-case text
+ALPHABET = string.ascii_letters + string.digits + string.punctuation + " \t\n"
+UNBOUNDED = sre_constants.MAXREPEAT
+REPEAT_OPS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT}
+if hasattr(sre_constants, "POSSESSIVE_REPEAT"):
+    REPEAT_OPS.add(sre_constants.POSSESSIVE_REPEAT)
+
+_CATEGORY_CHARS = {
+    "CATEGORY_DIGIT": set(string.digits),
+    "CATEGORY_SPACE": set(" \t\n"),
+    "CATEGORY_WORD": set(string.ascii_letters + string.digits + "_")
+}
+
+
+def strip_pattern_quotes(pattern):
+    """keywords.json wraps some patterns in quotes; the extractor strips one pair before compiling"""
+    if pattern and len(pattern) >= 2 and pattern[0] == pattern[-1] and pattern[0] in "'\"":
+        return pattern[1:-1]
+    return pattern
+
+def _category_chars(category):
+    name = str(category)
+    for base, chars in _CATEGORY_CHARS.items():
+        if name == base:
+            return set(chars)
+        if name == base.replace("CATEGORY_", "CATEGORY_NOT_"):
+            return set(ALPHABET) - chars
+    return set(ALPHABET)
+
+def _with_case(chars):
+    return chars | {c.swapcase() for c in chars}
+
+def _item_chars(op, av):
+    """Characters of ALPHABET a single-character item can match (case-insensitively), or None
+       when the item is not a single character"""
+    if op == sre_constants.LITERAL:
+        return _with_case({chr(av)})
+    if op == sre_constants.NOT_LITERAL:
+        return set(ALPHABET) - _with_case({chr(av)})
+    if op == sre_constants.ANY:
+        return set(ALPHABET) - {"\n"}
+    if op == sre_constants.IN:
+        chars = set()
+        negate = False
+        for item_op, item_av in av:
+            if item_op == sre_constants.NEGATE:
+                negate = True
+            elif item_op == sre_constants.LITERAL:
+                chars.add(chr(item_av))
+            elif item_op == sre_constants.RANGE:
+                chars.update(c for c in ALPHABET if item_av[0] <= ord(c) <= item_av[1])
+            elif item_op == sre_constants.CATEGORY:
+                chars.update(_category_chars(item_av))
+        chars = _with_case(chars)
+        return set(ALPHABET) - chars if negate else chars
+    return None
+
+def _repeat_chars(av):
+    """Characters a repeat's body can consume, if its body is a single character item"""
+    body = list(av[2])
+    if len(body) == 1:
+        return _item_chars(*body[0])
+    return None
+
+def _first_chars(subpattern):
+    """Approximate set of characters a subpattern can start with (None when unknown)"""
+    for op, av in subpattern:
+        chars = _item_chars(op, av)
+        if chars is not None:
+            return chars
+        if op == sre_constants.SUBPATTERN:
+            return _first_chars(av[-1])
+        if op in REPEAT_OPS:
+            return _first_chars(av[2]) if av[0] > 0 else None
+        if op == sre_constants.BRANCH:
+            union = set()
+            for branch in av[1]:
+                chars = _first_chars(branch)
+                if chars is None:
+                    return None
+                union |= chars
+            return union
+        if op == sre_constants.AT:
+            continue
+        return None
+    return None
+
+def _children(op, av):
+    """Subpatterns nested in an item"""
+    if op in REPEAT_OPS:
+        return [av[2]]
+    if op == sre_constants.SUBPATTERN:
+        return [av[-1]]
+    if op == sre_constants.BRANCH:
+        return list(av[1])
+    if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    if hasattr(sre_constants, "ATOMIC_GROUP") and op == sre_constants.ATOMIC_GROUP:
+        return [av]
+    if op == sre_constants.GROUPREF_EXISTS:
+        return [branch for branch in av[1:] if branch is not None]
+    return []
+
+def _contains_repeat(subpattern):
+    for op, av in subpattern:
+        if op in REPEAT_OPS and av[1] > 1:
+            return True
+        if any(_contains_repeat(child) for child in _children(op, av)):
+            return True
+    return False
+
+def _alternations(subpattern):
+    """Branch lists of the alternations in a subpattern, looking through groups"""
+    found = []
+    for op, av in subpattern:
+        if op == sre_constants.BRANCH:
+            found.append(list(av[1]))
+        elif op == sre_constants.SUBPATTERN:
+            found.extend(_alternations(av[-1]))
+    return found
+
+def _find_issues(subpattern, issues, inside_unbounded=False):
+    items = list(subpattern)
+    for index, (op, av) in enumerate(items):
+        if op in REPEAT_OPS:
+            unbounded = av[1] == UNBOUNDED
+            if unbounded and inside_unbounded:
+                pass  # Reported by the enclosing repeat
+            elif unbounded and _contains_repeat(av[2]):
+                issues.append("nested_quantifier: an unbounded repeat contains another repeat (exponential backtracking)")
+            elif unbounded:
+                for branches in _alternations(av[2]):
+                    if branches:
+                        firsts = [_first_chars(branch) for branch in branches]
+                        overlap = any(a is None or b is None or (a & b)
+                                      for i, a in enumerate(firsts) for b in firsts[i + 1:])
+                        if overlap:
+                            issues.append("overlapping_alternation: a repeated alternation has branches "
+                                          "that can match the same text (exponential backtracking)")
+
+            # Two adjacent unbounded repeats over overlapping characters, e.g. \s*\s* or .*\d+
+            if unbounded and index + 1 < len(items):
+                next_op, next_av = items[index + 1]
+                if next_op in REPEAT_OPS and next_av[1] == UNBOUNDED:
+                    chars, next_chars = _repeat_chars(av), _repeat_chars(next_av)
+                    if chars is not None and next_chars is not None and chars & next_chars:
+                        issues.append("adjacent_quantifiers: consecutive unbounded repeats match the same "
+                                      "characters (polynomial backtracking)")
+            for child in _children(op, av):
+                _find_issues(child, issues, inside_unbounded or unbounded)
+        else:
+            for child in _children(op, av):
+                _find_issues(child, issues, inside_unbounded)
+
+@functools.lru_cache(maxsize=1024)
+def analyze_pattern(pattern):
+    """Compile a (quote-stripped) pattern and look for constructs with super-linear backtracking.
+       Returns {"valid", "error", "issues"}."""
+    try:
+        re.compile(pattern, re.IGNORECASE)
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError) as e:
+        return {"valid": False, "error": str(e), "issues": []}
+    issues = []
+    _find_issues(parsed, issues)
+    return {"valid": True, "error": None, "issues": sorted(set(issues))}
+
+def _pump_chars(parsed):
+    """Characters consumed by the pattern's unbounded repeats - repeating them makes the engine backtrack"""
+    chars = []
+    stack = [parsed]
+    while stack:
+        for op, av in stack.pop():
+            if op in REPEAT_OPS and av[1] == UNBOUNDED:
+                body_chars = _first_chars(av[2])
+                if body_chars:
+                    for preferred in " a1.$(":
+                        if preferred in body_chars:
+                            chars.append(preferred)
+                            break
+                    else:
+                        chars.append(sorted(body_chars)[0])
+            stack.extend(_children(op, av))
+    return list(dict.fromkeys(chars))
+
+def _literal_prefix(parsed):
+    prefix = []
+    for op, av in parsed:
+        if op != sre_constants.LITERAL:
+            break
+        prefix.append(chr(av))
+    return "".join(prefix)
+
+def worst_case_texts(pattern, size):
+    """Synthetic inputs that make backtracking patterns slow: long runs of the characters the
+       pattern repeats (after its literal prefix) with a character that makes the match fail,
+       plus bill-like text."""
+    parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    prefix = _literal_prefix(parsed)
+    texts = {"bill_text": ("Monthly Charges $45.00 State Sales Tax (one-time) 555-123-4567 Jane Doe\n" * (size // 72 + 1))[:size]}
+    for char in _pump_chars(parsed) or [" ", "a"]:
+        run = char * size
+        texts[f"run_{char!r}"] = run + "\x00"
+        if prefix:
+            texts[f"prefix_run_{char!r}"] = (prefix + " " + run)[:size] + "\x00"
+        texts[f"alternating_{char!r}"] = ((char + "a ") * (size // 3 + 1))[:size] + "\x00"
+    return texts
+
+def _benchmark_worker(patterns, size, output):
+    """Time every pattern on its worst-case texts, writing one JSON line when each starts and finishes"""
+    for pattern in patterns:
+        output.write(json.dumps({"start": pattern}) + "\n")
+        output.flush()
+        compiled = re.compile(pattern, re.IGNORECASE)
+        worst_ms, worst_text = 0.0, None
+        for name, text in worst_case_texts(pattern, size).items():
+            started = time.perf_counter()
+            for _ in compiled.finditer(text):
+                pass
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > worst_ms:
+                worst_ms, worst_text = elapsed_ms, name
+        output.write(json.dumps({"done": pattern, "ms": round(worst_ms, 3), "worst_text": worst_text}) + "\n")
+        output.flush()
+
+def benchmark_patterns(patterns, size, budget_ms):
+    """Time each pattern on worst-case text of `size` characters in a child interpreter
+       (python -m resources.pattern_safety --worker). A regex cannot be interrupted, so a pattern still
+       running well past the budget gets the child killed and is reported as timed out; the remaining
+       patterns continue in a new child. Returns {pattern: {"ms", "worst_text", "timed_out"}}."""
+    results = {}
+    pending = list(patterns)
+    pattern_timeout = max(0.5, budget_ms * 20 / 1000)
+
+    while pending:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "resources.pattern_safety", "--worker", "--chars", str(size)],
+            cwd=BASE_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        )
+        lines = queue.Queue()
+
+        def read_output(stream=process.stdout):
+            for line in stream:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=read_output, name="pattern-benchmark-reader", daemon=True).start()
+        current = None
+        try:
+            process.stdin.write(json.dumps(pending))
+            process.stdin.close()
+            # Allow for interpreter start-up before the first pattern
+            timeout = pattern_timeout + 10
+            while pending:
+                line = lines.get(timeout=timeout)
+                if line is None:
+                    break
+                message = json.loads(line)
+                if "start" in message:
+                    current = message["start"]
+                    timeout = pattern_timeout
+                else:
+                    results[message["done"]] = {"ms": message["ms"], "worst_text": message["worst_text"], "timed_out": False}
+                    pending.remove(message["done"])
+                    current = None
+        except queue.Empty:
+            pass
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+        if pending:
+            # The child stopped or hung on `current` (or never started one)
+            failed = current if current in pending else pending[0]
+            results[failed] = {"ms": None, "worst_text": None, "timed_out": True}
+            pending.remove(failed)
+    return results
+
+def collect_keyword_patterns(config):
+    """Every keyword_pattern in a parsed keywords.json: {stripped pattern: ["provider/ukey", ...]}"""
+    patterns = {}
+    for provider, provider_data in (config or {}).items():
+        if not isinstance(provider_data, dict):
+            continue
+        for keyword in provider_data.get("settings", {}).get("required_keywords", []):
+            if not isinstance(keyword, dict):
+                continue
+            for rule in [keyword] + [sub_key for sub_key in keyword.get("sub_key", []) or [] if isinstance(sub_key, dict)]:
+                if rule.get("keyword_pattern"):
+                    pattern = strip_pattern_quotes(rule["keyword_pattern"])
+                    patterns.setdefault(pattern, []).append(f"{provider}/{rule.get('ukey', '')}")
+    return patterns
+
+def analyze_keyword_patterns(config, benchmark=None, size=None, budget_ms=None):
+    """Check every keyword_pattern of keywords.json: compile it, look for super-linear constructs
+       and (with benchmark) time it on worst-case text. A pattern is quarantined when it does not
+       compile or exceeds budget_ms."""
+    benchmark = (benchmark if benchmark is not None
+                 else os.getenv('PATTERN_BENCHMARK', 'true').lower() == 'true')
+    size = int(size if size is not None else os.getenv('PATTERN_BENCHMARK_CHARS', 20000))
+    budget_ms = float(budget_ms if budget_ms is not None else os.getenv('PATTERN_TIME_BUDGET_MS', 50))
+    started = time.perf_counter()
+
+    patterns = collect_keyword_patterns(config)
+    rows = {}
+    for pattern, rules in patterns.items():
+        rows[pattern] = {"pattern": pattern, "rules": rules, **analyze_pattern(pattern),
+                         "benchmark_ms": None, "worst_text": None, "timed_out": False, "quarantined": False}
+
+    valid = [pattern for pattern, row in rows.items() if row["valid"]]
+    benchmark_error = None
+    if benchmark and valid:
+        try:
+            for pattern, result in benchmark_patterns(valid, size, budget_ms).items():
+                rows[pattern].update({"benchmark_ms": result["ms"], "worst_text": result["worst_text"],
+                                      "timed_out": result["timed_out"]})
+        except Exception as e:
+            benchmark_error = str(e)
+
+    for row in rows.values():
+        row["quarantined"] = (not row["valid"] or row["timed_out"]
+                              or (row["benchmark_ms"] is not None and row["benchmark_ms"] > budget_ms))
+
+    return {
+        "patterns": sorted(rows.values(), key=lambda row: row["pattern"]),
+        "quarantined": sorted(pattern for pattern, row in rows.items() if row["quarantined"]),
+        "flagged": sorted(pattern for pattern, row in rows.items() if row["issues"]),
+        "benchmarked": benchmark and benchmark_error is None,
+        "benchmark_error": benchmark_error,
+        "benchmark_chars": size,
+        "time_budget_ms": budget_ms,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+class PatternQuarantine:
+    """Patterns the extractor must not run, set from the keywords.json analysis. Patterns that were
+       not part of it are only checked statically and quarantined when they don't compile or can
+       backtrack exponentially."""
+
+    def __init__(self, enabled=None):
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv('PATTERN_QUARANTINE', 'true').lower() == 'true')
+        self._lock = threading.Lock()
+        self._quarantined = frozenset()
+        self._analyzed = frozenset()
+        self.report = None
+        # Bumped on every update, so callers can cache work that depends on the quarantine
+        self.generation = 0
+
+    def update(self, report):
+        with self._lock:
+            self.report = report
+            self._quarantined = frozenset(report["quarantined"])
+            self._analyzed = frozenset(row["pattern"] for row in report["patterns"])
+            self.generation += 1
+
+    def is_quarantined(self, pattern):
+        """pattern is quote-stripped, as run by the extractor"""
+        if not self.enabled:
+            return False
+        if pattern in self._analyzed:
+            return pattern in self._quarantined
+        analysis = analyze_pattern(pattern)
+        return not analysis["valid"] or any(issue.startswith(("nested_quantifier", "overlapping_alternation"))
+                                            for issue in analysis["issues"])
+
+    def get_stats(self):
+        report = self.report
+        if report is None:
+            return {"enabled": self.enabled, "analyzed": False}
+        return {
+            "enabled": self.enabled,
+            "analyzed": True,
+            "patterns": len(report["patterns"]),
+            "flagged": report["flagged"],
+            "quarantined": report["quarantined"],
+            "benchmarked": report["benchmarked"],
+            "elapsed_ms": report["elapsed_ms"]
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the keyword_pattern regexes of keywords.json for catastrophic backtracking")
+    parser.add_argument("keywords_file", nargs="?",
+                        default=os.path.join(BASE_DIR, "keywords.json"))
+    parser.add_argument("--chars", type=int, default=None, help="Length of the worst-case texts (default: PATTERN_BENCHMARK_CHARS or 20000)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Time budget per pattern (default: PATTERN_TIME_BUDGET_MS or 50)")
+    parser.add_argument("--no-benchmark", action="store_true", help="Only run the static checks")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        # Benchmark child of benchmark_patterns: patterns as a JSON list on stdin
+        _benchmark_worker(json.load(sys.stdin), args.chars or 20000, sys.stdout)
+        return 0
+
+    with open(args.keywords_file) as f:
+        config = json.load(f)
+    report = analyze_keyword_patterns(config, benchmark=not args.no_benchmark, size=args.chars, budget_ms=args.budget_ms)
+
+    print(f"Checked {len(report['patterns'])} pattern(s) in {report['elapsed_ms']}ms: "
+          f"{len(report['flagged'])} flagged, {len(report['quarantined'])} quarantined")
+    for row in report["patterns"]:
+        status = "QUARANTINED" if row["quarantined"] else ("FLAGGED" if row["issues"] else "ok")
+        timing = "timed out" if row["timed_out"] else (f"{row['benchmark_ms']}ms on {row['worst_text']}"
+                                                      if row["benchmark_ms"] is not None else "not benchmarked")
+        print(f"  [{status}] {row['pattern']} ({', '.join(row['rules'])}): {timing}")
+        if row["error"]:
+            print(f"      invalid: {row['error']}")
+        for issue in row["issues"]:
+            print(f"      {issue}")
+    if report["benchmark_error"]:
+        print(f"  benchmark failed: {report['benchmark_error']}")
+    return 1 if report["quarantined"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
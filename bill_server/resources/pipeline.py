@@ -0,0 +1,196 @@
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+_pool_lock = threading.Lock()
+_pool = {"executor": None, "workers": None}
+
+
+def pipeline_workers():
+    """Threads shared by every pipeline run, from PIPELINE_WORKERS (0: run stages one after another)"""
+    try:
+        return max(0, int(os.getenv('PIPELINE_WORKERS', 4)))
+    except ValueError:
+        return 0
+
+def shared_executor():
+    """The thread pool independent stages run on, created on first use (None when disabled)"""
+    with _pool_lock:
+        if _pool["executor"] is None:
+            workers = pipeline_workers()
+            if workers > 0:
+                _pool["executor"] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pipeline")
+            _pool["workers"] = workers
+        return _pool["executor"]
+
+
+class PipelineRun:
+    """Results and timings of one Pipeline.run: results maps every stage (and initial value) to
+       its output; timings maps every stage to its start offset and duration in milliseconds."""
+
+    def __init__(self, name, results, timings, wall_seconds, concurrent):
+        self.name = name
+        self.results = results
+        self.timings = timings
+        self.wall_seconds = wall_seconds
+        self.concurrent = concurrent
+
+    def timing_report(self):
+        stages_ms = sum(timing["duration_ms"] for timing in self.timings.values())
+        return {
+            "pipeline": self.name,
+            "concurrent": self.concurrent,
+            "wall_ms": round(self.wall_seconds * 1000, 3),
+            "stages_ms": round(stages_ms, 3),
+            "stages": self.timings
+        }
+
+
+class Pipeline:
+    """A small DAG of extraction stages. Each stage names its inputs: values passed to run() or
+       earlier stages, whose results are passed to it as positional arguments in that order.
+       Stages whose inputs are ready run concurrently on the shared pool; a stage starts as soon as
+       the last stage it depends on finishes. Stages must not wait on each other or on the pool."""
+
+    def __init__(self, name):
+        self.name = name
+        self._stages = {}
+
+    def stage(self, name, function, inputs=()):
+        """Add a stage. Stages an input refers to must have been added before it, so the
+           stages can't form a cycle; any other input name must be given to run()."""
+        if name in self._stages:
+            raise ValueError(f"Stage {name} is already defined")
+        self._stages[name] = (function, tuple(inputs))
+        return self
+
+    def __contains__(self, name):
+        return name in self._stages
+
+    def run(self, values=None, concurrent=True, executor=None):
+        """Run every stage and return a PipelineRun. With concurrent=False (or no pool) the stages
+           run in the calling thread in the order they were added. The first stage that raises
+           stops the run: stages not yet started are cancelled and its exception is re-raised."""
+        results = dict(values or {})
+        for name, (_, inputs) in self._stages.items():
+            missing = [input_name for input_name in inputs if input_name not in results and input_name not in self._stages]
+            if missing:
+                raise ValueError(f"Stage {name} has undefined inputs: {', '.join(missing)}")
+
+        executor = (executor or shared_executor()) if concurrent else None
+        timings = {}
+        started = time.perf_counter()
+
+        def call(name):
+            function, inputs = self._stages[name]
+            stage_started = time.perf_counter()
+            result = function(*[results[input_name] for input_name in inputs])
+            finished = time.perf_counter()
+            timings[name] = {
+                "start_ms": round((stage_started - started) * 1000, 3),
+                "duration_ms": round((finished - stage_started) * 1000, 3)
+            }
+            return result
+
+        if executor is None or len(self._stages) < 2:
+            for name in self._stages:
+                results[name] = call(name)
+        else:
+            self._run_concurrently(executor, call, results)
+
+        return PipelineRun(self.name, results, timings, time.perf_counter() - started, executor is not None)
+
+    def _run_concurrently(self, executor, call, results):
+        waiting = {name: {input_name for input_name in inputs if input_name in self._stages}
+                   for name, (_, inputs) in self._stages.items()}
+        running = {}
+
+        def submit_ready():
+            for name in [name for name, dependencies in waiting.items() if not dependencies]:
+                del waiting[name]
+                # Each stage runs in a copy of the caller's context, so its log records keep the request id
+                running[executor.submit(contextvars.copy_context().run, call, name)] = name
+
+        submit_ready()
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException:
+                    for pending in running:
+                        pending.cancel()
+                    raise
+                for dependencies in waiting.values():
+                    dependencies.discard(name)
+            submit_ready()
+
+
+class PipelineStats:
+    """Per-stage timings aggregated across pipeline runs: runs, total and slowest duration of
+       each stage, and the wall time of each pipeline next to the sum of its stages."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pipelines = {}
+
+    def record(self, run):
+        report = run.timing_report()
+        with self._lock:
+            pipeline = self._pipelines.setdefault(run.name, {"runs": 0, "wall_ms": 0.0, "stages_ms": 0.0, "stages": {}})
+            pipeline["runs"] += 1
+            pipeline["wall_ms"] += report["wall_ms"]
+            pipeline["stages_ms"] += report["stages_ms"]
+            for name, timing in run.timings.items():
+                stage = pipeline["stages"].setdefault(name, {"runs": 0, "total_ms": 0.0, "max_ms": 0.0})
+                stage["runs"] += 1
+                stage["total_ms"] += timing["duration_ms"]
+                stage["max_ms"] = max(stage["max_ms"], timing["duration_ms"])
+
+    def get_stats(self):
+        with self._lock:
+            stats = {"workers": pipeline_workers()}
+            for name, pipeline in self._pipelines.items():
+                runs = pipeline["runs"]
+                stats[name] = {
+                    "runs": runs,
+                    "avg_wall_ms": round(pipeline["wall_ms"] / runs, 3),
+                    "avg_stages_ms": round(pipeline["stages_ms"] / runs, 3),
+                    "stages": {
+                        stage_name: {
+                            "runs": stage["runs"],
+                            "avg_ms": round(stage["total_ms"] / stage["runs"], 3),
+                            "max_ms": round(stage["max_ms"], 3)
+                        }
+                        for stage_name, stage in pipeline["stages"].items()
+                    }
+                }
+            return stats
+
+    def prometheus_lines(self):
+        """Stage durations in the Prometheus text exposition format"""
+        with self._lock:
+            pipelines = {name: {"runs": pipeline["runs"], "wall_ms": pipeline["wall_ms"],
+                                "stages": {stage_name: dict(stage) for stage_name, stage in pipeline["stages"].items()}}
+                         for name, pipeline in self._pipelines.items()}
+
+        lines = [
+            "# HELP bill_server_pipeline_runs_total Extraction pipeline runs",
+            "# TYPE bill_server_pipeline_runs_total counter"
+        ]
+        for name, pipeline in sorted(pipelines.items()):
+            lines.append(f'bill_server_pipeline_runs_total{{pipeline="{name}"}} {pipeline["runs"]}')
+        lines.append("# HELP bill_server_pipeline_wall_seconds_total Wall time of extraction pipeline runs")
+        lines.append("# TYPE bill_server_pipeline_wall_seconds_total counter")
+        for name, pipeline in sorted(pipelines.items()):
+            lines.append(f'bill_server_pipeline_wall_seconds_total{{pipeline="{name}"}} {round(pipeline["wall_ms"] / 1000, 6)}')
+        lines.append("# HELP bill_server_pipeline_stage_seconds_total Time spent in each extraction pipeline stage")
+        lines.append("# TYPE bill_server_pipeline_stage_seconds_total counter")
+        for name, pipeline in sorted(pipelines.items()):
+            for stage_name, stage in sorted(pipeline["stages"].items()):
+                lines.append(f'bill_server_pipeline_stage_seconds_total{{pipeline="{name}",stage="{stage_name}"}} '
+                             f'{round(stage["total_ms"] / 1000, 6)}')
+        return lines
@@ -0,0 +1,201 @@
+import cProfile
+import datetime
+import json
+import os
+import pstats
+import re
+import secrets
+import tempfile
+import time
+from collections import defaultdict
+from flask import current_app, g, request
+
+# Function names whose time is called out separately in every report
+FOCUS_FUNCTIONS = {
+    "extract_money_amounts_for_contacts": ("extract_money_amounts_for_contacts",),
+    "get_text": ("get_text",),
+    "jsonify": ("jsonify",)
+}
+MAX_STACK_DEPTH = 64
+
+
+def function_label(func):
+    """Readable name of a pstats function key: file:line(name), or just the name for builtins"""
+    filename, line, name = func
+    if filename == "~":
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+def hotspot_table(stats, top_n=25):
+    """Top-N functions by own (tottime) time"""
+    rows = []
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        rows.append({
+            "function": function_label(func),
+            "calls": nc,
+            "primitive_calls": cc,
+            "tottime_ms": round(tt * 1000, 3),
+            "cumtime_ms": round(ct * 1000, 3)
+        })
+    rows.sort(key=lambda row: row["tottime_ms"], reverse=True)
+    return rows[:top_n]
+
+def focus_table(stats):
+    """Cumulative time of the extraction stages we care about, plus total time inside the regex engine"""
+    focus = {name: {"calls": 0, "cumtime_ms": 0.0} for name in FOCUS_FUNCTIONS}
+    focus["regex_engine"] = {"calls": 0, "cumtime_ms": 0.0}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        name = func[2]
+        for focus_name, names in FOCUS_FUNCTIONS.items():
+            if name in names:
+                focus[focus_name]["calls"] += nc
+                focus[focus_name]["cumtime_ms"] += ct * 1000
+        # Compiled-pattern methods (finditer, search, sub...) are builtins of re.Pattern / re.Match
+        if func[0] == "~" and ("'re.Pattern'" in name or "'re.Match'" in name):
+            focus["regex_engine"]["calls"] += nc
+            focus["regex_engine"]["cumtime_ms"] += tt * 1000
+    for values in focus.values():
+        values["cumtime_ms"] = round(values["cumtime_ms"], 3)
+    return focus
+
+def collapsed_stacks(stats):
+    """Approximate collapsed stacks ("a;b;c <microseconds>") for flamegraph tools.
+       cProfile only records caller/callee edges, so each function's time is split across its
+       callers in proportion to the time spent on each edge."""
+    entries = stats.stats
+    callees = defaultdict(dict)
+    for func, (cc, nc, tt, ct, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+
+    samples = defaultdict(float)
+
+    def walk(func, path, on_stack, budget):
+        cc, nc, tt, ct, callers = entries[func]
+        if ct <= 0 or budget <= 0:
+            return
+        scale = min(1.0, budget / ct)
+        path = path + [function_label(func).replace(";", ",")]
+        key = ";".join(path)
+        samples[key] += tt * scale
+        if len(path) >= MAX_STACK_DEPTH:
+            samples[key] += (ct - tt) * scale
+            return
+        for callee, edge_ct in callees.get(func, {}).items():
+            if callee not in on_stack and edge_ct * scale >= 1e-6:
+                walk(callee, path, on_stack | {callee}, edge_ct * scale)
+
+    for func, (cc, nc, tt, ct, callers) in entries.items():
+        if not callers:
+            walk(func, [], {func}, ct)
+
+    lines = [f"{stack} {int(round(seconds * 1_000_000))}" for stack, seconds in samples.items() if seconds >= 1e-6]
+    return "\n".join(sorted(lines)) + "\n"
+
+def keyword_scan_costs(page_texts, keyword_patterns):
+    """Time each keyword's regex over the given pages once; keyword_patterns is [(ukey, keyword, pattern)].
+       Runs after the profiled request, so it costs nothing on the request path."""
+    costs = []
+    for ukey, keyword, pattern in keyword_patterns:
+        try:
+            compiled = re.compile(pattern, re.IGNORECASE)
+        except re.error as e:
+            costs.append({"ukey": ukey, "keyword": keyword, "pattern": pattern, "error": str(e)})
+            continue
+        matches = 0
+        started = time.perf_counter()
+        for page_text in page_texts:
+            for _ in compiled.finditer(page_text):
+                matches += 1
+        costs.append({
+            "ukey": ukey,
+            "keyword": keyword,
+            "pattern": pattern,
+            "matches": matches,
+            "ms": round((time.perf_counter() - started) * 1000, 3)
+        })
+    costs.sort(key=lambda row: row.get("ms", 0), reverse=True)
+    return costs
+
+
+class ProfileStore:
+    """Stores profile reports (JSON) and collapsed stacks on disk, keeping the newest `keep` profiles"""
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = directory or os.getenv('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'bill_server_profiles')
+        self.keep = int(keep if keep is not None else os.getenv('PROFILE_RETENTION', 50))
+
+    def _path(self, profile_id, suffix):
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', profile_id or ''):
+            raise ValueError("Invalid profile id")
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+    def save(self, report, collapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_") + secrets.token_hex(4)
+        report["profile_id"] = profile_id
+        with open(self._path(profile_id, ".json"), "w") as f:
+            json.dump(report, f, indent=2)
+        with open(self._path(profile_id, ".collapsed"), "w") as f:
+            f.write(collapsed)
+        self._prune()
+        return profile_id
+
+    def _prune(self):
+        reports = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in reports[:max(0, len(reports) - self.keep)]:
+            for suffix in (".json", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-len(".json")] + suffix))
+                except OSError:
+                    pass
+
+    def load(self, profile_id):
+        """Return the report dict, or None if it doesn't exist"""
+        try:
+            with open(self._path(profile_id, ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def load_collapsed(self, profile_id):
+        try:
+            with open(self._path(profile_id, ".collapsed")) as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+
+def profile_request(view_function, store, top_n=None):
+    """Run a view function under cProfile, store the hotspot report and collapsed stacks, and
+       return its response with an X-Profile-Id header. Views may put (page_texts, keyword_patterns)
+       in g.profile_keyword_scan to get per-keyword regex costs in the report."""
+    top_n = top_n or int(os.getenv('PROFILE_TOP_N', 25))
+    g.profiling = True
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    result = profiler.runcall(view_function)
+    # Build the response inside the profile too, so jsonify shows up for views that return plain data
+    response = profiler.runcall(current_app.make_response, result)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    stats = pstats.Stats(profiler)
+    report = {
+        "created_at": datetime.datetime.now().isoformat(),
+        "path": request.path,
+        "elapsed_ms": round(elapsed_ms, 3),
+        "status": response.status_code,
+        "top": hotspot_table(stats, top_n),
+        "focus": focus_table(stats)
+    }
+    keyword_scan = g.get("profile_keyword_scan")
+    if keyword_scan:
+        report["keyword_scans"] = keyword_scan_costs(*keyword_scan)
+    # Set by the app's memory tracking; profiled requests also run under tracemalloc
+    memory = g.get("memory")
+    if memory is not None:
+        report["memory"] = memory.report()
+
+    profile_id = store.save(report, collapsed_stacks(stats))
+    response.headers["X-Profile-Id"] = profile_id
+    return response
@@ -0,0 +1,132 @@
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .database_utils import BillingDatabase
+from .page_text import PageTextDocument, decompress_page_texts
+
+
+def _extract_from_page_text(job):
+    """Worker: rebuild a document from compressed page text and run the full extraction
+       with the keywords it was originally extracted with"""
+    page_text_blob, provider, page_range, required_keywords = job
+    try:
+        from .verizonbus_api import run_bill_extraction, parse_page_range
+
+        document = PageTextDocument(decompress_page_texts(page_text_blob))
+        pages_to_extract = parse_page_range(page_range, len(document))
+        return {"extraction": run_bill_extraction(document, pages_to_extract, required_keywords, provider)}
+    except Exception as e:
+        return {"error": str(e)}
+
+def reprocess_documents(db, account_numbers=None, workers=None, batch_size=50):
+    """Re-extract every stored document (or only those of account_numbers) and update billing_records.
+       Documents are extracted in parallel batches; results are written from the calling process.
+       Documents stored before their extraction keywords were recorded are skipped, so a bill
+       extracted with custom keywords is never overwritten with a provider-default extraction."""
+    from .verizonbus_api import build_record_data, keywords_config_snapshot, seed_keywords_config
+
+    documents = db.list_document_text(account_numbers)
+    if batch_size <= 0:
+        raise ValueError("batch_size must be positive")
+    workers = max(1, min(workers or os.cpu_count() or 1, os.cpu_count() or 1))
+
+    summary = {
+        "success": True,
+        "documents": len(documents),
+        "processed": 0,
+        "saved": 0,
+        "failed": 0,
+        "skipped": 0,
+        "pages": 0,
+        "errors": []
+    }
+    started = time.perf_counter()
+
+    # Workers start from this process's checked keywords.json instead of each re-running the pattern analysis
+    pool = (ProcessPoolExecutor(max_workers=workers, initializer=seed_keywords_config,
+                                initargs=(keywords_config_snapshot(),))
+            if workers > 1 and len(documents) > 1 else None)
+    try:
+        for batch_start in range(0, len(documents), batch_size):
+            batch = []
+            for doc in documents[batch_start:batch_start + batch_size]:
+                if doc["required_keywords"] is None:
+                    summary["skipped"] += 1
+                    summary["errors"].append({"content_hash": doc["content_hash"],
+                                              "error": "Skipped: extraction keywords unknown (upload the bill again)"})
+                    continue
+                stored = db.get_document_text(doc["content_hash"])
+                if stored:
+                    batch.append((doc, (stored["page_text"], doc["provider"] or "verizon", doc["page_range"] or "",
+                                        json.loads(doc["required_keywords"]))))
+
+            jobs = [job for _, job in batch]
+            outcomes = pool.map(_extract_from_page_text, jobs) if pool else map(_extract_from_page_text, jobs)
+
+            for (doc, _), outcome in zip(batch, outcomes):
+                summary["processed"] += 1
+                summary["pages"] += doc["total_pages"] or 0
+
+                if "error" in outcome:
+                    summary["failed"] += 1
+                    summary["errors"].append({"content_hash": doc["content_hash"], "error": outcome["error"]})
+                    continue
+
+                extraction = outcome["extraction"]
+                account_number = extraction["summary"].get("account") or doc["account_number"]
+                invoice_number = extraction["summary"].get("invoice") or doc["invoice_number"]
+                if not account_number:
+                    summary["failed"] += 1
+                    summary["errors"].append({"content_hash": doc["content_hash"], "error": "No account number found"})
+                    continue
+
+                data_to_save = build_record_data(extraction, doc["pdf_filename"] or "", doc["total_pages"] or 0, doc["provider"] or "verizon")
+                data_to_save["reprocessed_date"] = datetime.datetime.now().isoformat()
+
+                result = db.save_billing_data(account_number, data_to_save, invoice_number=invoice_number)
+                if result.get("success"):
+                    summary["saved"] += 1
+                else:
+                    summary["failed"] += 1
+                    summary["errors"].append({"content_hash": doc["content_hash"], "error": result.get("error")})
+    finally:
+        if pool:
+            pool.shutdown()
+
+    elapsed = time.perf_counter() - started
+    summary["elapsed_seconds"] = round(elapsed, 3)
+    summary["bills_per_second"] = round(summary["processed"] / elapsed, 2) if elapsed > 0 else 0.0
+    summary["pages_per_second"] = round(summary["pages"] / elapsed, 2) if elapsed > 0 else 0.0
+    summary["success"] = summary["failed"] == 0
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprocess stored bills from cached page text")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Reprocess every stored document")
+    target.add_argument("--account", action="append", dest="accounts", help="Account number to reprocess (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=50, help="Documents per batch")
+    parser.add_argument("--db", dest="db_path", default=None, help="Path to billing_data.db")
+    args = parser.parse_args(argv)
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be positive")
+
+    db = BillingDatabase(args.db_path)
+    result = reprocess_documents(db, account_numbers=None if args.all else args.accounts,
+                                 workers=args.workers, batch_size=args.batch_size)
+
+    print(f"Reprocessed {result['processed']} of {result['documents']} document(s): "
+          f"{result['saved']} saved, {result['failed']} failed, {result['skipped']} skipped in {result['elapsed_seconds']}s "
+          f"({result['bills_per_second']} bills/sec, {result['pages_per_second']} pages/sec)")
+    for error in result["errors"]:
+        print(f"  - {error['content_hash']}: {error['error']}")
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
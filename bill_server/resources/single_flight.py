@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+
+
+def extraction_flight_key(file_hash, provider, pages_to_extract, required_keywords):
+    """Key identifying an extraction: the uploaded bytes plus every parameter that changes the result"""
+    params = json.dumps([file_hash, provider, list(pages_to_extract), required_keywords], sort_keys=True)
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """An extraction in progress in this process"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = True
+
+
+class SingleFlight:
+    """Run one extraction per key at a time and share its result with identical concurrent requests.
+       Threads of this process wait on the leader's in-memory call. Other worker processes are
+       coordinated through a lease row in the extraction_leases table: the process that inserts the
+       row extracts and stores the result there, the others poll until it appears (or the lease expires).
+       A result is only kept long enough for those pollers to read it; a request arriving after the
+       extraction finished runs its own."""
+
+    def __init__(self, db, enabled=None, lease_seconds=None, result_ttl=None, poll_interval=0.1):
+        self.db = db
+        self.enabled = (enabled if enabled is not None
+                        else os.getenv('SINGLE_FLIGHT', 'true').lower() == 'true')
+        self.lease_seconds = float(lease_seconds if lease_seconds is not None
+                                   else os.getenv('SINGLE_FLIGHT_LEASE_SECONDS', 300))
+        self.result_ttl = float(result_ttl if result_ttl is not None
+                                else os.getenv('SINGLE_FLIGHT_RESULT_TTL', 2))
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {
+            "leaders": 0,
+            "shared_in_process": 0,
+            "shared_across_processes": 0,
+            "late_arrivals": 0,
+            "not_shareable": 0,
+            "lease_errors": 0
+        }
+
+    def do(self, key, fn, shareable=None):
+        """Return (result, shared). fn() runs only if no identical extraction is in flight;
+           otherwise the in-flight result (or its exception) is returned with shared=True.
+           A result for which shareable(result) is false is kept to its own request: it isn't
+           published, and requests waiting for it run fn() themselves."""
+        if not self.enabled:
+            return fn(), False
+        shareable = shareable or (lambda result: True)
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            if call.error is None and not call.shared:
+                with self._lock:
+                    self._stats["leaders"] += 1
+                    self._stats["not_shareable"] += 1
+                return fn(), False
+            with self._lock:
+                self._stats["shared_in_process"] += 1
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result, shared = self._run_with_lease(key, fn, shareable)
+            call.shared = shareable(call.result)
+            return call.result, shared
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run_with_lease(self, key, fn, shareable):
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        polled = False
+
+        while True:
+            lease = self.db.acquire_extraction_lease(key, owner, self.lease_seconds)
+            if not lease.get("success"):
+                # Coordination is an optimization - never fail an extraction because of it
+                with self._lock:
+                    self._stats["lease_errors"] += 1
+                    self._stats["leaders"] += 1
+                return fn(), False
+            if lease["acquired"]:
+                break
+            if lease.get("result") is not None:
+                if not polled:
+                    # Finished before this request arrived: not a concurrent extraction, so don't reuse it
+                    with self._lock:
+                        self._stats["late_arrivals"] += 1
+                        self._stats["leaders"] += 1
+                    return fn(), False
+                with self._lock:
+                    self._stats["shared_across_processes"] += 1
+                return json.loads(zlib.decompress(lease["result"]).decode("utf-8")), True
+            # Another process is extracting; poll until it publishes the result or its lease expires
+            polled = True
+            time.sleep(self.poll_interval)
+
+        with self._lock:
+            self._stats["leaders"] += 1
+        try:
+            result = fn()
+        except BaseException:
+            self.db.release_extraction_lease(key, owner)
+            raise
+
+        if not shareable(result):
+            # Waiting processes take the lease over and extract on their own
+            with self._lock:
+                self._stats["not_shareable"] += 1
+            self.db.release_extraction_lease(key, owner)
+            return result, False
+
+        blob = zlib.compress(json.dumps(result).encode("utf-8"), 6)
+        self.db.complete_extraction_lease(key, owner, blob, self.result_ttl)
+        return result, False
+
+    def get_stats(self):
+        """Leader and shared-result counts for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["enabled"] = self.enabled
+        return stats
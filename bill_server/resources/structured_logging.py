@@ -0,0 +1,221 @@
+import atexit
+import contextvars
+import copy
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+LOGGER_NAME = "bill_server"
+
+# Id of the request being handled by the current thread, added to every record as request_id
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through extra= and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_configure_lock = threading.Lock()
+_state = {"handler": None, "listener": None, "rate_filter": None}
+
+
+def get_logger(name=None):
+    """Logger below the bill_server logger, e.g. get_logger("extraction") -> bill_server.extraction"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+def set_request_id(request_id):
+    """Set the current request id; returns a token for reset_request_id"""
+    return request_id_var.set(request_id)
+
+def reset_request_id(token):
+    request_id_var.reset(token)
+
+def get_request_id():
+    return request_id_var.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id (runs in the thread that logs)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """Per-message rate limiting. Messages are keyed by logger and unformatted message, so
+       "Error processing page %s for contact %s" is one key however many pages fail.
+       Each key may log `limit` records per `window_seconds`; beyond that only every
+       `sample_every`-th record passes, carrying the number of records suppressed since the last one."""
+
+    def __init__(self, limit=None, window_seconds=None, sample_every=None):
+        super().__init__()
+        self.limit = int(limit if limit is not None else os.getenv('LOG_RATE_LIMIT', 20))
+        self.window_seconds = float(window_seconds if window_seconds is not None
+                                    else os.getenv('LOG_RATE_WINDOW_SECONDS', 60))
+        self.sample_every = max(1, int(sample_every if sample_every is not None
+                                       else os.getenv('LOG_SAMPLE_EVERY', 100)))
+        self._lock = threading.Lock()
+        self._keys = {}
+        self.suppressed_total = 0
+
+    def filter(self, record):
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._keys.get(key)
+            if entry is None or now - entry[0] >= self.window_seconds:
+                if len(self._keys) >= 10000:
+                    self._keys.clear()
+                entry = [now, 0, 0]
+                self._keys[key] = entry
+            entry[1] += 1
+            if entry[1] <= self.limit:
+                return True
+            if (entry[1] - self.limit) % self.sample_every:
+                entry[2] += 1
+                self.suppressed_total += 1
+                return False
+            record.suppressed = entry[2]
+            entry[2] = 0
+            return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking the caller.
+       Formatting is left to the listener thread."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message now (args may change later) but keep exc_info for the listener to format
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request_id and any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable variant of JsonFormatter for local development"""
+
+    def format(self, record):
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}"
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            line += f" [{request_id}]"
+        line += f": {record.getMessage()}"
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level=None, log_format=None, queue_size=None, stream=None):
+    """Send bill_server logging through a bounded queue to a background thread that writes to stdout.
+       Logging calls only filter the record and enqueue it, so they never wait for I/O. Idempotent."""
+    with _configure_lock:
+        if _state["handler"] is not None:
+            return get_logger()
+
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        log_format = (log_format or os.getenv('LOG_FORMAT', 'json')).lower()
+        queue_size = int(queue_size if queue_size is not None else os.getenv('LOG_QUEUE_SIZE', 10000))
+
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+
+        handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+        rate_filter = RateLimitFilter()
+        handler.addFilter(rate_filter)
+        handler.addFilter(RequestIdFilter())
+
+        listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+        listener.start()
+        atexit.register(listener.stop)
+
+        logger = get_logger()
+        logger.setLevel(getattr(logging, level, logging.INFO))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+        _state.update({"handler": handler, "listener": listener, "rate_filter": rate_filter})
+        return logger
+
+def _reconfigure_after_fork():
+    """The listener thread does not survive fork, and the queue's lock may have been held by it, so
+       a forked child (e.g. a ProcessPoolExecutor worker) writes its records directly to the output
+       instead of into a queue nobody reads. Workers are batch processes; blocking on I/O is fine there."""
+    global _configure_lock
+    _configure_lock = threading.Lock()
+    handler, listener = _state["handler"], _state["listener"]
+    if handler is None or listener is None:
+        return
+
+    output = logging.StreamHandler(listener.handlers[0].stream)
+    output.setFormatter(listener.handlers[0].formatter)
+    for log_filter in handler.filters:
+        output.addFilter(log_filter)
+
+    logger = get_logger()
+    logger.removeHandler(handler)
+    logger.addHandler(output)
+    _state.update({"handler": output, "listener": None})
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reconfigure_after_fork)
+
+def get_logging_stats():
+    """Queue depth and dropped/suppressed record counts"""
+    handler = _state["handler"]
+    if handler is None:
+        return {"configured": False}
+    # A forked worker logs directly, without a queue
+    queued = isinstance(handler, NonBlockingQueueHandler)
+    return {
+        "configured": True,
+        "level": logging.getLevelName(get_logger().level),
+        "queue_depth": handler.queue.qsize() if queued else 0,
+        "dropped": handler.dropped if queued else 0,
+        "suppressed": _state["rate_filter"].suppressed_total
+    }
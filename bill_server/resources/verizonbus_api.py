@@ -1,13 +1,34 @@
-from flask import request, jsonify
+from flask import request, jsonify, current_app, stream_with_context, g
 from flask.views import MethodView
 from flask_smorest import Blueprint
-import fitz  # PyMuPDF
 import re
 import json
 import os
 import datetime 
+import csv
+import io
+import copy
+import threading
+import time
+import logging
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from schemas import PDFTextExtractionSchema
-from .database_utils import BillingDatabase
+from .database_utils import LazyBillingDatabase
+from .admission import AdmissionController, AdmissionRejected
+from .single_flight import SingleFlight, extraction_flight_key
+from .deadline import ExtractionDeadline, ResumeCache
+from .document_sessions import DocumentSessionCache
+from .admin import is_admin_request
+from .profiling import ProfileStore, profile_request
+from .structured_logging import get_logger
+from .keyword_stats import KeywordRuleStats, rule_id
+from .pattern_safety import PatternQuarantine, analyze_keyword_patterns, strip_pattern_quotes
+from .pipeline import Pipeline, PipelineStats
+from .memory import DocumentScope, MemoryGovernor
+from .http_cache import not_modified_response, cacheable_response
+from .page_text import PageTextDocument, LazyPageTextDocument, extract_page_texts, content_hash, compress_page_texts
+
+logger = get_logger("extraction")
 
 # Create blueprint
 blp = Blueprint(
@@ -17,33 +38,185 @@ blp = Blueprint(
     description="PDF Text Extraction API operations"
 )
 
-# Initialize database
-db = BillingDatabase()
+# Database is created on first use (see warm_up) so importing this module stays cheap
+db = LazyBillingDatabase()
+
+# Page-weighted admission control for /extract-text (see ADMISSION_* environment variables)
+admission = AdmissionController()
+
+# State of partial (deadline-limited) extractions, continued through /extract-text/resume
+resume_cache = ResumeCache()
+
+# Uploaded documents kept between requests (see DOCUMENT_SESSION_* environment variables)
+document_sessions = DocumentSessionCache()
+
+# Reports of profile=1 requests
+profile_store = ProfileStore()
+
+# Per-rule evaluation/hit/cost counters of the keyword scan
+keyword_stats = KeywordRuleStats()
+
+# Per-stage timings of the extraction pipelines (see PIPELINE_WORKERS)
+pipeline_stats = PipelineStats()
+
+# Per-request RSS/tracemalloc tracking and the worker memory ceiling (see MEMORY_* environment variables)
+memory_governor = MemoryGovernor()
+
+# Coalesces identical concurrent extractions, across processes via extraction_leases (see SINGLE_FLIGHT_*)
+single_flight = SingleFlight(db)
 
 ## Utility Functions from JSON
+# keywords.json is in the bill_server folder
+KEYWORDS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'keywords.json')
+
+# Parsed keywords.json, reloaded only when the file changes on disk
+_keywords_cache = {"signature": None, "data": None, "reloading": None, "failed": None}
+# Guards swapping in a reloaded config; parsing and the pattern check happen outside it
+_keywords_cache_lock = threading.Lock()
+# Held by the first load only, while there is no config to serve yet
+_keywords_first_load_lock = threading.Lock()
+
+# keyword_patterns that failed the safety analysis; the extractor falls back to an exact keyword match
+pattern_quarantine = PatternQuarantine()
+
+# Search keywords with their compiled regexes, per keyword config and quarantine generation
+_compiled_keywords_cache = {}
+_compiled_keywords_lock = threading.Lock()
+# Custom keywords arrive per request, so only the most recent configs are kept
+COMPILED_KEYWORDS_CACHE_SIZE = int(os.getenv('COMPILED_KEYWORDS_CACHE_SIZE', '32'))
+
+def _keywords_signature():
+    stat = os.stat(KEYWORDS_FILE)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _reload_keywords_config(signature):
+    """Parse keywords.json and check its keyword_patterns, then swap in the config and its quarantine together"""
+    with open(KEYWORDS_FILE, 'r') as f:
+        data = json.load(f)
+    report = check_keyword_patterns(data)
+    with _keywords_cache_lock:
+        _keywords_cache["data"] = data
+        _keywords_cache["signature"] = signature
+        pattern_quarantine.update(report)
+
+def _start_keywords_reload(signature):
+    """Reload keywords.json on a background thread, one reload at a time"""
+    with _keywords_cache_lock:
+        if _keywords_cache["reloading"] is not None or _keywords_cache["failed"] == signature:
+            return
+        _keywords_cache["reloading"] = signature
+    
+    def run():
+        try:
+            _reload_keywords_config(signature)
+            logger.info("Reloaded keywords.json")
+        except Exception as e:
+            # Keep serving the previous config; an edit that fixes the file is picked up again
+            _keywords_cache["failed"] = signature
+            logger.error("Error reloading keywords.json, keeping the previous config: %s", e)
+        finally:
+            _keywords_cache["reloading"] = None
+    
+    threading.Thread(target=run, name="keywords-reload", daemon=True).start()
+
+def load_keywords_config():
+    """Return the parsed keywords.json, re-reading it only when its mtime or size changes.
+       Every (re)load checks the keyword_patterns and updates pattern_quarantine. A changed file is
+       reloaded in the background and the previous config is served until it has been checked;
+       only the first load, with nothing to serve yet, waits for the check."""
+    signature = _keywords_signature()
+    data = _keywords_cache["data"]
+    if data is None:
+        with _keywords_first_load_lock:
+            if _keywords_cache["data"] is None:
+                _reload_keywords_config(signature)
+        return _keywords_cache["data"]
+    if _keywords_cache["signature"] != signature:
+        _start_keywords_reload(signature)
+    return data
+
+def keywords_config_snapshot():
+    """The loaded keywords.json with its signature and pattern check, to seed worker processes"""
+    load_keywords_config()
+    with _keywords_cache_lock:
+        return {
+            "signature": _keywords_cache["signature"],
+            "data": _keywords_cache["data"],
+            "report": pattern_quarantine.report
+        }
+
+def seed_keywords_config(snapshot):
+    """Process pool initializer: start from the parent's parsed keywords.json and pattern check
+       instead of repeating the analysis in every worker. A later edit is reloaded as usual."""
+    with _keywords_cache_lock:
+        if _keywords_cache["data"] is None and snapshot["data"] is not None:
+            _keywords_cache["data"] = snapshot["data"]
+            _keywords_cache["signature"] = snapshot["signature"]
+            if snapshot["report"] is not None:
+                pattern_quarantine.update(snapshot["report"])
+
+def check_keyword_patterns(config):
+    """Run the pattern safety analysis on a parsed keywords.json and log the patterns that need attention.
+       The caller applies the report to pattern_quarantine."""
+    report = analyze_keyword_patterns(config)
+    for row in report["patterns"]:
+        if row["quarantined"]:
+            reason = row["error"] or ("timed out" if row["timed_out"] else f"{row['benchmark_ms']}ms on {row['worst_text']}")
+            logger.error("Quarantined keyword_pattern %r (%s): %s; using an exact keyword match instead",
+                         row["pattern"], ", ".join(row["rules"]), reason, extra={"issues": row["issues"]})
+        elif row["issues"]:
+            logger.warning("keyword_pattern %r (%s) may backtrack: %s", row["pattern"], ", ".join(row["rules"]),
+                           "; ".join(row["issues"]))
+    logger.info("Checked %s keyword pattern(s) in %sms: %s quarantined", len(report["patterns"]),
+                report["elapsed_ms"], len(report["quarantined"]))
+    return report
+
+def safe_keyword_pattern(keyword_pattern):
+    """keyword_pattern, or None when it is quarantined"""
+    if keyword_pattern and pattern_quarantine.is_quarantined(strip_pattern_quotes(keyword_pattern)):
+        return None
+    return keyword_pattern
+
 def load_provider_settings(provider="verizon"):
     """Load provider-specific settings from JSON file"""
     try:
-        # Updated path - keywords.json is now in bill_server folder
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        bill_server_dir = os.path.dirname(current_dir)  # Go up one level to bill_server
-        keywords_file = os.path.join(bill_server_dir, 'keywords.json')
-        
-        with open(keywords_file, 'r') as f:
-            data = json.load(f)
-            provider_data = data.get(provider, {})
-            return provider_data.get('settings', {})
+        provider_data = load_keywords_config().get(provider, {})
+        # Callers get their own copy so the cached config can't be modified
+        return copy.deepcopy(provider_data.get('settings', {}))
     except Exception as e:
-        print(f"Error loading provider settings for {provider}: {str(e)}")
+        logger.error("Error loading provider settings for %s: %s", provider, e)
         return {}
 
+def warm_up():
+    """Do the expensive one-time startup work ahead of the first request: import PyMuPDF,
+       parse and check keywords.json and create the database. Returns the time each step took in ms
+       and the quarantined keyword patterns."""
+    timings = {}
+    
+    started = time.perf_counter()
+    import fitz  # noqa: F401
+    timings["fitz_import_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    started = time.perf_counter()
+    for provider in load_keywords_config():
+        compile_search_keywords(load_required_keywords(provider))
+    timings["keywords_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    started = time.perf_counter()
+    db.get()
+    timings["database_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    
+    # Loading keywords.json above ran the keyword_pattern safety analysis
+    timings["quarantined_patterns"] = pattern_quarantine.get_stats().get("quarantined", [])
+    return timings
+
 def load_exclude_keywords(provider="verizon"):
     """Load exclude keywords from JSON file"""
     try:
         settings = load_provider_settings(provider)
         return settings.get('exclude_keywords', ['in', 'pay', 'auto', 'device'])
     except Exception as e:
-        print(f"Error loading exclude keywords: {str(e)}")
+        logger.error("Error loading exclude keywords: %s", e)
         return ['in', 'pay', 'auto', 'device']
 
 def load_required_keywords(provider="verizon"):
@@ -55,7 +228,7 @@ def load_required_keywords(provider="verizon"):
             {"keyword": "BUS UNL Pro 5G Smartphone", "ukey": "smartphone", "search_range": 50}
         ])
     except Exception as e:
-        print(f"Error loading required keywords: {str(e)}")
+        logger.error("Error loading required keywords: %s", e)
         return [
             {"keyword": "Monthly Charges", "ukey": "monthly", "search_range": 50},
             {"keyword": "BUS UNL Pro 5G Smartphone", "ukey": "smartphone", "search_range": 50}
@@ -71,7 +244,7 @@ def load_inline_sentences(provider="verizon"):
             {"keyword": "Balance Due", "ukey": "balance_due"}
         ])
     except Exception as e:
-        print(f"Error loading inline sentences: {str(e)}")
+        logger.error("Error loading inline sentences: %s", e)
         return [
             {"keyword": "Total Amount Due", "ukey": "total_amount_due"},
             {"keyword": "Amount Due", "ukey": "amount_due"},
@@ -87,7 +260,7 @@ def load_account_level_keywords(provider="verizon"):
             "late_fee_sentence": "Late Fee"
         })
     except Exception as e:
-        print(f"Error loading account level keywords: {str(e)}")
+        logger.error("Error loading account level keywords: %s", e)
         return {
             "search_term": "Account Level Charges Details",
             "late_fee_sentence": "Late Fee"
@@ -102,7 +275,7 @@ def load_previous_balance_keywords(provider="verizon"):
             {"keyword": "Total Payments", "name": "Total Payments", "ukey": "total_payments", "header": "h2"}
         ])
     except Exception as e:
-        print(f"Error loading previous balance keywords: {str(e)}")
+        logger.error("Error loading previous balance keywords: %s", e)
         return [
             {"keyword": "Previous Balance", "name": "Previous Balance", "ukey": "previous_balance", "header": "h1"},
             {"keyword": "Total Payments", "name": "Total Payments", "ukey": "total_payments", "header": "h2"}
@@ -136,14 +309,271 @@ def parse_page_range(page_range_str, total_pages):
     
     return sorted(list(pages))
 
+# Per-charge fields that only repeat information already present elsewhere in the response
+COMPACT_EXCLUDED_FIELDS = ('inline_context', 'contact_match_type')
+
+def compact_money_amounts(money_amounts):
+    """Return copies of money amounts (and their sub_keys) without the fields dropped in compact view."""
+    compacted = []
+    for amount in money_amounts:
+        compact_amount = {key: value for key, value in amount.items() if key not in COMPACT_EXCLUDED_FIELDS}
+        if 'sub_keys' in amount:
+            compact_amount['sub_keys'] = compact_money_amounts(amount['sub_keys'])
+        compacted.append(compact_amount)
+    return compacted
+
+## Amount Normalization and Totals
+def parse_amount_cents(amount):
+    """Convert a display amount such as "$1,234.56", "-$5.00" or "($5.00)" to integer cents.
+       Returns None when the value does not contain a number."""
+    if amount is None:
+        return None
+    text = str(amount).strip()
+    negative = text.startswith('-') or (text.startswith('(') and text.endswith(')'))
+    digits = re.sub(r'[^\d.]', '', text)
+    if not digits or digits == '.':
+        return None
+    try:
+        cents = int((Decimal(digits) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        return None
+    return -cents if negative else cents
+
+def _amount_cents(item):
+    """Cents for an extracted item, parsing the display string for records saved before amount_cents existed"""
+    cents = item.get('amount_cents')
+    if cents is None:
+        cents = parse_amount_cents(item.get('amount'))
+    return cents or 0
+
+def _roman_numeral(num):
+    numerals = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X']
+    return numerals[num - 1] if 0 < num <= len(numerals) else str(num)
+
+def build_bill_totals(entries, summary):
+    """Precompute per-line totals, category subtotals and the chart distribution in integer cents."""
+    lines = []
+    category_totals = {}
+    sub_key_category_totals = {}
+    
+    for entry in entries:
+        line_total = None
+        line_categories = {}
+        for money in entry.get('money_amounts', []):
+            cents = _amount_cents(money)
+            ukey = money.get('ukey', '')
+            # "total" is the line's Total Current Charges, not a category of its own.
+            # Like the results page, the first one found is the line's total.
+            if ukey == 'total':
+                if line_total is None:
+                    line_total = cents
+                continue
+            
+            line_categories[ukey] = line_categories.get(ukey, 0) + cents
+            category = category_totals.setdefault(ukey, {
+                "ukey": ukey,
+                "name": money.get('name', ukey),
+                "total_cents": 0
+            })
+            category["total_cents"] += cents
+            
+            for sub_key in money.get('sub_keys', []):
+                sub_category = (sub_key.get('category') or '').strip() or 'uncategorized'
+                sub_key_category_totals[sub_category] = sub_key_category_totals.get(sub_category, 0) + _amount_cents(sub_key)
+        
+        lines.append({
+            "phone": entry.get('phone', ''),
+            "name": entry.get('name') or entry.get('text') or 'Unknown',
+            "total_cents": line_total or 0,
+            "categories": line_categories
+        })
+    
+    late_fees_cents = sum(_amount_cents(fee) for fee in (summary or {}).get('late_fees', []))
+    
+    # Grand total shown on the results page: balance forward + current charges due + late fees
+    summary_amounts = (summary or {}).get('money_amounts', [])
+    charges_grand_total_cents = sum(
+        _amount_cents(item) for item in summary_amounts
+        if item.get('ukey') in ('balance_forward', 'total_charges_due')
+    ) + late_fees_cents
+    
+    # Pie chart data: duplicate names get roman numerals in document order
+    name_counts = {}
+    for line in lines:
+        name_counts[line["name"]] = name_counts.get(line["name"], 0) + 1
+    name_indexes = {}
+    distribution = []
+    for line in lines:
+        display_name = line["name"]
+        if name_counts[display_name] > 1:
+            name_indexes[display_name] = name_indexes.get(display_name, 0) + 1
+            display_name = f"{display_name} {_roman_numeral(name_indexes[display_name])}"
+        distribution.append({
+            "name": line["name"],
+            "display_name": display_name,
+            "phone": line["phone"],
+            "amount_cents": line["total_cents"]
+        })
+    if late_fees_cents > 0:
+        distribution.append({
+            "name": "Late Fees & Account Charges",
+            "display_name": "Late Fees & Account Charges",
+            "phone": "Account Level",
+            "amount_cents": late_fees_cents
+        })
+    distribution = [item for item in distribution if item["amount_cents"] > 0]
+    distribution_total = sum(item["amount_cents"] for item in distribution)
+    for item in distribution:
+        item["percentage"] = f"{item['amount_cents'] * 100 / distribution_total:.1f}" if distribution_total else "0.0"
+    distribution.sort(key=lambda item: item["amount_cents"], reverse=True)
+    
+    return {
+        "lines": lines,
+        "lines_total_cents": sum(line["total_cents"] for line in lines),
+        "categories": list(category_totals.values()),
+        "sub_key_categories": sub_key_category_totals,
+        "late_fees_cents": late_fees_cents,
+        "charges_grand_total_cents": charges_grand_total_cents,
+        "distribution": distribution
+    }
+
 ## PDF Data Extraction Functions
-def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=None, provider="verizon"):
-    """Scan the PDF document to find money amounts associated with extracted contacts."""
+def build_search_keywords(required_keywords):
+    """Expand required keywords (and their sub_keys) into the flat list of search terms scanned for each contact."""
+    search_keywords = []
+    for kw in required_keywords:
+        if isinstance(kw, dict):
+            # Handle search_range for main keyword
+            main_search_range = kw.get("search_range", {"start": 1, "end": 50})
+            if isinstance(main_search_range, dict):
+                # Convert dict format to character count
+                main_range_chars = main_search_range.get("end", 50) - main_search_range.get("start", 1) + 1
+            else:
+                # Handle legacy format or direct number
+                main_range_chars = main_search_range if main_search_range else 50
+            
+            # Add main keyword with search_range
+            main_keyword = {
+                "search_term": kw.get("keyword", ""),
+                "original_keyword": kw.get("keyword", ""),
+                "display_name": kw.get("name", kw.get("keyword", "")),
+                "ukey": kw.get("ukey", ""),
+                "search_range": main_range_chars,
+                "is_sub_key": False,
+                "parent_ukey": None,
+                "parent_keyword": None
+            }
+            search_keywords.append(main_keyword)
+            
+            # Add sub_keys if they exist
+            sub_keys = kw.get("sub_key", [])
+            if sub_keys:
+                for sub_key in sub_keys:
+                    if isinstance(sub_key, dict):
+                        # Handle search_range for sub_key
+                        sub_search_range = sub_key.get("search_range", main_search_range)
+                        
+                        if isinstance(sub_search_range, dict):
+                            # Convert dict format to character count
+                            sub_range_chars = sub_search_range.get("end", 50) - sub_search_range.get("start", 1) + 1
+                        elif isinstance(sub_search_range, str) and sub_search_range.strip() == "":
+                            # Handle empty string - use default
+                            sub_range_chars = 50
+                        elif sub_search_range:
+                            # Handle direct number
+                            sub_range_chars = sub_search_range
+                        else:
+                            # Use main keyword's range or default
+                            sub_range_chars = main_range_chars
+                        
+                        search_keywords.append({
+                            "search_term": sub_key.get("keyword", ""),
+                            "original_keyword": sub_key.get("keyword", ""),
+                            "display_name": sub_key.get("name", sub_key.get("keyword", "")),
+                            "ukey": sub_key.get("ukey", ""),
+                            "search_range": sub_range_chars,
+                            "is_sub_key": True,
+                            "parent_ukey": kw.get("ukey", ""),
+                            "parent_keyword": kw.get("keyword", ""),
+                            "keyword_pattern": safe_keyword_pattern(sub_key.get("keyword_pattern", None)),
+                            "is_installment": sub_key.get("isInstallment", False),  # Add installment flag
+                            "has_expiration": sub_key.get("hasExpiration", False),  # Add expiration flag
+                            "allow_multiple": sub_key.get("allowMultiple", False),  # Add allowMultiple flag
+                            "category": sub_key.get("category", "")  # Add category field
+                        })
+        else:
+            search_keywords.append({
+                "search_term": kw,
+                "original_keyword": kw,
+                "display_name": kw,
+                "ukey": kw.lower().replace(" ", "_"),
+                "search_range": 50,  # Default range for string keywords
+                "is_sub_key": False,
+                "parent_ukey": None,
+                "parent_keyword": None,
+                "is_installment": False,
+                "allow_multiple": False
+            })
+    return search_keywords
+
+def keyword_regex(keyword_obj):
+    """The regex extract_money_amounts_for_contacts scans for a search keyword: its keyword_pattern
+       (without surrounding quotes) or the escaped search term."""
+    keyword_pattern = keyword_obj.get("keyword_pattern", None)
+    if keyword_pattern:
+        if keyword_pattern.startswith("'") and keyword_pattern.endswith("'"):
+            keyword_pattern = keyword_pattern[1:-1]
+        elif keyword_pattern.startswith('"') and keyword_pattern.endswith('"'):
+            keyword_pattern = keyword_pattern[1:-1]
+        return keyword_pattern
+    return re.escape(keyword_obj["search_term"])
+
+def compile_search_keywords(required_keywords):
+    """build_search_keywords with the compiled regexes the keyword scan runs for each keyword:
+       (keyword_obj, keyword_regex, exact search_term regex). Built once per keyword config and
+       pattern_quarantine generation; the returned keyword objects are shared and must not be modified."""
+    cache_key = (json.dumps(required_keywords, sort_keys=True), pattern_quarantine.generation)
+    compiled = _compiled_keywords_cache.get(cache_key)
+    if compiled is not None:
+        return compiled
+    
+    compiled = []
+    for keyword_obj in build_search_keywords(required_keywords):
+        exact_regex = re.compile(re.escape(keyword_obj["search_term"]), re.IGNORECASE)
+        try:
+            pattern_regex = re.compile(keyword_regex(keyword_obj), re.IGNORECASE)
+        except re.error as e:
+            # Only reachable with PATTERN_QUARANTINE=false; same fallback as a quarantined pattern
+            logger.error("Invalid keyword_pattern %r (%s): %s; using an exact keyword match instead",
+                         keyword_obj.get("keyword_pattern"), keyword_obj["ukey"], e)
+            pattern_regex = exact_regex
+        compiled.append((keyword_obj, pattern_regex, exact_regex))
+    
+    with _compiled_keywords_lock:
+        if len(_compiled_keywords_cache) >= COMPILED_KEYWORDS_CACHE_SIZE:
+            _compiled_keywords_cache.clear()
+        _compiled_keywords_cache[cache_key] = compiled
+    return compiled
+
+def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=None, provider="verizon", pages_to_extract=None, deadline=None):
+    """Scan the PDF document to find money amounts associated with extracted contacts.
+       Only pages in pages_to_extract (1-based) are scanned; None scans the whole document.
+       With a deadline, stops before the contact during which it expires (see deadline.contacts_processed)."""
     results = []    
 
     if required_keywords is None:
         required_keywords = load_required_keywords(provider)
     
+    # Search keywords including sub_keys with proper parent association and their precompiled regexes
+    # (the same for every contact and page)
+    compiled_keywords = compile_search_keywords(required_keywords)
+    
+    # Per-rule counters [evaluations, hits, money_found, match_seconds], merged into keyword_stats at the end
+    rule_counters = {rule_id(keyword_obj): [0, 0, 0, 0.0] for keyword_obj, _, _ in compiled_keywords}
+    keyword_rules = [(keyword_obj, pattern_regex, exact_regex, rule_counters[rule_id(keyword_obj)])
+                     for keyword_obj, pattern_regex, exact_regex in compiled_keywords]
+    perf_counter = time.perf_counter
+    
     # Standard money regex for main keywords
     money_regex = re.compile(r'\$[\d,]+\.?\d*', re.IGNORECASE)
     # Enhanced money regex for sub_keys to handle negative values
@@ -156,6 +586,9 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
     date_range_regex = re.compile(r'\d{1,2}\/\d{1,2}\s*-\s*\d{1,2}\/\d{1,2}', re.IGNORECASE)
     
     for entry in entries:
+        if deadline is not None and deadline.expired():
+            break
+        
         contact_phone = entry['phone']
         contact_name = entry['text']
         contact_results = {
@@ -164,87 +597,14 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
             'money_amounts': []
         }
         
-        # Create search keywords including sub_keys with proper parent association
-        search_keywords = []
-        for kw in required_keywords:
-            if isinstance(kw, dict):
-                # Handle search_range for main keyword
-                main_search_range = kw.get("search_range", {"start": 1, "end": 50})
-                if isinstance(main_search_range, dict):
-                    # Convert dict format to character count
-                    main_range_chars = main_search_range.get("end", 50) - main_search_range.get("start", 1) + 1
-                else:
-                    # Handle legacy format or direct number
-                    main_range_chars = main_search_range if main_search_range else 50
-                
-                # Add main keyword with search_range
-                main_keyword = {
-                    "search_term": kw.get("keyword", ""),
-                    "original_keyword": kw.get("keyword", ""),
-                    "display_name": kw.get("name", kw.get("keyword", "")),
-                    "ukey": kw.get("ukey", ""),
-                    "search_range": main_range_chars,
-                    "is_sub_key": False,
-                    "parent_ukey": None,
-                    "parent_keyword": None
-                }
-                search_keywords.append(main_keyword)
-                
-                # Add sub_keys if they exist
-                sub_keys = kw.get("sub_key", [])
-                if sub_keys:
-                    for sub_key in sub_keys:
-                        if isinstance(sub_key, dict):
-                            # Handle search_range for sub_key
-                            sub_search_range = sub_key.get("search_range", main_search_range)
-                            
-                            if isinstance(sub_search_range, dict):
-                                # Convert dict format to character count
-                                sub_range_chars = sub_search_range.get("end", 50) - sub_search_range.get("start", 1) + 1
-                            elif isinstance(sub_search_range, str) and sub_search_range.strip() == "":
-                                # Handle empty string - use default
-                                sub_range_chars = 50
-                            elif sub_search_range:
-                                # Handle direct number
-                                sub_range_chars = sub_search_range
-                            else:
-                                # Use main keyword's range or default
-                                sub_range_chars = main_range_chars
-                            
-                            search_keywords.append({
-                                "search_term": sub_key.get("keyword", ""),
-                                "original_keyword": sub_key.get("keyword", ""),
-                                "display_name": sub_key.get("name", sub_key.get("keyword", "")),
-                                "ukey": sub_key.get("ukey", ""),
-                                "search_range": sub_range_chars,
-                                "is_sub_key": True,
-                                "parent_ukey": kw.get("ukey", ""),
-                                "parent_keyword": kw.get("keyword", ""),
-                                "keyword_pattern": sub_key.get("keyword_pattern", None),
-                                "is_installment": sub_key.get("isInstallment", False),  # Add installment flag
-                                "has_expiration": sub_key.get("hasExpiration", False),  # Add expiration flag
-                                "allow_multiple": sub_key.get("allowMultiple", False),  # Add allowMultiple flag
-                                "category": sub_key.get("category", "")  # Add category field
-                            })
-            else:
-                search_keywords.append({
-                    "search_term": kw,
-                    "original_keyword": kw,
-                    "display_name": kw,
-                    "ukey": kw.lower().replace(" ", "_"),
-                    "search_range": 50,  # Default range for string keywords
-                    "is_sub_key": False,
-                    "parent_ukey": None,
-                    "parent_keyword": None,
-                    "is_installment": False,
-                    "allow_multiple": False
-                })
-                                    
         # Store found money amounts with parent-child relationship validation
         found_amounts = []
         
-        # Scan entire document
-        for page_num in range(len(pdf_document)):
+        # Scan the requested pages (0-based here; reported page numbers stay 1-based)
+        page_indexes = [page - 1 for page in pages_to_extract] if pages_to_extract is not None else range(len(pdf_document))
+        for page_num in page_indexes:
+            if deadline is not None and deadline.expired():
+                break
             try:
                 page = pdf_document.load_page(page_num)
                 page_text = page.get_text()
@@ -257,18 +617,22 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                 if phone_in_page and full_name_in_page:
                     # First, find all parent keyword positions on the page
                     parent_positions = {}
-                    for keyword_obj in search_keywords:
+                    for keyword_obj, _, exact_regex, counters in keyword_rules:
                         if not keyword_obj["is_sub_key"]:
-                            parent_keyword = keyword_obj["search_term"]
+                            scan_started = perf_counter()
                             parent_ukey = keyword_obj["ukey"]
-                            parent_matches = list(re.finditer(re.escape(parent_keyword), page_text, re.IGNORECASE))
+                            parent_matches = list(exact_regex.finditer(page_text))
                             if parent_matches:
                                 parent_positions[parent_ukey] = [(match.start(), match.end()) for match in parent_matches]
+                            counters[3] += perf_counter() - scan_started
                     
                     # Track occurrence count for each sub_key to ensure unique ukeys
                     sub_key_counts = {}
                     
-                    for keyword_obj in search_keywords:
+                    for keyword_obj, keyword_regex_compiled, _, counters in keyword_rules:
+                        scan_started = perf_counter()
+                        matched = False
+                        amounts_before = len(found_amounts)
                         search_term = keyword_obj["search_term"]
                         original_keyword = keyword_obj["original_keyword"]
                         display_name = keyword_obj["display_name"]
@@ -283,20 +647,9 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                         allow_multiple = keyword_obj.get("allow_multiple", False)
                         category = keyword_obj.get("category", "")
                         
-                        # Use keyword_pattern if provided, otherwise use exact match
-                        if keyword_pattern:
-                            # Remove quotes from the JSON pattern and use it directly  
-                            if keyword_pattern.startswith("'") and keyword_pattern.endswith("'"):
-                                keyword_pattern = keyword_pattern[1:-1]  
-                            elif keyword_pattern.startswith('"') and keyword_pattern.endswith('"'):
-                                keyword_pattern = keyword_pattern[1:-1]  
-                            
-                            keyword_matches = re.finditer(keyword_pattern, page_text, re.IGNORECASE)
-                        else:
-                            # Use exact match for other keywords
-                            keyword_matches = re.finditer(re.escape(search_term), page_text, re.IGNORECASE)
-                        
-                        for keyword_match in keyword_matches:
+                        # keyword_pattern if provided (quotes stripped), otherwise an exact match of the search term
+                        for keyword_match in keyword_regex_compiled.finditer(page_text):
+                            matched = True
                             keyword_start = keyword_match.start()
                             keyword_end = keyword_match.end()
                             
@@ -440,6 +793,7 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                                 
                                 money_entry = {
                                     'amount': money_amount,
+                                    'amount_cents': parse_amount_cents(money_amount),
                                     'keyword': original_keyword,
                                     'name': display_name,
                                     'ukey': final_ukey,
@@ -453,7 +807,7 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                                     'parent_keyword': parent_keyword,
                                     'keyword_position': keyword_start,
                                     'matched_text': keyword_match.group(),  # Add the actual matched text
-                                    'used_pattern': keyword_pattern if keyword_pattern else 'exact_match',  # Track which pattern was used
+                                    'used_pattern': strip_pattern_quotes(keyword_pattern) if keyword_pattern else 'exact_match',  # Track which pattern was used
                                     'installment': installment_info,  # Add installment field
                                     'expiration': expiration_info,  # Add expiration field
                                     'date_range': date_range_info,  # Add date range field
@@ -468,10 +822,22 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                                 if not allow_multiple:
                                     break
                         
+                        counters[0] += 1
+                        if matched:
+                            counters[1] += 1
+                        counters[2] += len(found_amounts) - amounts_before
+                        counters[3] += perf_counter() - scan_started
+                        
             except Exception as e:
-                print(f"Error processing page {page_num + 1} for contact {contact_name}: {str(e)}")
+                logger.warning("Error processing page %s for contact %s: %s", page_num + 1, contact_name, e)
                 continue
         
+        # Out of time part-way through this contact: drop it, it is redone on resume
+        if deadline is not None:
+            if deadline.hit:
+                break
+            deadline.contacts_processed += 1
+        
         # Organize results with enhanced parent-child validation
         if found_amounts:
             organized_amounts = []
@@ -483,6 +849,7 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                 if not amount['is_sub_key']:
                     parent_entry = {
                         'amount': amount['amount'],
+                        'amount_cents': amount['amount_cents'],
                         'keyword': amount['keyword'],
                         'name': amount['name'],
                         'ukey': amount['ukey'],
@@ -502,6 +869,7 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                     if parent_ukey and parent_ukey in parent_entries:
                         sub_key_entry = {
                             'amount': amount['amount'],
+                            'amount_cents': amount['amount_cents'],
                             'keyword': amount['keyword'],
                             'name': amount['name'],
                             'ukey': amount['ukey'],
@@ -581,15 +949,15 @@ def extract_money_amounts_for_contacts(pdf_document, entries, required_keywords=
                 if parent_entry['sub_keys']:
                     parent_entry['sub_keys'] = sort_sub_keys_by_date_and_category(parent_entry['sub_keys'])
             
-            # Log orphaned sub_keys for debugging
-            if orphaned_sub_keys:
-                print(f"Orphaned sub_keys for contact {contact_name}:")
-                for orphan in orphaned_sub_keys:
-                    print(f"  - {orphan['reason']}")
+            # Log orphaned sub_keys for debugging (the reasons are only joined when DEBUG is enabled)
+            if orphaned_sub_keys and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Orphaned sub_keys for contact %s: %s", contact_name,
+                             "; ".join(orphan['reason'] for orphan in orphaned_sub_keys))
             
             contact_results['money_amounts'] = organized_amounts
             results.append(contact_results)
     
+    keyword_stats.record(provider, rule_counters)
     return results
 
 def extract_money_from_bill_summary(bill_summary_data, provider="verizon"):
@@ -728,6 +1096,7 @@ def extract_money_from_bill_summary(bill_summary_data, provider="verizon"):
                     'name': display_name,
                     'ukey': ukey,
                     'amount': extracted_value,
+                    'amount_cents': None if is_billing_detail else parse_amount_cents(extracted_value),
                     'is_child': is_child,  # Include isChild field in return value
                     'inline_context': inline_context,
                     'page': bill_summary_data['page_number'],
@@ -767,7 +1136,7 @@ def find_bill_summary_page(pdf_document, pages_to_extract, provider="verizon"):
                 return bill_summary_data
                 
         except Exception as e:
-            print(f"Error searching for 'Bill summary' on page {page_num}: {str(e)}")
+            logger.warning("Error searching for 'Bill summary' on page %s: %s", page_num, e)
             continue
     
     return None
@@ -814,6 +1183,7 @@ def find_account_level_charges_page(pdf_document, pages_to_extract, provider="ve
                         
                         late_fee_entry = {
                             'amount': money_amount,
+                            'amount_cents': parse_amount_cents(money_amount),
                             'sentence': late_fee_sentence,
                             'ukey': 'late_fee',
                             'inline_context': cleaned_context,
@@ -837,7 +1207,7 @@ def find_account_level_charges_page(pdf_document, pages_to_extract, provider="ve
                 return account_charges_data
                 
         except Exception as e:
-            print(f"Error searching for 'Account Level Charges Details' on page {page_num}: {str(e)}")
+            logger.warning("Error searching for 'Account Level Charges Details' on page %s: %s", page_num, e)
             continue
     
     return ""
@@ -969,6 +1339,7 @@ def find_previous_balance_page(pdf_document, pages_to_extract, provider="verizon
                             
                             balance_entry = {
                                 'amount': money_amount,
+                                'amount_cents': parse_amount_cents(money_amount),
                                 'date': closest_date,
                                 'contact': closest_contact,
                                 'sentence': keyword,
@@ -994,6 +1365,7 @@ def find_previous_balance_page(pdf_document, pages_to_extract, provider="verizon
                                 if no_payment_match:
                                     balance_entry = {
                                         'amount': '$0.00',
+                                        'amount_cents': 0,
                                         'date': '',
                                         'contact': '',
                                         'sentence': keyword,
@@ -1011,19 +1383,493 @@ def find_previous_balance_page(pdf_document, pages_to_extract, provider="verizon
                 return previous_balance_data
                 
         except Exception as e:
-            print(f"Error searching for 'Previous Balance' on page {page_num}: {str(e)}")
+            logger.warning("Error searching for 'Previous Balance' on page %s: %s", page_num, e)
             continue
     
     return ""
 
+def detect_contacts(pdf_document, pages_to_extract, provider="verizon", deadline=None):
+    """Find phone numbers followed by a contact name within the specified page range.
+       With a deadline, stops between pages once it expires (see deadline.pages_processed)."""
+    entries = []
+    phone_pattern = r'\d{3}-\d{3}-\d{4}'
+    name_pattern = r'[A-Z][a-z]+\s+[A-Z][a-z]+'
+    exclude_keywords = load_exclude_keywords(provider)
+    
+    for page_num in pages_to_extract:
+        if deadline is not None:
+            if deadline.expired():
+                break
+            deadline.pages_processed += 1
+        try:
+            page = pdf_document.load_page(page_num - 1)
+            page_text = page.get_text()
+            
+            matches = re.finditer(phone_pattern, page_text)
+            for match in matches:
+                phone_number = match.group()
+                cleaned_phone = re.sub(r'\D', '', phone_number)
+                if len(cleaned_phone) == 10:
+                    start_pos = match.end()
+                    remaining_text = page_text[start_pos:]
+                    text_to_search = remaining_text[:100]
+                    
+                    has_exclude_keyword = any(keyword.lower() in text_to_search.lower() for keyword in exclude_keywords)
+                    
+                    if not has_exclude_keyword:
+                        name_match = re.search(name_pattern, text_to_search)
+                        
+                        if name_match:
+                            full_name = name_match.group()
+                            full_name = re.sub(r'\s+', ' ', re.sub(r'\n+', ' ', full_name)).strip()
+                            entries.append({
+                                "phone": phone_number,
+                                "text": full_name
+                            })
+            
+        except Exception as e:
+            logger.warning("Error extracting page %s: %s", page_num, e)
+            continue
+    
+    return entries
+
+def merge_contact_entries(entries, money_results):
+    """Merge detected contacts with the money amounts found for them."""
+    money_lookup = {result['phone']: result for result in money_results}
+    
+    merged_entries = []
+    for entry in entries:
+        phone = entry['phone']
+        name = entry['text']
+        merged_entry = {
+            "phone": phone,
+            "name": name,
+            "money_amounts": []
+        }
+        
+        if phone in money_lookup:
+            merged_entry["money_amounts"] = money_lookup[phone]["money_amounts"]
+        
+        merged_entries.append(merged_entry)
+    
+    return merged_entries
+
+def build_keywords_used(required_keywords, entries, provider="verizon"):
+    """Describe the keywords used for extraction. Returns (all keywords, configured keywords only)."""
+    base_keywords = required_keywords if required_keywords else load_required_keywords(provider)
+    all_keywords_used = []
+    
+    for kw in base_keywords:
+        if isinstance(kw, dict):
+            all_keywords_used.append(f"{kw.get('keyword', '')} (ukey: {kw.get('ukey', '')})")
+        else:
+            all_keywords_used.append(kw)
+    
+    # Compact view only lists the configured keywords, not the per-contact search terms
+    base_keywords_used = list(all_keywords_used)
+    
+    for entry in entries:
+        name = entry['text']
+        phone = entry['phone']
+        all_keywords_used.extend([
+            f"{name} (contact_name)",
+            f"{phone} (contact_phone)",
+            f"{name} {phone} (combined)"
+        ])
+    
+    return all_keywords_used, base_keywords_used
+
+def build_summary(bill_summary_data, account_charges_data, previous_balance_data):
+    """Build the summary object from the bill summary, account level charges and previous balance sections."""
+    summary = {
+        "invoice": None,
+        "account": None,
+        "billing_period": None,
+        "due_date": None,
+        "total_charges": None,
+        "total_charges_cents": None,
+        "money_amounts": [],
+        "late_fees": [],
+        "previous_balance": []
+    }
+    
+    if bill_summary_data and bill_summary_data.get("money_amounts"):
+        money_amounts_array = bill_summary_data["money_amounts"]
+        filtered_money_amounts = []
+        billing_detail_ukeys = ['invoice', 'account', 'billing_period', 'due_date', 'total_charges']
+        
+        for item in money_amounts_array:
+            ukey = item.get('ukey', '')
+            amount = item.get('amount', '')
+            
+            if ukey == 'invoice':
+                summary["invoice"] = amount
+            elif ukey == 'account':
+                summary["account"] = amount
+            elif ukey == 'billing_period':
+                summary["billing_period"] = amount
+            elif ukey == 'due_date':
+                summary["due_date"] = amount
+            elif ukey == 'total_charges':
+                summary["total_charges"] = amount
+                summary["total_charges_cents"] = item.get('amount_cents')
+            else:
+                if ukey not in billing_detail_ukeys:
+                    filtered_money_amounts.append(item)
+        
+        summary["money_amounts"] = filtered_money_amounts
+    
+    # Add late_fees to summary
+    if account_charges_data and isinstance(account_charges_data, dict) and account_charges_data.get("late_fees"):
+        summary["late_fees"] = account_charges_data["late_fees"]
+    
+    # Add previous_balance to summary
+    if previous_balance_data and isinstance(previous_balance_data, dict) and previous_balance_data.get("previous_balance_amounts"):
+        summary["previous_balance"] = previous_balance_data["previous_balance_amounts"]
+    
+    return summary
+
+def add_summary_stages(pipeline):
+    """Add the bill summary, account level charges and previous balance extractors to a pipeline.
+       The three only read the document and run concurrently; "summary" combines their results."""
+    section_inputs = ("document", "pages_to_extract", "provider")
+    pipeline.stage("bill_summary", find_bill_summary_page, inputs=section_inputs)
+    pipeline.stage("account_charges", find_account_level_charges_page, inputs=section_inputs)
+    pipeline.stage("previous_balance", find_previous_balance_page, inputs=section_inputs)
+    pipeline.stage("summary", build_summary, inputs=("bill_summary", "account_charges", "previous_balance"))
+
+def run_pipeline(pipeline, pdf_document, pages_to_extract, provider, concurrent=True):
+    """Run an extraction pipeline over a document and record its stage timings.
+       Stages only run concurrently on documents that can be read from several threads."""
+    run = pipeline.run({
+        "document": pdf_document,
+        "pages_to_extract": pages_to_extract,
+        "provider": provider
+    }, concurrent=concurrent and getattr(pdf_document, "thread_safe", False))
+    pipeline_stats.record(run)
+    logger.debug("Pipeline %s finished in %sms", pipeline.name, round(run.wall_seconds * 1000, 3),
+                  extra={"pipeline_timings": run.timing_report()})
+    return run
+
+def run_summary_extraction(pdf_document, pages_to_extract, provider="verizon", concurrent=True):
+    """Run only the bill summary, account level charges and previous balance extractors (mode=summary)."""
+    pipeline = Pipeline("summary")
+    add_summary_stages(pipeline)
+    return run_pipeline(pipeline, pdf_document, pages_to_extract, provider, concurrent).results["summary"]
+
+def run_bill_extraction(pdf_document, pages_to_extract, required_keywords=None, provider="verizon",
+                        deadline=None, resume_state=None, concurrent=True):
+    """Run every extractor over the document and assemble entries, summary and totals.
+       Works on a fitz document or a PageTextDocument built from stored page text.
+       The summary extractors and contact detection are independent and run concurrently on a
+       PageTextDocument (concurrent=False runs every stage in the calling thread).
+       When the deadline expires the result is marked partial and carries resume_state;
+       passing that back as resume_state continues where the previous run stopped."""
+    if resume_state is None:
+        state = {
+            "summary": None,
+            "contacts": [],
+            "pages_done": 0,
+            "money_results": [],
+            "contacts_done": 0
+        }
+    else:
+        state = copy.deepcopy(resume_state)
+    deadline = deadline or ExtractionDeadline()
+    
+    # Contact detection, then money amounts per contact; each resumes from its own offset
+    remaining_pages = pages_to_extract[state["pages_done"]:]
+    
+    def contacts_stage(document):
+        if remaining_pages:
+            state["contacts"].extend(detect_contacts(document, remaining_pages, provider, deadline))
+            state["pages_done"] += deadline.pages_processed
+        return state["contacts"]
+    
+    def money_stage(document, contacts):
+        if state["pages_done"] >= len(pages_to_extract):
+            remaining_contacts = contacts[state["contacts_done"]:]
+            state["money_results"].extend(extract_money_amounts_for_contacts(
+                document, remaining_contacts, required_keywords, provider, pages_to_extract, deadline))
+            state["contacts_done"] += deadline.contacts_processed
+        return state["money_results"]
+    
+    pipeline = Pipeline("extraction")
+    if state["summary"] is None:
+        add_summary_stages(pipeline)
+    pipeline.stage("contacts", contacts_stage, inputs=("document",))
+    pipeline.stage("money", money_stage, inputs=("document", "contacts"))
+    run = run_pipeline(pipeline, pdf_document, pages_to_extract, provider, concurrent)
+    if "summary" in pipeline:
+        state["summary"] = run.results["summary"]
+    
+    entries = state["contacts"]
+    summary = state["summary"]
+    partial = state["pages_done"] < len(pages_to_extract) or state["contacts_done"] < len(entries)
+    
+    # A partial result only lists the contacts whose charges were fully scanned
+    merged_entries = merge_contact_entries(entries[:state["contacts_done"]], state["money_results"])
+    
+    all_keywords_used, base_keywords_used = build_keywords_used(required_keywords, entries, provider)
+    contacts_with_money = len([entry for entry in merged_entries if entry['money_amounts']])
+    
+    extraction = {
+        "contacts": entries,
+        "entries": merged_entries,
+        "summary": summary,
+        # Precomputed totals so clients don't re-parse amount strings
+        "totals": build_bill_totals(merged_entries, summary),
+        "keywords_used": all_keywords_used,
+        "base_keywords_used": base_keywords_used,
+        "contacts_with_money": contacts_with_money,
+        "stage_timings": run.timing_report()
+    }
+    if partial:
+        extraction.update({
+            "partial": True,
+            "pages_processed": state["pages_done"],
+            "contacts_processed": state["contacts_done"],
+            "resume_state": state
+        })
+    return extraction
+
+def build_record_data(extraction, pdf_filename, total_pages, provider="verizon"):
+    """Build the JSON document stored in billing_records for an extraction result."""
+    return {
+        "entries": extraction["entries"],
+        "summary": extraction["summary"],
+        "totals": extraction["totals"],
+        "pdf_filename": pdf_filename,
+        "total_pages": total_pages,
+        "provider": provider,
+        "keywords_used": extraction["keywords_used"],
+        "extraction_date": datetime.datetime.now().isoformat(),
+        "contacts_found": len(extraction["contacts"]),
+        "contacts_with_money": extraction["contacts_with_money"]
+    }
+
+def server_timing(extraction):
+    """Server-Timing header value with the duration of each extraction stage and the whole pipeline"""
+    timings = extraction.get("stage_timings") or {}
+    metrics = [f"{name};dur={timing['duration_ms']}" for name, timing in timings.get("stages", {}).items()]
+    if timings:
+        metrics.append(f"pipeline;dur={timings['wall_ms']}")
+    return ", ".join(metrics)
+
+def is_supported_document(pdf_document):
+    """Check the first pages of a document for Verizon branding (the only supported provider for now)."""
+    verizon_keywords = ["verizon.com/business", "verizon"]
+    document_valid = False
+    
+    # Check first 3 pages for Verizon keywords (bills usually have branding on first few pages)
+    pages_to_check = min(3, len(pdf_document))
+    
+    for page_num in range(pages_to_check):
+        try:
+            page = pdf_document.load_page(page_num)
+            page_text = page.get_text().lower()
+            
+            # Check for any of the Verizon keywords
+            if any(keyword.lower() in page_text for keyword in verizon_keywords):
+                document_valid = True
+                logger.debug("Found Verizon keyword on page %s", page_num + 1)
+                break
+                
+        except Exception as e:
+            logger.warning("Error validating page %s: %s", page_num + 1, e)
+            continue
+    
+    logger.debug("Document validation result: %s", document_valid)
+    return document_valid
+
+def finish_extraction(extraction, context, compact_view=False, save_to_db=False, store_page_text=True):
+    """Build the /extract-text response body for an extraction and save it to the database when requested.
+       context describes the document (pdf_filename, total_pages, provider, page_range, file_hash, document,
+       pages_to_extract, required_keywords). Partial extractions are not saved; they get a resume token."""
+    entries = extraction["contacts"]
+    merged_entries = extraction["entries"]
+    summary = extraction["summary"]
+    totals = extraction["totals"]
+    contacts_with_money = extraction["contacts_with_money"]
+    pdf_filename = context["pdf_filename"]
+    total_pages = context["total_pages"]
+    provider = context["provider"]
+    
+    # Prepare response data
+    if compact_view:
+        response_data = {
+            "success": True,
+            "message": f"Found {len(entries)} contact(s) with {contacts_with_money} having money amounts",
+            "entries": [
+                {**entry, "money_amounts": compact_money_amounts(entry["money_amounts"])}
+                for entry in merged_entries
+            ],
+            "keywords_used": extraction["base_keywords_used"],
+            "summary": summary,
+            "totals": totals,
+            "pdf_filename": pdf_filename,
+            "total_pages": total_pages,
+            "provider": provider,
+            "view": "compact"
+        }
+    else:
+        response_data = {
+            "success": True,
+            "message": f"Found {len(entries)} contact(s) with {contacts_with_money} having money amounts",
+            "text": json.dumps(merged_entries, indent=2),
+            "entries": merged_entries,
+            "keywords_used": extraction["keywords_used"],
+            "summary": summary,
+            "totals": totals,
+            "pdf_filename": pdf_filename,
+            "total_pages": total_pages,
+            "provider": provider
+        }
+    
+    # Out of time: return what was extracted plus a token to continue from the cached page text
+    if extraction.get("partial"):
+        response_data.update({
+            "partial": True,
+            "pages_processed": extraction["pages_processed"],
+            "contacts_processed": extraction["contacts_processed"],
+            "resume": resume_cache.put({**context, "resume_state": extraction["resume_state"]})
+        })
+        response_data["message"] += " | Partial result: extraction deadline reached"
+        if save_to_db:
+            response_data["message"] += " | Not saved: resume the extraction to save it"
+        return response_data
+    
+    # Save to database if requested and account number is available
+    database_result = None
+    if save_to_db and summary.get("account"):
+        try:
+            # Use invoice as invoice_number if present
+            invoice_number = summary.get("invoice")
+            document = context.get("document")
+            
+            if store_page_text and document is not None:
+                db.save_document_text(
+                    context["file_hash"],
+                    compress_page_texts(document.page_texts),
+                    account_number=summary["account"],
+                    invoice_number=invoice_number,
+                    pdf_filename=pdf_filename,
+                    provider=provider,
+                    page_range=context["page_range"],
+                    total_pages=total_pages,
+                    required_keywords=context["required_keywords"]
+                )
+            
+            # Prepare data to save (complete response without success/message)
+            data_to_save = build_record_data(extraction, pdf_filename, total_pages, provider)
+            
+            # Single upsert: an invoice that is already stored is reported as "exists" and left untouched
+            database_result = db.save_billing_data(summary["account"], data_to_save,
+                                                   invoice_number=invoice_number, overwrite=False)
+            
+            if database_result and database_result.get("action") == "exists":
+                response_data["database"] = {
+                    "saved": True,
+                    "action": "exists",
+                    "record_id": database_result.get("id"),
+                    "account_number": summary["account"],
+                    "invoice_number": invoice_number
+                }
+                response_data["message"] += f" | Account {summary['account']} invoice {invoice_number} already exists in database"
+            elif database_result and database_result.get("success"):
+                response_data["database"] = {
+                    "saved": True,
+                    "action": database_result.get("action"),
+                    "record_id": database_result.get("id"),
+                    "account_number": summary["account"],
+                    "invoice_number": invoice_number
+                }
+                response_data["message"] += f" | Data {database_result.get('action')} in database"
+            else:
+                # Save failed -> include error details and do not return DB-only object
+                response_data["database"] = {
+                    "saved": False,
+                    "error": database_result.get("error") if database_result else "Unknown error"
+                }
+                response_data["message"] += " | Failed to save to database"
+        
+        except Exception as db_error:
+            logger.exception("Database save error: %s", db_error)
+            response_data["database"] = {
+                "saved": False,
+                "error": str(db_error)
+            }
+            response_data["message"] += " | Database save failed"
+    elif save_to_db and not summary.get("account"):
+        response_data["database"] = {
+            "saved": False,
+            "error": "No account number found in bill summary"
+        }
+        response_data["message"] += " | Cannot save: No account number found"
+    
+    # If a DB save succeeded or invoice existed, return only the database object
+    db_info = response_data.get("database", {})
+    if db_info.get("saved") is True:
+        return {
+            "saved": True,
+            "action": db_info.get("action"),
+            "record_id": db_info.get("record_id"),
+            "account_number": db_info.get("account_number"),
+            "invoice_number": db_info.get("invoice_number")
+        }
+    # Otherwise return the original full response
+    return response_data
+
+def parse_deadline_seconds(value):
+    """Parse the optional per-request deadline (seconds). Raises ValueError for anything but a positive number."""
+    if value is None or str(value).strip() == "":
+        return None
+    seconds = float(value)
+    if seconds <= 0:
+        raise ValueError("deadline must be a positive number of seconds")
+    return seconds
+
 @blp.route("/extract-text")
 class PDFTextExtractionView(MethodView):
     
     @blp.response(200, PDFTextExtractionSchema)
     def post(self):
         """Extract text from uploaded PDF file using PyMuPDF with optional page range and find text after phone numbers"""
+        # profile=1 (admin only) runs the request under cProfile and stores a hotspot report
+        if request.args.get('profile', request.form.get('profile')) == '1':
+            if not is_admin_request():
+                return jsonify({
+                    "success": False,
+                    "message": "profile=1 requires a valid X-Admin-Token header"
+                }), 403
+            return profile_request(self.extract, profile_store)
+        return self.extract()
+    
+    def extract(self):
+        """Handle an extraction request (see post). Every fitz document opened for it is closed
+           when it returns, whichever way it returns."""
+        with DocumentScope() as documents:
+            return self.run_extraction(documents)
+    
+    def run_extraction(self, documents):
+        """Body of extract; fitz documents are opened through documents"""
         try:
-            if 'file' not in request.files:
+            # documentId refers to a document kept by POST /documents (or keepDocument=true) instead of an upload
+            document_id = request.form.get('documentId', request.args.get('documentId', ''))
+            keep_document = request.form.get('keepDocument', 'false').lower() == 'true'
+            session = None
+            if document_id:
+                session = document_sessions.get(document_id)
+                if session is None:
+                    return jsonify({
+                        "success": False,
+                        "message": "Unknown or expired documentId",
+                        "text": "",
+                        "entries": [],
+                        "pdf_filename": "",
+                        "total_pages": 0
+                    }), 404
+            elif 'file' not in request.files:
                 return jsonify({
                     "success": False,
                     "message": "No file provided",
@@ -1033,31 +1879,52 @@ class PDFTextExtractionView(MethodView):
                     "total_pages": 0
                 }), 400
             
-            file = request.files['file']
             page_range_str = request.form.get('pageRange', '')
             keywords_str = request.form.get('keywords', '')
             provider = request.form.get('provider', 'verizon')  # Default to verizon
             save_to_db = request.form.get('saveToDatabase', 'false').lower() == 'true'  # New parameter
+            # view=compact drops the duplicated text/keyword/context fields from the response
+            view = request.form.get('view', request.args.get('view', 'full')).lower()
+            compact_view = view == 'compact'
+            # mode=summary skips contact detection and per-line charges
+            extraction_mode = request.form.get('mode', request.args.get('mode', 'full')).lower()
+            # Keep compressed page text of saved bills so they can be reprocessed when keywords.json changes
+            store_page_text = request.form.get('storePageText', os.getenv('STORE_PAGE_TEXT', 'true')).lower() == 'true'
             
-            if file.filename == '':
+            try:
+                deadline_seconds = parse_deadline_seconds(request.form.get('deadline', request.args.get('deadline')))
+            except ValueError:
                 return jsonify({
                     "success": False,
-                    "message": "No file selected",
+                    "message": "deadline must be a positive number of seconds",
                     "text": "",
                     "entries": [],
                     "pdf_filename": "",
                     "total_pages": 0
                 }), 400
             
-            if not file.filename.lower().endswith('.pdf'):
-                return jsonify({
-                    "success": False,
-                    "message": "File must be a PDF",
-                    "text": "",
-                    "entries": [],
-                    "pdf_filename": file.filename or "",
-                    "total_pages": 0
-                }), 400
+            if session is None:
+                file = request.files['file']
+                
+                if file.filename == '':
+                    return jsonify({
+                        "success": False,
+                        "message": "No file selected",
+                        "text": "",
+                        "entries": [],
+                        "pdf_filename": "",
+                        "total_pages": 0
+                    }), 400
+                
+                if not file.filename.lower().endswith('.pdf'):
+                    return jsonify({
+                        "success": False,
+                        "message": "File must be a PDF",
+                        "text": "",
+                        "entries": [],
+                        "pdf_filename": file.filename or "",
+                        "total_pages": 0
+                    }), 400
             
             # Parse keywords if provided
             required_keywords = None
@@ -1070,306 +1937,360 @@ class PDFTextExtractionView(MethodView):
                         "ukey": kw.lower().replace(" ", "_")
                     })
             
-            file_content = file.read()
-            pdf_document = fitz.open(stream=file_content, filetype="pdf")
-            total_pages = len(pdf_document)
-            
-            # Validate document contains Verizon keywords
-            verizon_keywords = ["verizon.com/business", "verizon"]
-            document_valid = False
-            
-            # Check first 3 pages for Verizon keywords (bills usually have branding on first few pages)
-            pages_to_check = min(3, total_pages)
-            
-            for page_num in range(pages_to_check):
-                try:
-                    page = pdf_document.load_page(page_num)
-                    page_text = page.get_text().lower();
-                    
-                    # Check for any of the Verizon keywords
-                    if any(keyword.lower() in page_text for keyword in verizon_keywords):
-                        document_valid = True
-                        print(f"Found Verizon keyword on page {page_num + 1}")
-                        break
-                        
-                except Exception as e:
-                    print(f"Error validating page {page_num + 1}: {str(e)}")
-                    continue
-            
-            print(f"Document validation result: {document_valid}")
-            
-            if not document_valid:
-                pdf_document.close()
-                return jsonify({
-                    "success": False,
-                    "message": "Invalid document: This application supports Verizon bills for now. Other carriers will be added soon.",
-                    "text": "",
-                    "isInvalidDocument": True,
-                    "entries": [],
-                    "pdf_filename": file.filename or "",
-                    "total_pages": total_pages
-                }), 400
+            if session is not None:
+                # Validated and read when the session was created; every extractor runs over its page text
+                pdf_filename = session.pdf_filename
+                file_hash = session.file_hash
+                pdf_document = PageTextDocument(session.page_texts)
+                total_pages = len(pdf_document)
+            else:
+                file_content = file.read()
+                pdf_filename = file.filename or ""
+                file_hash = content_hash(file_content)
+                # PyMuPDF is imported on first use (normally already loaded by warm_up)
+                pdf_document = documents.open(stream=file_content, filetype="pdf")
+                total_pages = len(pdf_document)
+                
+                if not is_supported_document(pdf_document):
+                    return jsonify({
+                        "success": False,
+                        "message": "Invalid document: This application supports Verizon bills for now. Other carriers will be added soon.",
+                        "text": "",
+                        "isInvalidDocument": True,
+                        "entries": [],
+                        "pdf_filename": pdf_filename,
+                        "total_pages": total_pages
+                    }), 400
+                
+                # keepDocument=true: keep this upload as a session so follow-up calls can send its id
+                if keep_document:
+                    session = document_sessions.create(file_content, pdf_document, pdf_filename)
+                    if session is not None:
+                        # The session now owns the fitz document
+                        documents.release(pdf_document)
+                        pdf_document = PageTextDocument(session.page_texts)
             
             pages_to_extract = parse_page_range(page_range_str, total_pages)
             
             if not pages_to_extract:
-                pdf_document.close()
                 return jsonify({
                     "success": False,
                     "message": "No valid pages found in the specified range",
                     "text": "",
                     "entries": [],
-                    "pdf_filename": file.filename or "",
+                    "pdf_filename": pdf_filename,
                     "total_pages": total_pages
                 }), 400
             
-            bill_summary_data = find_bill_summary_page(pdf_document, pages_to_extract, provider)
-            account_charges_data = find_account_level_charges_page(pdf_document, pages_to_extract, provider)
-            previous_balance_data = find_previous_balance_page(pdf_document, pages_to_extract, provider)
-            
-            # Extract phone numbers and names
-            entries = []
-            phone_pattern = r'\d{3}-\d{3}-\d{4}'
-            name_pattern = r'[A-Z][a-z]+\s+[A-Z][a-z]+'
-            exclude_keywords = load_exclude_keywords(provider)
-            
-            for page_num in pages_to_extract:
+            # mode=summary: only invoice/account/totals, reading just the pages those extractors touch
+            if extraction_mode == 'summary':
+                document = LazyPageTextDocument(pdf_document)
                 try:
-                    page = pdf_document.load_page(page_num - 1)
-                    page_text = page.get_text()
-                    
-                    matches = re.finditer(phone_pattern, page_text)
-                    for match in matches:
-                        phone_number = match.group()
-                        cleaned_phone = re.sub(r'\D', '', phone_number)
-                        if len(cleaned_phone) == 10:
-                            start_pos = match.end()
-                            remaining_text = page_text[start_pos:]
-                            text_to_search = remaining_text[:100]
-                            
-                            has_exclude_keyword = any(keyword.lower() in text_to_search.lower() for keyword in exclude_keywords)
-                            
-                            if not has_exclude_keyword:
-                                name_match = re.search(name_pattern, text_to_search)
-                                
-                                if name_match:
-                                    full_name = name_match.group()
-                                    full_name = re.sub(r'\s+', ' ', re.sub(r'\n+', ' ', full_name)).strip()
-                                    entries.append({
-                                        "phone": phone_number,
-                                        "text": full_name
-                                    })
-                    
-                except Exception as e:
-                    print(f"Error extracting page {page_num}: {str(e)}")
-                    continue
-            
-            money_results = extract_money_amounts_for_contacts(pdf_document, entries, required_keywords, provider)
-            pdf_document.close()
-            
-            # Merge entries with money analysis
-            money_lookup = {result['phone']: result for result in money_results}
-            
-            merged_entries = []
-            for entry in entries:
-                phone = entry['phone']
-                name = entry['text']
-                merged_entry = {
-                    "phone": phone,
-                    "name": name,
-                    "money_amounts": []
-                }
-                
-                if phone in money_lookup:
-                    merged_entry["money_amounts"] = money_lookup[phone]["money_amounts"]
+                    # Takes page budget like a full extraction, weighted by the pages it may read
+                    with admission.acquire(len(pages_to_extract)):
+                        summary = run_summary_extraction(document, pages_to_extract, provider)
+                except AdmissionRejected as rejected:
+                    response = jsonify({
+                        "success": False,
+                        "message": rejected.reason,
+                        "text": "",
+                        "entries": [],
+                        "pdf_filename": pdf_filename,
+                        "total_pages": total_pages
+                    })
+                    response.headers["Retry-After"] = str(rejected.retry_after)
+                    return response, 503
+                finally:
+                    document.close()
                 
-                merged_entries.append(merged_entry)
+                message = "Extracted bill summary"
+                if save_to_db:
+                    message += " | Not saved: saveToDatabase requires a full extraction"
+                response_body = {
+                    "success": True,
+                    "message": message,
+                    "entries": [],
+                    "summary": summary,
+                    "totals": build_bill_totals([], summary),
+                    "pdf_filename": pdf_filename,
+                    "total_pages": total_pages,
+                    "provider": provider,
+                    "mode": "summary"
+                }
+                if session is not None:
+                    response_body["document_id"] = session.document_id
+                return jsonify(response_body), 200
             
-            stringified_entries = json.dumps(merged_entries, indent=2)
+            # Identical concurrent uploads (same file and extraction parameters) share one extraction.
+            # Only the request that actually extracts takes page budget from the admission controller.
+            extracted = {}
             
-            # Keywords used
-            base_keywords = required_keywords if required_keywords else load_required_keywords(provider)
-            all_keywords_used = []
+            def extract():
+                with admission.acquire(total_pages):
+                    # Read each requested page's text once; every extractor then runs over the cached text
+                    extracted["document"] = PageTextDocument(extract_page_texts(pdf_document, pages_to_extract))
+                    # cProfile only sees the calling thread, so profiled requests run every stage in it
+                    return run_bill_extraction(extracted["document"], pages_to_extract, required_keywords, provider,
+                                               deadline=ExtractionDeadline.for_request(deadline_seconds),
+                                               concurrent=not g.get("profiling"))
             
-            for kw in base_keywords:
-                if isinstance(kw, dict):
-                    all_keywords_used.append(f"{kw.get('keyword', '')} (ukey: {kw.get('ukey', '')})")
+            try:
+                if g.get("profiling"):
+                    # A profile has to measure this request's own extraction, never a shared one
+                    extraction, coalesced = extract(), False
                 else:
-                    all_keywords_used.append(kw)
-            
-            for entry in entries:
-                name = entry['text']
-                phone = entry['phone']
-                all_keywords_used.extend([
-                    f"{name} (contact_name)",
-                    f"{phone} (contact_phone)",
-                    f"{name} {phone} (combined)"
-                ])
-            
-            contacts_with_money = len([entry for entry in merged_entries if entry['money_amounts']])
-            
-            # Build summary object
-            summary = {
-                "invoice": None,
-                "account": None,
-                "billing_period": None,
-                "due_date": None,
-                "total_charges": None,
-                "money_amounts": [],
-                "late_fees": [],
-                "previous_balance": []
-            }
-            
-            if bill_summary_data and bill_summary_data.get("money_amounts"):
-                money_amounts_array = bill_summary_data["money_amounts"]
-                filtered_money_amounts = []
-                billing_detail_ukeys = ['invoice', 'account', 'billing_period', 'due_date', 'total_charges']
-                
-                for item in money_amounts_array:
-                    ukey = item.get('ukey', '')
-                    amount = item.get('amount', '')
-                    
-                    if ukey == 'invoice':
-                        summary["invoice"] = amount
-                    elif ukey == 'account':
-                        summary["account"] = amount
-                    elif ukey == 'billing_period':
-                        summary["billing_period"] = amount
-                    elif ukey == 'due_date':
-                        summary["due_date"] = amount
-                    elif ukey == 'total_charges':
-                        summary["total_charges"] = amount
-                    else:
-                        if ukey not in billing_detail_ukeys:
-                            filtered_money_amounts.append(item)
-                
-                summary["money_amounts"] = filtered_money_amounts
+                    # A partial result was cut short by this request's deadline; other requests extract on their own
+                    extraction, coalesced = single_flight.do(
+                        extraction_flight_key(file_hash, provider, pages_to_extract, required_keywords), extract,
+                        shareable=lambda result: not result.get("partial"))
+            except AdmissionRejected as rejected:
+                response = jsonify({
+                    "success": False,
+                    "message": rejected.reason,
+                    "text": "",
+                    "entries": [],
+                    "pdf_filename": pdf_filename,
+                    "total_pages": total_pages
+                })
+                response.headers["Retry-After"] = str(rejected.retry_after)
+                return response, 503
             
-            # Add late_fees to summary
-            if account_charges_data and isinstance(account_charges_data, dict) and account_charges_data.get("late_fees"):
-                summary["late_fees"] = account_charges_data["late_fees"]
+            # Profiled requests also report the cost of each keyword's regex over the extracted pages
+            if g.get("profiling") and extracted.get("document") is not None:
+                g.profile_keyword_scan = (
+                    [extracted["document"].page_texts[page - 1] for page in pages_to_extract],
+                    [(keyword["ukey"], keyword["search_term"], keyword_regex(keyword))
+                     for keyword in build_search_keywords(required_keywords or load_required_keywords(provider))]
+                )
             
-            # Add previous_balance to summary
-            if previous_balance_data and isinstance(previous_balance_data, dict) and previous_balance_data.get("previous_balance_amounts"):
-                summary["previous_balance"] = previous_balance_data["previous_balance_amounts"]
+            # A request that reused another's result still needs page text if it is the one storing
+            # it, or to resume a partial result
+            document = extracted.get("document")
+            if document is None and (extraction.get("partial") or
+                                     (save_to_db and store_page_text and not db.has_document_text(file_hash))):
+                document = PageTextDocument(extract_page_texts(pdf_document, pages_to_extract))
+            # Page text is all that's needed from here on
+            documents.close()
             
-            # Prepare response data
-            response_data = {
-                "success": True,
-                "message": f"Found {len(entries)} contact(s) with {contacts_with_money} having money amounts",
-                "text": stringified_entries,
-                "entries": merged_entries,
-                "keywords_used": all_keywords_used,
-                "summary": summary,
-                "pdf_filename": file.filename or "",
+            context = {
+                "pdf_filename": pdf_filename,
                 "total_pages": total_pages,
-                "provider": provider
+                "provider": provider,
+                "page_range": page_range_str,
+                "file_hash": file_hash,
+                "document": document,
+                "pages_to_extract": pages_to_extract,
+                "required_keywords": required_keywords
             }
-            
-            # Save to database if requested and account number is available
-            database_result = None
-            if save_to_db and summary.get("account"):
-                try:
-                    # Use invoice as invoice_number if present
-                    invoice_number = summary.get("invoice")
-                    
-                    # Get existing records for account (may include multiple invoices)
-                    existing_records = db.get_billing_data(summary["account"])
-                    
-                    # Determine if invoice already exists
-                    existing_match = None
-                    if invoice_number:
-                        for rec in existing_records:
-                            if rec.get("invoice_number") and str(rec.get("invoice_number")) == str(invoice_number):
-                                existing_match = rec
-                                break
-                    
-                    if existing_match:
-                        # Invoice already exists -> report exists
-                        response_data["database"] = {
-                            "saved": True,
-                            "action": "exists",
-                            "record_id": existing_match.get("id"),
-                            "account_number": summary["account"],
-                            "invoice_number": existing_match.get("invoice_number")
-                        }
-                        response_data["message"] += f" | Account {summary['account']} invoice {existing_match.get('invoice_number')} already exists in database"
-                    else:
-                        # Prepare data to save (complete response without success/message)
-                        data_to_save = {
-                            "entries": merged_entries,
-                            "summary": summary,
-                            "pdf_filename": file.filename or "",
-                            "total_pages": total_pages,
-                            "provider": provider,
-                            "keywords_used": all_keywords_used,
-                            "extraction_date": datetime.datetime.now().isoformat(),
-                            "contacts_found": len(entries),
-                            "contacts_with_money": contacts_with_money
-                        }
-                        
-                        database_result = db.save_billing_data(summary["account"], data_to_save, invoice_number=invoice_number)
-                        
-                        if database_result and database_result.get("success"):
-                            response_data["database"] = {
-                                "saved": True,
-                                "action": database_result.get("action"),
-                                "record_id": database_result.get("id"),
-                                "account_number": summary["account"],
-                                "invoice_number": invoice_number
-                            }
-                            response_data["message"] += f" | Data {database_result.get('action')} in database"
-                        else:
-                            # Save failed -> include error details and do not return DB-only object
-                            response_data["database"] = {
-                                "saved": False,
-                                "error": database_result.get("error") if database_result else "Unknown error"
-                            }
-                            response_data["message"] += " | Failed to save to database"
-                
-                except Exception as db_error:
-                    print(f"Database save error: {str(db_error)}")
-                    response_data["database"] = {
-                        "saved": False,
-                        "error": str(db_error)
-                    }
-                    response_data["message"] += " | Database save failed"
-            elif save_to_db and not summary.get("account"):
-                response_data["database"] = {
-                    "saved": False,
-                    "error": "No account number found in bill summary"
-                }
-                response_data["message"] += " | Cannot save: No account number found"
-            
-            # If a DB save succeeded or invoice existed, return only the database object
-            db_info = response_data.get("database", {})
-            if db_info.get("saved") is True:
-                only_db_response = {
-                    "saved": True,
-                    "action": db_info.get("action"),
-                    "record_id": db_info.get("record_id"),
-                    "account_number": db_info.get("account_number"),
-                    "invoice_number": db_info.get("invoice_number")
-                }
-                return jsonify(only_db_response), 200
-            # Otherwise return the original full response
-            return jsonify(response_data), 200
+            response_body = finish_extraction(extraction, context, compact_view, save_to_db, store_page_text)
+            if session is not None:
+                response_body["document_id"] = session.document_id
+            response = jsonify(response_body)
+            response.headers["X-Single-Flight"] = "shared" if coalesced else "leader"
+            # Added next to the jsonify timing the JSON provider already set
+            response.headers.add("Server-Timing", server_timing(extraction))
+            return response, 200
             
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Error in PDF extraction: {str(e)}")
-            print(f"Traceback: {error_details}")
+            logger.exception("Error in PDF extraction: %s", e)
             
             return jsonify({
                 "success": False,
                 "message": f"Error extracting text: {str(e)}",
                 "text": "",
                 "entries": [],
-                "pdf_filename": getattr(file, 'filename', '') if 'file' in locals() else "",
+                "pdf_filename": pdf_filename if 'pdf_filename' in locals() else "",
                 "total_pages": total_pages if 'total_pages' in locals() else 0
             }), 500
 
+@blp.route("/extract-text/resume")
+class ResumeExtractionView(MethodView):
+    def post(self):
+        """Continue a partial extraction from its resume token, using the cached page text of the document"""
+        try:
+            params = request.get_json(silent=True) or request.form
+            token = params.get('resume', '')
+            
+            try:
+                deadline_seconds = parse_deadline_seconds(params.get('deadline'))
+            except ValueError:
+                return jsonify({
+                    "success": False,
+                    "message": "deadline must be a positive number of seconds"
+                }), 400
+            
+            compact_view = str(params.get('view', 'full')).lower() == 'compact'
+            save_to_db = str(params.get('saveToDatabase', 'false')).lower() == 'true'
+            store_page_text = str(params.get('storePageText', os.getenv('STORE_PAGE_TEXT', 'true'))).lower() == 'true'
+            
+            # The token is single-use: taking it means a concurrent request with the same token gets a 404
+            # instead of running the same continuation (and saving the same invoice) twice.
+            # A still-partial result gets a new token.
+            state = resume_cache.take(token) if token else None
+            if state is None:
+                return jsonify({
+                    "success": False,
+                    "message": "Unknown or expired resume token"
+                }), 404
+            
+            try:
+                with admission.acquire(state["total_pages"]):
+                    extraction = run_bill_extraction(
+                        state["document"], state["pages_to_extract"], state["required_keywords"], state["provider"],
+                        deadline=ExtractionDeadline.for_request(deadline_seconds),
+                        resume_state=state["resume_state"]
+                    )
+                context = {key: value for key, value in state.items() if key != "resume_state"}
+                response_body = finish_extraction(extraction, context, compact_view, save_to_db, store_page_text)
+            except AdmissionRejected as rejected:
+                # Nothing ran; the token stays valid for the retry
+                resume_cache.restore(token, state)
+                response = jsonify({
+                    "success": False,
+                    "message": rejected.reason
+                })
+                response.headers["Retry-After"] = str(rejected.retry_after)
+                return response, 503
+            except Exception:
+                resume_cache.restore(token, state)
+                raise
+            
+            response = jsonify(response_body)
+            response.headers.add("Server-Timing", server_timing(extraction))
+            return response, 200
+            
+        except Exception as e:
+            logger.exception("Error resuming extraction: %s", e)
+            return jsonify({
+                "success": False,
+                "message": f"Error resuming extraction: {str(e)}"
+            }), 500
+
+@blp.route("/documents")
+class DocumentSessionsView(MethodView):
+    def post(self):
+        """Upload a PDF and keep it server-side; returns a document_id for later /extract-text calls"""
+        try:
+            file = request.files.get('file')
+            if file is None or file.filename == '':
+                return jsonify({
+                    "success": False,
+                    "message": "No file provided"
+                }), 400
+            
+            if not file.filename.lower().endswith('.pdf'):
+                return jsonify({
+                    "success": False,
+                    "message": "File must be a PDF"
+                }), 400
+            
+            file_content = file.read()
+            with DocumentScope() as documents:
+                pdf_document = documents.open(stream=file_content, filetype="pdf")
+                
+                if not is_supported_document(pdf_document):
+                    return jsonify({
+                        "success": False,
+                        "message": "Invalid document: This application supports Verizon bills for now. Other carriers will be added soon.",
+                        "isInvalidDocument": True
+                    }), 400
+                
+                session = document_sessions.create(file_content, pdf_document, file.filename)
+                if session is None:
+                    return jsonify({
+                        "success": False,
+                        "message": "Document is too large to keep as a session"
+                    }), 413
+                documents.release(pdf_document)
+            
+            return jsonify({
+                "success": True,
+                **session.to_dict(document_sessions.ttl_seconds)
+            }), 201
+            
+        except Exception as e:
+            logger.exception("Error creating document session: %s", e)
+            return jsonify({
+                "success": False,
+                "message": f"Error opening document: {str(e)}"
+            }), 500
+
+@blp.route("/documents/<document_id>")
+class DocumentSessionView(MethodView):
+    def get(self, document_id):
+        """Describe a kept document (and refresh its expiry)"""
+        session = document_sessions.get(document_id)
+        if session is None:
+            return jsonify({
+                "success": False,
+                "message": "Unknown or expired documentId"
+            }), 404
+        return jsonify({
+            "success": True,
+            **session.to_dict(document_sessions.ttl_seconds)
+        }), 200
+    
+    def delete(self, document_id):
+        """Close a kept document and free its memory"""
+        if not document_sessions.remove(document_id):
+            return jsonify({
+                "success": False,
+                "message": "Unknown or expired documentId"
+            }), 404
+        return jsonify({
+            "success": True,
+            "message": f"Document {document_id} closed"
+        }), 200
+
+@blp.route("/profiles/<profile_id>")
+class ProfileReportView(MethodView):
+    def get(self, profile_id):
+        """Hotspot report of a profile=1 request (admin only); format=collapsed returns the collapsed stacks"""
+        if not is_admin_request():
+            return jsonify({
+                "success": False,
+                "message": "Requires a valid X-Admin-Token header"
+            }), 403
+        
+        if request.args.get('format') == 'collapsed':
+            collapsed = profile_store.load_collapsed(profile_id)
+            if collapsed is not None:
+                return current_app.response_class(collapsed, mimetype="text/plain")
+        else:
+            report = profile_store.load(profile_id)
+            if report is not None:
+                return jsonify({"success": True, **report}), 200
+        
+        return jsonify({
+            "success": False,
+            "message": f"Profile {profile_id} not found"
+        }), 404
+
+@blp.route("/keyword-stats")
+class KeywordStatsView(MethodView):
+    def get(self):
+        """Per-rule evaluations, hits, money found and scan time for a provider's keywords (admin only)"""
+        if not is_admin_request():
+            return jsonify({
+                "success": False,
+                "message": "Requires a valid X-Admin-Token header"
+            }), 403
+        
+        provider = request.args.get('provider', 'verizon')
+        rules = build_search_keywords(load_required_keywords(provider))
+        return jsonify({"success": True, **keyword_stats.snapshot(provider, rules)}), 200
+    
+    def delete(self):
+        """Reset the statistics of one provider (or of all with no provider parameter)"""
+        if not is_admin_request():
+            return jsonify({
+                "success": False,
+                "message": "Requires a valid X-Admin-Token header"
+            }), 403
+        
+        keyword_stats.reset(request.args.get('provider'))
+        return jsonify({"success": True}), 200
+
 # Add new routes for database operations
 @blp.route("/billing-data/<account_number>")
 class BillingDataView(MethodView):
@@ -1377,6 +2298,12 @@ class BillingDataView(MethodView):
     def get(self, account_number):
         """Retrieve billing data for a specific account (returns all invoices for that account)"""
         try:
+            # Unchanged records: answer 304 before loading any stored JSON
+            versions = db.get_record_versions(account_number=account_number)
+            not_modified = not_modified_response(versions)
+            if not_modified is not None:
+                return not_modified
+            
             data = db.get_billing_data(account_number)
             if data:
                 for invoice in data:
@@ -1397,6 +2324,7 @@ class BillingDataView(MethodView):
                         )
                         total_charges = total_charges_entry.get("amount") if total_charges_entry else None
                     invoice["total_charges"] = total_charges
+                    invoice["total_charges_cents"] = parse_amount_cents(total_charges)
 
                     # billing_period
                     billing_period = summary.get("billing_period")
@@ -1456,16 +2384,17 @@ class BillingDataView(MethodView):
                         filtered_entries.append({
                             "name": display_name,
                             "phone": phone,
-                            "total_current_charges": total_current_charges
+                            "total_current_charges": total_current_charges,
+                            "total_current_charges_cents": parse_amount_cents(total_current_charges)
                         })
                     invoice["entries"] = filtered_entries
 
-                return jsonify({
+                return cacheable_response(jsonify({
                     "success": True,
                     "account_number": account_number,
                     "invoices": data,
                     "total_invoices": len(data)
-                }), 200
+                }), versions)
             else:
                 return jsonify({
                     "success": False,
@@ -1499,13 +2428,18 @@ class BillingDataByInvoiceView(MethodView):
     def get(self, invoice_number):
         """Retrieve a billing record by invoice number"""
         try:
+            versions = db.get_record_versions(invoice_number=invoice_number)
+            not_modified = not_modified_response(versions)
+            if not_modified is not None:
+                return not_modified
+            
             data = db.get_billing_data_by_invoice(invoice_number)
             if data:
-                return jsonify({
+                return cacheable_response(jsonify({
                     "success": True,
                     "invoice_number": invoice_number,
                     "record": data
-                }), 200
+                }), versions)
             else:
                 return jsonify({
                     "success": False,
@@ -1523,15 +2457,268 @@ class BillingAccountsView(MethodView):
     def get(self):
         """List all accounts in the database"""
         try:
+            # One-row read: the generation changes with every save or delete
+            versions = db.get_data_generation()
+            not_modified = not_modified_response(versions)
+            if not_modified is not None:
+                return not_modified
+            
             accounts = db.list_all_accounts(include_json=True)
+            return cacheable_response(jsonify({
+                "success": True,
+                "accounts": accounts,
+                "total_count": len(accounts)
+            }), versions)
+            
+        except Exception as e:
             return jsonify({
+                "success": False,
+                "message": f"Error listing accounts: {str(e)}"
+            }), 500
+
+@blp.route("/accounts")
+class AccountIndexView(MethodView):
+    def get(self):
+        """List account numbers with invoice counts (no stored JSON is loaded)"""
+        try:
+            # One-row read: the generation changes with every save or delete
+            versions = db.get_data_generation()
+            not_modified = not_modified_response(versions)
+            if not_modified is not None:
+                return not_modified
+            
+            accounts = db.list_account_index()
+            return cacheable_response(jsonify({
                 "success": True,
                 "accounts": accounts,
                 "total_count": len(accounts)
-            }), 200
+            }), versions)
             
         except Exception as e:
             return jsonify({
                 "success": False,
                 "message": f"Error listing accounts: {str(e)}"
-            }), 500
\ No newline at end of file
+            }), 500
+
+
+@blp.route("/reprocess")
+class ReprocessView(MethodView):
+    def post(self):
+        """Re-run the extractors over stored page text for selected accounts (admin only).
+           Reprocessing every stored bill is too long for a request; use the command line for that."""
+        if not is_admin_request():
+            return jsonify({
+                "success": False,
+                "message": "Requires a valid X-Admin-Token header"
+            }), 403
+        
+        try:
+            from .reprocess import reprocess_documents
+            
+            payload = request.get_json(silent=True) or request.form.to_dict()
+            accounts = payload.get("accounts") or []
+            if isinstance(accounts, str):
+                accounts = [acct.strip() for acct in accounts.split(",") if acct.strip()]
+            
+            if str(payload.get("all", "false")).lower() == "true":
+                return jsonify({
+                    "success": False,
+                    "message": "Reprocessing all records is only available from the command line: "
+                               "python -m resources.reprocess --all"
+                }), 400
+            if not accounts:
+                return jsonify({
+                    "success": False,
+                    "message": "Provide 'accounts'"
+                }), 400
+            
+            try:
+                workers = int(payload["workers"]) if payload.get("workers") else None
+                batch_size = int(payload.get("batch_size", 50))
+            except (TypeError, ValueError):
+                return jsonify({
+                    "success": False,
+                    "message": "'workers' and 'batch_size' must be integers"
+                }), 400
+            if batch_size <= 0:
+                return jsonify({
+                    "success": False,
+                    "message": "'batch_size' must be positive"
+                }), 400
+            
+            # Clamped to 1..CPU count so a request cannot start an arbitrary number of processes
+            if workers is not None:
+                workers = max(1, min(workers, os.cpu_count() or 1))
+            
+            result = reprocess_documents(db, account_numbers=accounts, workers=workers, batch_size=batch_size)
+            return jsonify(result), 200
+            
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error reprocessing documents: {str(e)}"
+            }), 500
+
+@blp.route("/search")
+class SearchView(MethodView):
+    def get(self):
+        """Full-text search over stored bills (line names, phones, charge names, inline contexts)"""
+        try:
+            query = request.args.get("q", "").strip()
+            if not query:
+                return jsonify({
+                    "success": False,
+                    "message": "Query parameter 'q' is required"
+                }), 400
+            
+            page = max(1, request.args.get("page", 1, type=int) or 1)
+            page_size = min(100, max(1, request.args.get("page_size", 20, type=int) or 20))
+            
+            result = db.search_billing_lines(query, limit=page_size, offset=(page - 1) * page_size)
+            if not result.get("success"):
+                return jsonify({
+                    "success": False,
+                    "message": f"Error searching: {result.get('error')}"
+                }), 500
+            
+            return jsonify({
+                "success": True,
+                "query": query,
+                "page": page,
+                "page_size": page_size,
+                "total": result["total"],
+                "hits": result["hits"]
+            }), 200
+            
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error searching: {str(e)}"
+            }), 500
+
+@blp.route("/lines/<phone>")
+class LineHistoryView(MethodView):
+    def get(self, phone):
+        """Charge timeline for one line across every stored account and invoice"""
+        try:
+            invoices = db.get_line_history(phone)
+            if not invoices:
+                return jsonify({
+                    "success": False,
+                    "message": "No charges found for this line"
+                }), 404
+            
+            return jsonify({
+                "success": True,
+                "phone": phone,
+                "invoices": invoices,
+                "total_invoices": len(invoices)
+            }), 200
+            
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error retrieving line history: {str(e)}"
+            }), 500
+
+
+@blp.route("/billing-data/<account_number>/changes")
+class InvoiceChangesView(MethodView):
+    def get(self, account_number):
+        """What changed since the previous invoice, per line and per charge category.
+           Defaults to the latest billing period; ?invoice= picks another invoice and
+           ?all=true includes unchanged lines and categories."""
+        try:
+            # Deltas only change when one of the account's records does
+            versions = db.get_record_versions(account_number=account_number)
+            not_modified = not_modified_response(versions)
+            if not_modified is not None:
+                return not_modified
+            
+            changes = db.get_invoice_changes(
+                account_number,
+                invoice_number=request.args.get("invoice") or None,
+                include_unchanged=request.args.get("all", "false").lower() == "true"
+            )
+            if changes is None:
+                return jsonify({
+                    "success": False,
+                    "message": "No billing data found for this account or invoice"
+                }), 404
+            
+            if changes["total"] is None:
+                changes["message"] = "No earlier invoice to compare with"
+            
+            return cacheable_response(jsonify({"success": True, **changes}), versions)
+        
+        except Exception as e:
+            return jsonify({
+                "success": False,
+                "message": f"Error retrieving invoice changes: {str(e)}"
+            }), 500
+
+
+@blp.route("/export")
+class ExportView(MethodView):
+    def get(self):
+        """Stream every stored charge as CSV or NDJSON, one row per charge and sub-key"""
+        export_format = request.args.get("format", "csv").lower()
+        if export_format not in ("csv", "ndjson"):
+            return jsonify({
+                "success": False,
+                "message": "format must be 'csv' or 'ndjson'"
+            }), 400
+        
+        period_from = request.args.get("from") or None
+        period_to = request.args.get("to") or None
+        for bound in (period_from, period_to):
+            if bound:
+                try:
+                    datetime.datetime.strptime(bound, "%Y-%m-%d")
+                except ValueError:
+                    return jsonify({
+                        "success": False,
+                        "message": "from/to must be dates in YYYY-MM-DD format"
+                    }), 400
+        
+        rows = db.iter_line_charges(
+            account_number=request.args.get("account") or None,
+            period_from=period_from,
+            period_to=period_to
+        )
+        columns = db.EXPORT_COLUMNS
+        
+        def generate_csv():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for count, row in enumerate(rows, start=1):
+                writer.writerow(row)
+                # Flush in chunks rather than per row
+                if count % 500 == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+            yield buffer.getvalue()
+        
+        def generate_ndjson():
+            chunk = []
+            for row in rows:
+                chunk.append(json.dumps(dict(zip(columns, row)), separators=(",", ":")))
+                if len(chunk) == 500:
+                    yield "\n".join(chunk) + "\n"
+                    chunk = []
+            if chunk:
+                yield "\n".join(chunk) + "\n"
+        
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        if export_format == "csv":
+            body, mimetype = generate_csv(), "text/csv"
+        else:
+            body, mimetype = generate_ndjson(), "application/x-ndjson"
+        
+        return current_app.response_class(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={"Content-Disposition": f"attachment; filename=billing_export_{timestamp}.{export_format}"}
+        )
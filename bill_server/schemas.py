@@ -3,26 +3,28 @@ from marshmallow import Schema, fields, ValidationError
 class SubKeyMoneyAmountSchema(Schema):
     """Schema for sub-key money amounts nested under parent keywords"""
     amount = fields.Str(required=True)
+    amount_cents = fields.Int(allow_none=True)  # Normalized integer cents
     keyword = fields.Str(required=True)
     name = fields.Str(required=True)  # Added display name
     ukey = fields.Str(required=True)
     search_term = fields.Str(required=True)
     search_range_used = fields.Int(required=True)  # Added search range used
-    inline_context = fields.Str(required=True)
+    inline_context = fields.Str()  # Omitted when view=compact
     page = fields.Int(required=True)
-    contact_match_type = fields.List(fields.Str(), required=True)
+    contact_match_type = fields.List(fields.Str())  # Omitted when view=compact
 
 class MoneyAmountSchema(Schema):
     """Schema for money amounts found for contacts"""
     amount = fields.Str(required=True)
+    amount_cents = fields.Int(allow_none=True)  # Normalized integer cents
     keyword = fields.Str(required=True)
     name = fields.Str(required=True)  # Added display name
     ukey = fields.Str(required=True)
     search_term = fields.Str(required=True)
     search_range_used = fields.Int(required=True)  # Added search range used
-    inline_context = fields.Str(required=True)
+    inline_context = fields.Str()  # Omitted when view=compact
     page = fields.Int(required=True)
-    contact_match_type = fields.List(fields.Str(), required=True)
+    contact_match_type = fields.List(fields.Str())  # Omitted when view=compact
     sub_keys = fields.List(fields.Nested(SubKeyMoneyAmountSchema), required=True)
 
 class BillSummaryMoneyAmountSchema(Schema):
@@ -31,6 +33,7 @@ class BillSummaryMoneyAmountSchema(Schema):
     name = fields.Str(required=True)  # Added display name
     ukey = fields.Str(required=True)
     amount = fields.Str(required=True)
+    amount_cents = fields.Int(allow_none=True)  # None for billing details (account, invoice, dates)
     inline_context = fields.Str(required=True)
     page = fields.Int(required=True)
     type = fields.Str(required=True)
@@ -38,6 +41,7 @@ class BillSummaryMoneyAmountSchema(Schema):
 class LateFeeSchema(Schema):
     """Schema for late fee entries"""
     amount = fields.Str(required=True)
+    amount_cents = fields.Int(allow_none=True)
     sentence = fields.Str(required=True)
     name = fields.Str(required=True)  # Added display name
     ukey = fields.Str(required=True)
@@ -47,6 +51,7 @@ class LateFeeSchema(Schema):
 class PreviousBalanceSchema(Schema):
     """Schema for previous balance entries"""
     amount = fields.Str(required=True)
+    amount_cents = fields.Int(allow_none=True)
     date = fields.Str(required=True)  # Added date field for mm/dd/yy format
     sentence = fields.Str(required=True)
     name = fields.Str(required=True)
@@ -68,18 +73,58 @@ class SummarySchema(Schema):
     billing_period = fields.Str(allow_none=True, required=True)
     due_date = fields.Str(allow_none=True, required=True)
     total_charges = fields.Str(allow_none=True, required=True)
+    total_charges_cents = fields.Int(allow_none=True)
     money_amounts = fields.List(fields.Nested(BillSummaryMoneyAmountSchema), required=True)
     late_fees = fields.List(fields.Nested(LateFeeSchema), required=True)
     previous_balance = fields.List(fields.Nested(PreviousBalanceSchema), required=True)
 
+class LineTotalSchema(Schema):
+    """Schema for a precomputed per-line total"""
+    phone = fields.Str(required=True)
+    name = fields.Str(required=True)
+    total_cents = fields.Int(required=True)
+    categories = fields.Dict(keys=fields.Str(), values=fields.Int(), required=True)
+
+class CategoryTotalSchema(Schema):
+    """Schema for a charge category subtotal across all lines"""
+    ukey = fields.Str(required=True)
+    name = fields.Str(required=True)
+    total_cents = fields.Int(required=True)
+
+class DistributionItemSchema(Schema):
+    """Schema for one slice of the charge distribution chart"""
+    name = fields.Str(required=True)
+    display_name = fields.Str(required=True)
+    phone = fields.Str(required=True)
+    amount_cents = fields.Int(required=True)
+    percentage = fields.Str(required=True)
+
+class BillTotalsSchema(Schema):
+    """Schema for totals precomputed at extraction time (all amounts in integer cents)"""
+    lines = fields.List(fields.Nested(LineTotalSchema), required=True)
+    lines_total_cents = fields.Int(required=True)
+    categories = fields.List(fields.Nested(CategoryTotalSchema), required=True)
+    sub_key_categories = fields.Dict(keys=fields.Str(), values=fields.Int(), required=True)
+    late_fees_cents = fields.Int(required=True)
+    charges_grand_total_cents = fields.Int(required=True)
+    distribution = fields.List(fields.Nested(DistributionItemSchema), required=True)
+
 class PDFTextExtractionSchema(Schema):
     """Schema for PDF text extraction response"""
     success = fields.Bool(required=True)
     message = fields.Str(required=True)
-    text = fields.Str(required=True)
+    text = fields.Str()  # Omitted when view=compact
     entries = fields.List(fields.Nested(ContactEntrySchema), required=True)
     keywords_used = fields.List(fields.Str(), required=True)
     summary = fields.Nested(SummarySchema, required=True)
+    totals = fields.Nested(BillTotalsSchema, required=True)
+    view = fields.Str()  # "compact" when requested with view=compact
+    mode = fields.Str()  # "summary" when requested with mode=summary
+    partial = fields.Bool()  # Set when the extraction deadline was reached
+    pages_processed = fields.Int()
+    contacts_processed = fields.Int()
+    resume = fields.Str()  # Token for POST /extract-text/resume
+    document_id = fields.Str()  # Set for documentId / keepDocument=true requests
 
 # Add these new schemas for database operations
 class BillingDataSchema(Schema):